@@ -0,0 +1,15 @@
+"""Benchmarks for the VolView server serialization and chunking hot paths.
+
+Run from the `server/` directory:
+
+    python -m benchmarks [--quick] [--save FILE] [--compare FILE]
+
+`benchmarks/baseline.json` holds reference results. Changes to the hot paths
+should be checked with `--compare benchmarks/baseline.json`, and the baseline
+regenerated with `--save` when a change is expected to move the numbers.
+Absolute throughput depends on the machine, so compare on the same host that
+produced the baseline.
+
+`python -m benchmarks.load` simulates many concurrent viewer clients against
+a local server. See `benchmarks/load.py` for usage.
+"""
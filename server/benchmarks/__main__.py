@@ -0,0 +1,120 @@
+import sys
+import json
+import argparse
+import platform
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks import bench_chunking, bench_image_data, bench_transform
+from benchmarks.harness import BenchResult
+from benchmarks.synthetic import DTYPES
+
+DEFAULT_SIZES = [64, 128, 256, 512]
+QUICK_SIZES = [64, 128]
+DEFAULT_DTYPES = ["uint8", "int16", "float32"]
+DEFAULT_TOLERANCE = 0.2
+SUITES = ["image_data", "chunking", "transform"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=None, help="Volume edge lengths."
+    )
+    parser.add_argument(
+        "--dtypes",
+        nargs="+",
+        default=DEFAULT_DTYPES,
+        choices=sorted(DTYPES.keys()),
+        help="Volume pixel types.",
+    )
+    parser.add_argument(
+        "--suite", nargs="+", default=SUITES, choices=SUITES, help="Suites to run."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case.")
+    parser.add_argument(
+        "--quick",
+        default=False,
+        action="store_true",
+        help=f"Only run volume sizes {QUICK_SIZES}.",
+    )
+    parser.add_argument("--save", help="Write results to a JSON baseline file.")
+    parser.add_argument("--compare", help="Compare results against a JSON baseline.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Allowed relative throughput drop before flagging a regression.",
+    )
+    return parser.parse_args()
+
+
+def print_results(results: List[BenchResult]):
+    header = f"{'case':<48} {'MB/s':>10} {'ms':>10} {'peak MB':>10} {'copies':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.name:<48} {r.throughput_mbps:>10.1f} {r.seconds * 1000:>10.2f} "
+            f"{r.peak_mb:>10.1f} {r.copies:>7.2f}"
+        )
+
+
+def compare(results: List[BenchResult], baseline: Dict, tolerance: float) -> bool:
+    """Prints regressions against a baseline. Returns True if none are found."""
+    baseline_cases = {case["name"]: case for case in baseline["results"]}
+    ok = True
+    for r in results:
+        base = baseline_cases.get(r.name)
+        if not base:
+            continue
+        slower = r.throughput_mbps < base["throughput_mbps"] * (1 - tolerance)
+        more_copies = r.copies > base["copies"] + 0.5
+        if slower or more_copies:
+            ok = False
+            print(
+                f"REGRESSION {r.name}: "
+                f"{base['throughput_mbps']:.1f} -> {r.throughput_mbps:.1f} MB/s, "
+                f"{base['copies']:.2f} -> {r.copies:.2f} copies"
+            )
+    return ok
+
+
+def main(args):
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+
+    results: List[BenchResult] = []
+    if "image_data" in args.suite:
+        results += bench_image_data.run(sizes, args.dtypes, args.repeat)
+    if "chunking" in args.suite:
+        results += bench_chunking.run(sizes, args.dtypes, args.repeat)
+    if "transform" in args.suite:
+        results += bench_transform.run(args.repeat)
+
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(
+                {
+                    "machine": {
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "platform": platform.platform(),
+                    },
+                    "results": [r.to_dict() for r in results],
+                },
+                fp,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,73 @@
+import asyncio
+from typing import Any, List
+
+from socketio import AsyncServer
+from socketio.packet import EVENT
+
+from volview_server.chunking import ChunkingAsyncServer
+from volview_server.chunking.chunking_packet import ChunkedPacket
+
+from benchmarks.harness import BenchResult, measure
+from benchmarks.synthetic import make_volume
+
+
+class _SinkServer(AsyncServer):
+    """Stands in for socket.io's packet handling below the chunking layer."""
+
+    async def _handle_eio_message(self, eio_sid, data):
+        self.received.append(data)
+
+
+class _ReassemblyServer(ChunkingAsyncServer, _SinkServer):
+    def __init__(self):
+        super().__init__()
+        self.received: List[Any] = []
+
+
+def _make_packet(values: bytes) -> ChunkedPacket:
+    return ChunkedPacket(
+        EVENT,
+        data=["rpc:result", {"rpcId": "bench", "ok": True, "data": values}],
+    )
+
+
+def _bench_size(
+    loop: asyncio.AbstractEventLoop, size: int, dtype: str, repeat: int
+) -> List[BenchResult]:
+    # buffers are freed on return, before the next size is allocated
+    values = make_volume(size, dtype).tobytes()
+    packet = _make_packet(values)
+    encode = measure(
+        f"ChunkedPacket.encode/{dtype}/{size}^3",
+        packet.encode,
+        len(values),
+        repeat,
+    )
+
+    messages = packet.encode()
+    server = _ReassemblyServer()
+
+    async def reassemble():
+        server.received.clear()
+        for msg in messages:
+            await server._handle_eio_message("bench", msg)
+
+    reassembly = measure(
+        f"ChunkingAsyncServer.reassemble/{dtype}/{size}^3",
+        lambda: loop.run_until_complete(reassemble()),
+        len(values),
+        repeat,
+    )
+    return [encode, reassembly]
+
+
+def run(sizes: List[int], dtypes: List[str], repeat: int) -> List[BenchResult]:
+    results = []
+    loop = asyncio.new_event_loop()
+    try:
+        for dtype in dtypes:
+            for size in sizes:
+                results += _bench_size(loop, size, dtype, repeat)
+    finally:
+        loop.close()
+    return results
@@ -0,0 +1,36 @@
+from typing import List
+
+from volview_server.transformers.image_data import itk_to_vtk_image, vtk_to_itk_image
+
+from benchmarks.harness import BenchResult, measure
+from benchmarks.synthetic import make_itk_image
+
+
+def _bench_size(size: int, dtype: str, repeat: int) -> List[BenchResult]:
+    # the image is freed on return, before the next size is allocated
+    image = make_itk_image(size, dtype)
+    serialized = itk_to_vtk_image(image)
+    payload = len(serialized["pointData"]["arrays"][0]["data"]["values"])
+
+    return [
+        measure(
+            f"itk_to_vtk_image/{dtype}/{size}^3",
+            lambda: itk_to_vtk_image(image),
+            payload,
+            repeat,
+        ),
+        measure(
+            f"vtk_to_itk_image/{dtype}/{size}^3",
+            lambda: vtk_to_itk_image(serialized),
+            payload,
+            repeat,
+        ),
+    ]
+
+
+def run(sizes: List[int], dtypes: List[str], repeat: int) -> List[BenchResult]:
+    results = []
+    for dtype in dtypes:
+        for size in sizes:
+            results += _bench_size(size, dtype, repeat)
+    return results
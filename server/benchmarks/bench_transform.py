@@ -0,0 +1,31 @@
+import json
+from typing import List
+
+from volview_server.api import RpcApi
+
+from benchmarks.harness import BenchResult, measure
+from benchmarks.synthetic import make_deep_tree, make_wide_tree
+
+# each level nests a dict and a list, so stay well below the recursion limit
+DEEP_TREE_DEPTHS = [10, 100, 400]
+WIDE_TREE_WIDTHS = [1_000, 10_000, 100_000]
+
+
+def run(repeat: int) -> List[BenchResult]:
+    api = RpcApi(num_threads=1)
+    trees = [(f"deep/{depth}", make_deep_tree(depth)) for depth in DEEP_TREE_DEPTHS]
+    trees += [(f"wide/{width}", make_wide_tree(width)) for width in WIDE_TREE_WIDTHS]
+
+    results = []
+    for label, tree in trees:
+        # JSON size is the closest analogue to the bytes moved for a tree
+        payload = len(json.dumps(tree))
+        results.append(
+            measure(
+                f"transform_object/{label}",
+                lambda: api.serialize_object(tree),
+                payload,
+                repeat,
+            )
+        )
+    return results
@@ -0,0 +1,75 @@
+import gc
+import time
+import statistics
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+MB = 1024 * 1024
+
+
+@dataclass
+class BenchResult:
+    name: str
+    # size of the payload being moved, in bytes
+    payload_bytes: int
+    # median wall time of a single run, in seconds
+    seconds: float
+    # payload MB moved per second
+    throughput_mbps: float
+    # peak Python-traced memory allocated by a single run, in MB
+    peak_mb: float
+    # peak traced memory in multiples of the payload size. This approximates
+    # how many copies of the payload a run makes. Allocations made natively by
+    # ITK are not traced.
+    copies: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def measure(
+    name: str,
+    fn: Callable[[], Any],
+    payload_bytes: int,
+    repeat: int = 5,
+    setup: Optional[Callable[[], None]] = None,
+) -> BenchResult:
+    """Times `fn` and measures its peak traced memory.
+
+    Timing and memory are measured in separate runs, since tracemalloc slows
+    down allocation-heavy code.
+    """
+    # warm-up, e.g. for lazily instantiated ITK templates
+    if setup:
+        setup()
+    fn()
+
+    timings: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = statistics.median(timings)
+    return BenchResult(
+        name=name,
+        payload_bytes=payload_bytes,
+        seconds=seconds,
+        throughput_mbps=(payload_bytes / MB) / seconds if seconds else 0.0,
+        peak_mb=peak / MB,
+        copies=round(peak / payload_bytes, 2) if payload_bytes else 0.0,
+    )
@@ -0,0 +1,396 @@
+"""Simulates many concurrent viewer clients against a VolView server.
+
+Run from the `server/` directory:
+
+    python -m benchmarks.load examples/example_api.py \\
+        --clients 50 --duration 30 \\
+        --op 'rpc:add*10=[1,2]' --op 'stream:progress' --op 'upload:echo_image'
+
+The tool starts the given API script with `python -m volview_server` on
+localhost, connects N socket.io clients with distinct client IDs, and drives a
+weighted mix of operations from each client until the duration elapses.
+
+Operation specs have the form `KIND:NAME[*WEIGHT][=JSON_ARGS]`:
+
+- `rpc:NAME`: an `rpc:call`, e.g. `rpc:add*5=[1,2]`
+- `stream:NAME`: a `stream:call`, consumed until done
+- `upload:NAME`: an `rpc:call` whose first argument is a synthetic
+  vtkImageData of `--upload-size`^3 voxels, followed by JSON_ARGS
+
+Every client answers `getStoreProperty`/`callStoreMethod` from a fake store.
+Store getters named `get*ImageData` return a synthetic `--volume-size`^3
+vtkImageData, `add*` methods return a new ID, and everything else returns None.
+
+Pass `--binary-envelope` to negotiate binary envelopes instead of JSON; the
+spawned server is started with the same flag.
+
+Pass `--call-timeout MS` to send each call with a deadline that many
+milliseconds away, so that an overloaded server drops calls instead of
+queueing them.
+
+Pass `--url` to target an already running server instead; server RSS is then
+only reported if `--server-pid` is given. Only localhost URLs are accepted.
+"""
+
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from volview_server.chunking import ChunkingAsyncClient, ENVELOPE_MODE_BINARY
+from volview_server.client_store import RPC_CALL_METHOD, RPC_GET_VALUE
+from volview_server.rpc_server import (
+    CLIENT_ID_QS,
+    ENVELOPE_EVENT,
+    RPC_CALL_EVENT,
+    RPC_RESULT_EVENT,
+    STREAM_CALL_EVENT,
+    STREAM_RESULT_EVENT,
+)
+from volview_server.transformers.image_data import itk_to_vtk_image
+
+from benchmarks.synthetic import make_itk_image
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+OP_KINDS = {"rpc", "stream", "upload"}
+RSS_SAMPLE_INTERVAL = 0.5  # seconds
+SERVER_START_TIMEOUT = 60  # seconds
+
+
+@dataclass
+class Operation:
+    kind: str
+    name: str
+    weight: float = 1.0
+    args: List[Any] = field(default_factory=list)
+
+    @property
+    def label(self):
+        return f"{self.kind}:{self.name}"
+
+
+def parse_operation(spec: str) -> Operation:
+    kind, _, rest = spec.partition(":")
+    if kind not in OP_KINDS or not rest:
+        raise argparse.ArgumentTypeError(f"Invalid operation: {spec}")
+
+    head, _, json_args = rest.partition("=")
+    name, _, weight = head.partition("*")
+    args = json.loads(json_args) if json_args else []
+    if type(args) is not list:
+        raise argparse.ArgumentTypeError(f"Arguments are not a JSON list: {spec}")
+    return Operation(kind, name, float(weight or 1), args)
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """Reads the resident set size of a process on Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as fp:
+            for line in fp:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def make_vtk_image(size: int) -> Dict:
+    return itk_to_vtk_image(make_itk_image(size, "int16"))
+
+
+class FakeClient:
+    """A viewer client with a fake store."""
+
+    def __init__(
+        self,
+        url: str,
+        volume: Dict,
+        upload: Optional[Dict],
+        binary_envelope: bool = False,
+        call_timeout: Optional[float] = None,
+    ):
+        self.client_id = f"load_{uuid.uuid4().hex}"
+        self.url = url
+        self.binary_envelope = binary_envelope
+        self.call_timeout = call_timeout
+        self.volume = volume
+        self.upload = upload
+        self.sio = ChunkingAsyncClient(reconnection=False)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, asyncio.Queue] = {}
+        self._added = 0
+
+        self.sio.on(RPC_CALL_EVENT, self._on_rpc_call)
+        self.sio.on(RPC_RESULT_EVENT, self._on_rpc_result)
+        self.sio.on(STREAM_RESULT_EVENT, self._on_stream_result)
+        self.sio.on("disconnect", self._on_disconnect)
+
+    async def connect(self):
+        await self.sio.connect(
+            f"{self.url}?{CLIENT_ID_QS}={self.client_id}", transports=["websocket"]
+        )
+        if self.binary_envelope:
+            reply = await self.sio.call(ENVELOPE_EVENT, {"mode": ENVELOPE_MODE_BINARY})
+            if reply.get("mode") != ENVELOPE_MODE_BINARY:
+                raise RuntimeError("Server refused binary envelopes")
+            self.sio.binary_envelope = True
+
+    async def disconnect(self):
+        await self.sio.disconnect()
+
+    async def run(self, op: Operation):
+        rpc_id = uuid.uuid4().hex
+        args = [self.upload, *op.args] if op.kind == "upload" else op.args
+        payload = {"rpcId": rpc_id, "name": op.name, "args": args}
+        if self.call_timeout is not None:
+            payload["deadline"] = time.time() * 1000 + self.call_timeout
+
+        if op.kind == "stream":
+            queue = self._streams[rpc_id] = asyncio.Queue()
+            try:
+                await self.sio.emit(STREAM_CALL_EVENT, payload)
+                while True:
+                    result = await queue.get()
+                    if not result["ok"]:
+                        raise RuntimeError(result["error"])
+                    if result.get("done"):
+                        return
+            finally:
+                del self._streams[rpc_id]
+
+        future = self._pending[rpc_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self.sio.emit(RPC_CALL_EVENT, payload)
+            result = await future
+        finally:
+            del self._pending[rpc_id]
+        if not result["ok"]:
+            raise RuntimeError(result["error"])
+
+    async def _on_rpc_result(self, result: Dict):
+        future = self._pending.get(result.get("rpcId"))
+        if future and not future.done():
+            future.set_result(result)
+
+    async def _on_stream_result(self, result: Dict):
+        queue = self._streams.get(result.get("rpcId"))
+        if queue:
+            queue.put_nowait(result)
+
+    async def _on_disconnect(self, *args):
+        error = {"ok": False, "error": "Disconnected from server"}
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result(error)
+        for queue in self._streams.values():
+            queue.put_nowait(error)
+
+    async def _on_rpc_call(self, call: Dict):
+        name, args = call["name"], call.get("args") or []
+        try:
+            if name == RPC_GET_VALUE:
+                data = self._get_store_value(args[1])
+            elif name == RPC_CALL_METHOD:
+                data = self._call_store_method(args[1])
+            else:
+                raise KeyError(f"{name} is not a registered client RPC endpoint")
+            result = {"rpcId": call["rpcId"], "ok": True, "data": data}
+        except Exception as exc:
+            result = {"rpcId": call["rpcId"], "ok": False, "error": str(exc)}
+        await self.sio.emit(RPC_RESULT_EVENT, result)
+
+    def _get_store_value(self, prop_chain: List[str]):
+        return None
+
+    def _call_store_method(self, prop_chain: List[str]):
+        method = str(prop_chain[-1])
+        if method.startswith("get") and method.endswith("ImageData"):
+            return self.volume
+        if method.startswith("add"):
+            self._added += 1
+            return f"{self.client_id}_{self._added}"
+        return None
+
+
+@dataclass
+class OpStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+
+async def drive_client(
+    client: FakeClient,
+    ops: List[Operation],
+    deadline: float,
+    stats: Dict[str, OpStats],
+    rng: random.Random,
+):
+    weights = [op.weight for op in ops]
+    while time.monotonic() < deadline and client.sio.connected:
+        op = rng.choices(ops, weights)[0]
+        start = time.perf_counter()
+        try:
+            await client.run(op)
+            stats[op.label].latencies.append(time.perf_counter() - start)
+        except Exception:
+            stats[op.label].errors += 1
+
+
+async def sample_rss(pid: int, samples: List[int], stop: asyncio.Event):
+    while not stop.is_set():
+        rss = read_rss_bytes(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def print_report(stats: Dict[str, OpStats], elapsed: float, rss: List[int]):
+    header = f"{'operation':<32} {'ok':>7} {'errors':>7} {'ops/s':>8} "
+    header += f"{'p50 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for label, op_stats in stats.items():
+        lat = op_stats.latencies
+        p50 = percentile(lat, 50) * 1000 if lat else float("nan")
+        p99 = percentile(lat, 99) * 1000 if lat else float("nan")
+        print(
+            f"{label:<32} {len(lat):>7} {op_stats.errors:>7} "
+            f"{len(lat) / elapsed:>8.1f} {p50:>9.1f} {p99:>9.1f}"
+        )
+
+    total = sum(len(s.latencies) for s in stats.values())
+    print(f"\ntotal throughput: {total / elapsed:.1f} ops/s over {elapsed:.1f}s")
+    if rss:
+        mb = 1024 * 1024
+        print(f"server RSS: start {rss[0] / mb:.1f} MB, peak {max(rss) / mb:.1f} MB")
+
+
+def wait_for_port(host: str, port: int, server: subprocess.Popen):
+    start = time.monotonic()
+    while time.monotonic() - start < SERVER_START_TIMEOUT:
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError("Server did not start in time")
+
+
+def find_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_load(args, url: str, server_pid: Optional[int]):
+    ops = args.op or [Operation("rpc", "add", args=[1, 2])]
+    volume = make_vtk_image(args.volume_size)
+    upload = (
+        make_vtk_image(args.upload_size)
+        if any(op.kind == "upload" for op in ops)
+        else None
+    )
+
+    clients = [
+        FakeClient(url, volume, upload, args.binary_envelope, args.call_timeout)
+        for _ in range(args.clients)
+    ]
+    await asyncio.gather(*(client.connect() for client in clients))
+
+    stats = {op.label: OpStats() for op in ops}
+    rss: List[int] = []
+    stop = asyncio.Event()
+    sampler = None
+    if server_pid:
+        sampler = asyncio.create_task(sample_rss(server_pid, rss, stop))
+
+    start = time.monotonic()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *(
+            drive_client(client, ops, deadline, stats, random.Random(args.seed + i))
+            for i, client in enumerate(clients)
+        )
+    )
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    if sampler:
+        await sampler
+    await asyncio.gather(*(client.disconnect() for client in clients))
+
+    print_report(stats, elapsed, rss)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("api_script", nargs="?", help="API script to serve.")
+    parser.add_argument("--url", help="URL of an already running local server.")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server.")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds.")
+    parser.add_argument(
+        "--op",
+        type=parse_operation,
+        action="append",
+        help="Operation spec. Can be repeated. Defaults to rpc:add=[1,2].",
+    )
+    parser.add_argument("--volume-size", type=int, default=64)
+    parser.add_argument("--upload-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--binary-envelope", action="store_true")
+    parser.add_argument("--call-timeout", type=float, help="Milliseconds.")
+    args = parser.parse_args()
+
+    if not args.api_script and not args.url:
+        parser.error("either api_script or --url is required")
+    if args.url and urlparse(args.url).hostname not in LOCAL_HOSTS:
+        parser.error("--url must point to localhost")
+    return args
+
+
+def main(args):
+    if args.url:
+        asyncio.run(run_load(args, args.url.rstrip("/"), args.server_pid))
+        return
+
+    host, port = "127.0.0.1", find_free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "volview_server", "-H", host, "-P", str(port)]
+        + (["--binary-envelope"] if args.binary_envelope else [])
+        + [args.api_script]
+    )
+    try:
+        wait_for_port(host, port, server)
+        asyncio.run(run_load(args, f"http://{host}:{port}", server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main(parse_args())
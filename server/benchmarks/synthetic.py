@@ -0,0 +1,45 @@
+from typing import Any
+
+import itk
+import numpy as np
+
+DTYPES = {
+    "uint8": np.uint8,
+    "int16": np.int16,
+    "uint16": np.uint16,
+    "float32": np.float32,
+    "float64": np.float64,
+}
+
+
+def make_volume(size: int, dtype: str, seed: int = 0) -> np.ndarray:
+    """Creates a deterministic size^3 volume of the given dtype."""
+    rng = np.random.default_rng(seed)
+    np_dtype = DTYPES[dtype]
+    shape = (size, size, size)
+    if np.issubdtype(np_dtype, np.floating):
+        return rng.random(shape, dtype=np.float64).astype(np_dtype)
+    info = np.iinfo(np_dtype)
+    return rng.integers(info.min, info.max, shape, dtype=np_dtype, endpoint=True)
+
+
+def make_itk_image(size: int, dtype: str, seed: int = 0):
+    image = itk.GetImageFromArray(make_volume(size, dtype, seed))
+    image.SetSpacing([0.5, 0.5, 1.25])
+    image.SetOrigin([-10.0, 20.0, 5.0])
+    return image
+
+
+def make_deep_tree(depth: int) -> Any:
+    """A chain of nested dicts and lists, `depth` levels deep."""
+    tree: Any = {"leaf": 1.0}
+    for level in range(depth):
+        tree = {"level": level, "child": [tree]}
+    return tree
+
+
+def make_wide_tree(width: int) -> Any:
+    """A shallow argument list with `width` small records."""
+    return [
+        {"id": f"item-{i}", "value": i * 0.5, "tags": ["a", "b"]} for i in range(width)
+    ]
@@ -1,6 +1,5 @@
 import asyncio
 from dataclasses import dataclass, field
-from concurrent.futures import ProcessPoolExecutor
 
 import aiohttp
 import itk
@@ -39,7 +38,11 @@ async def number_stream():
 
 ## median filter example ##
 
-process_pool = ProcessPoolExecutor(4)
+# Instantiate the median filter for common pixel types up front, in this
+# process and in every pool worker, so the first request is not slowed down
+# by ITK's lazy template loading.
+volview.add_warmup("MedianImageFilter", ["F", "SS", "US", "UC"])
+process_pool = volview.create_process_pool(4)
 
 
 @dataclass
@@ -63,9 +66,9 @@ def do_median_filter(serialized_img, radius):
 
 async def run_median_filter_process(img, radius: int):
     serialized_img = convert_itk_to_vtkjs_image(img)
-    loop = asyncio.get_event_loop()
-    serialized_output = await loop.run_in_executor(
-        process_pool, do_median_filter, serialized_img, radius
+    # queued by the calling RPC's priority, ahead of background work
+    serialized_output = await volview.run_in_executor(
+        do_median_filter, serialized_img, radius, executor=process_pool
     )
     return convert_vtkjs_to_itk_image(serialized_output)
 
@@ -0,0 +1,138 @@
+import itk
+import numpy as np
+import pytest
+
+from volview_server.transformers import (
+    ImageSequence,
+    compose,
+    default_serializers,
+    transform_object,
+)
+from volview_server.transformers.image_data import (
+    TYPE_ARRAY_JS_TO_NUMPY,
+    vtk_to_itk_image,
+)
+from volview_server.transformers.image_sequence import itk_to_image_sequence
+from volview_server.transformers.run_length import (
+    RUN_LENGTH_ENCODING,
+    run_length_decode,
+)
+
+serialize = compose(default_serializers)
+
+
+def make_image(array, spacing=(0.5, 1.0, 2.0), origin=(1.0, -2.0, 3.0)):
+    image = itk.GetImageFromArray(array)
+    image.SetSpacing(spacing)
+    image.SetOrigin(origin)
+    return image
+
+
+def make_frames(count=3, dtype=np.int16):
+    rng = np.random.default_rng(0)
+    return [
+        make_image(rng.integers(-100, 100, (4, 5, 6)).astype(dtype))
+        for _ in range(count)
+    ]
+
+
+def unpack(sequence):
+    """Expands a packed sequence as the viewer does, into ITK images."""
+    image = sequence["image"]
+    data = image["pointData"]["arrays"][0]["data"]
+    dtype = TYPE_ARRAY_JS_TO_NUMPY[data["dataType"]]
+    values = np.frombuffer(sequence["values"], dtype)
+    if sequence.get("encoding") == RUN_LENGTH_ENCODING:
+        run_lengths = np.frombuffer(sequence["runLengths"], np.uint32)
+        values = run_length_decode(
+            values, run_lengths, data["size"] * len(sequence["offsets"])
+        )
+
+    frames = []
+    for offset in sequence["offsets"]:
+        frame_values = values[offset : offset + data["size"]]
+        frame = {
+            **image,
+            "pointData": {
+                **image["pointData"],
+                "arrays": [{"data": {**data, "values": frame_values.tobytes()}}],
+            },
+        }
+        frames.append(vtk_to_itk_image(frame))
+    return frames
+
+
+def assert_same_image(image, expected):
+    np.testing.assert_array_equal(
+        itk.GetArrayViewFromImage(image), itk.GetArrayViewFromImage(expected)
+    )
+    assert tuple(image.GetSpacing()) == tuple(expected.GetSpacing())
+    assert tuple(image.GetOrigin()) == tuple(expected.GetOrigin())
+    np.testing.assert_array_equal(
+        itk.GetArrayFromMatrix(image.GetDirection()),
+        itk.GetArrayFromMatrix(expected.GetDirection()),
+    )
+
+
+def test_round_trip_list():
+    frames = make_frames()
+    sequence = transform_object(ImageSequence(frames), serialize)
+
+    assert sequence["_imageSequence"] is True
+    assert sequence["offsets"] == [0, 120, 240]
+    assert "encoding" not in sequence
+    unpacked = unpack(sequence)
+    assert len(unpacked) == len(frames)
+    for image, expected in zip(unpacked, frames):
+        assert_same_image(image, expected)
+
+
+def test_round_trip_4d_image():
+    array = np.arange(2 * 3 * 4 * 5, dtype=np.float32).reshape((2, 3, 4, 5))
+    sequence = transform_object(ImageSequence(itk.GetImageFromArray(array)), serialize)
+
+    unpacked = unpack(sequence)
+    assert len(unpacked) == 2
+    for image, frame in zip(unpacked, array):
+        np.testing.assert_array_equal(itk.GetArrayViewFromImage(image), frame)
+
+
+def test_round_trip_sparse_sequence():
+    labels = []
+    for i in range(4):
+        array = np.zeros((8, 8, 8), np.uint8)
+        array[i : i + 2, 2:5, 3:6] = i + 1
+        labels.append(make_image(array))
+
+    sequence = itk_to_image_sequence(labels)
+    assert sequence["encoding"] == RUN_LENGTH_ENCODING
+    for image, expected in zip(unpack(sequence), labels):
+        assert_same_image(image, expected)
+
+    dense = itk_to_image_sequence(labels, sparse_threshold=None)
+    assert "encoding" not in dense
+    for image, expected in zip(unpack(dense), labels):
+        assert_same_image(image, expected)
+
+
+def test_plain_lists_are_not_packed():
+    frames = make_frames(2)
+    serialized = transform_object(frames, serialize)
+
+    assert isinstance(serialized, list)
+    assert [image["vtkClass"] for image in serialized] == ["vtkImageData"] * 2
+
+
+def test_unpackable_sequences_are_sent_image_by_image():
+    frames = make_frames(2)
+    frames.append(make_image(np.zeros((4, 5, 6), np.int16), spacing=(1, 1, 1)))
+    serialized = transform_object(ImageSequence(frames), serialize)
+
+    assert isinstance(serialized, list)
+    assert [image["vtkClass"] for image in serialized] == ["vtkImageData"] * 3
+
+
+@pytest.mark.parametrize("images", [[], [make_image(np.zeros((2, 2, 2)))]])
+def test_short_sequences_are_sent_image_by_image(images):
+    serialized = transform_object(ImageSequence(images), serialize)
+    assert serialized == [transform_object(image, serialize) for image in images]
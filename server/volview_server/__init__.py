@@ -1,8 +1,24 @@
 __version__ = "0.1.0"
 __author__ = "Kitware, Inc."
-__all__ = ["VolViewApi", "RpcRouter", "get_current_client_store", "get_current_session"]
+__all__ = [
+    "VolViewApi",
+    "RpcRouter",
+    "CachePolicy",
+    "CacheScope",
+    "AdmissionPolicy",
+    "Priority",
+    "ImageSequence",
+    "get_current_client_store",
+    "get_client_stores",
+    "get_current_session",
+    "get_session_image_store",
+]
 
 from volview_server.volview_api import VolViewApi
 from volview_server.rpc_router import RpcRouter
-from volview_server.client_store import get_current_client_store
-from volview_server.session import get_current_session
+from volview_server.result_cache import CachePolicy, CacheScope
+from volview_server.admission import AdmissionPolicy
+from volview_server.scheduling import Priority
+from volview_server.transformers import ImageSequence
+from volview_server.client_store import get_current_client_store, get_client_stores
+from volview_server.session import get_current_session, get_session_image_store
@@ -1,15 +1,24 @@
 import sys
 import re
 import os
+import time
 import argparse
 import importlib
 import logging
+from typing import Optional
 
 from aiohttp import web
 
 from volview_server.volview_api import VolViewApi
 from volview_server.rpc_server import RpcServer
-from volview_server.chunking import CHUNK_SIZE
+from volview_server.admission import AdmissionPolicy
+from volview_server.outbox import OUTBOX_MAX_BYTES, OUTBOX_TTL
+from volview_server.chunking import MAX_MESSAGE_SIZE, RESUME_TTL, SPILL_THRESHOLD
+from volview_server.profiling import DEFAULT_PROFILE_DIR
+from volview_server.loop_monitor import DEFAULT_THRESHOLD
+
+# modules whose import cost is worth calling out at startup
+HEAVY_MODULES = ["itk", "numpy", "vtk", "SimpleITK", "torch"]
 
 
 def parse_args():
@@ -23,10 +32,160 @@ def parse_args():
     parser.add_argument(
         "--verbose", default=False, action="store_true", help="Enable verbose logging."
     )
+    parser.add_argument(
+        "--binary-envelope",
+        default=False,
+        action="store_true",
+        help="Allow clients to use binary envelopes instead of JSON for RPC "
+        "messages.",
+    )
+    parser.add_argument(
+        "--spill-threshold",
+        type=int,
+        default=SPILL_THRESHOLD // 2**20,
+        help="Size in MiB above which uploads are reassembled on disk. "
+        "Use 0 to always reassemble in memory.",
+    )
+    parser.add_argument(
+        "--spill-dir",
+        default=None,
+        help="Directory for uploads reassembled on disk. "
+        "Defaults to the system temporary directory.",
+    )
+    parser.add_argument(
+        "--resume-ttl",
+        type=float,
+        default=None,
+        help="Seconds to keep interrupted chunked transfers, so that clients "
+        f"can resume them after reconnecting, e.g. {RESUME_TTL}. "
+        "By default, transfers are not resumable.",
+    )
+    parser.add_argument(
+        "--session-timeout",
+        type=float,
+        default=None,
+        help="Seconds after a client disconnects before its session is evicted. "
+        "By default, sessions are kept until the server stops.",
+    )
+    parser.add_argument(
+        "--outbox-ttl",
+        type=float,
+        default=None,
+        help="Seconds to keep results for a disconnected client, to replay "
+        f"when it reconnects, e.g. {OUTBOX_TTL}. By default, results are not "
+        "replayed.",
+    )
+    parser.add_argument(
+        "--outbox-size",
+        type=int,
+        default=OUTBOX_MAX_BYTES // 2**20,
+        help="Size in MiB of the results kept per disconnected client.",
+    )
+    parser.add_argument(
+        "--scratch-dir",
+        default=None,
+        help="Directory for disk-backed session images. "
+        "Defaults to the system temporary directory.",
+    )
+    parser.add_argument(
+        "--client-max-concurrent",
+        type=int,
+        default=None,
+        help="Maximum number of running calls per client. Further calls are "
+        "queued, and queues are served round-robin across clients.",
+    )
+    parser.add_argument(
+        "--client-max-inflight",
+        type=int,
+        default=None,
+        help="Maximum size in MiB of the arguments of running calls per client.",
+    )
+    parser.add_argument(
+        "--client-rate",
+        type=float,
+        default=None,
+        help="Maximum calls per second per client. Further calls are rejected "
+        "with a retry-after time.",
+    )
+    parser.add_argument(
+        "--client-max-queued",
+        type=int,
+        default=None,
+        help="Maximum queued calls per client. Further calls are rejected with "
+        "a retry-after time.",
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=None,
+        help="Maximum number of running calls across all clients.",
+    )
+    parser.add_argument(
+        "--profile",
+        default=False,
+        action="store_true",
+        help="Profile RPC endpoints with cProfile.",
+    )
+    parser.add_argument(
+        "--profile-endpoint",
+        action="append",
+        dest="profile_endpoints",
+        help="Only profile the given endpoint. Can be repeated.",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=DEFAULT_PROFILE_DIR,
+        help="Directory for .pstats files and the profile summary.",
+    )
+    parser.add_argument(
+        "--profile-admin-rpc",
+        default=False,
+        action="store_true",
+        help="Expose RPCs for toggling profiling at runtime. Do not use on "
+        "untrusted networks.",
+    )
+    parser.add_argument(
+        "--loop-monitor",
+        default=False,
+        action="store_true",
+        help="Log loop lag and endpoints that block the event loop.",
+    )
+    parser.add_argument(
+        "--block-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD * 1000,
+        help="Milliseconds the event loop may be blocked before it is reported.",
+    )
+    parser.add_argument(
+        "--loop-monitor-admin-rpc",
+        default=False,
+        action="store_true",
+        help="Expose an RPC for reading loop monitor stats. Do not use on "
+        "untrusted networks.",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        metavar="FILE",
+        help="Write spans of every RPC to a file, as Chrome trace events if it "
+        "ends in .json and as JSON lines otherwise.",
+    )
     parser.add_argument("api_script", help="Python file that exposes ServerApi")
     return parser.parse_args()
 
 
+def parse_admission_policy(args) -> Optional[AdmissionPolicy]:
+    max_inflight = args.client_max_inflight
+    policy = AdmissionPolicy(
+        max_concurrent=args.client_max_concurrent,
+        max_inflight_bytes=max_inflight * 2**20 if max_inflight else None,
+        rate=args.client_rate,
+        max_queued=args.client_max_queued,
+        max_total_concurrent=args.max_concurrent,
+    )
+    return policy if policy != AdmissionPolicy() else None
+
+
 def import_api_script(api_script_file: str):
     api_script_file = os.path.abspath(api_script_file)
     import_target = os.path.basename(api_script_file)
@@ -44,6 +203,22 @@ def import_api_script(api_script_file: str):
     return instance
 
 
+def report_import_cost(api_script_file: str, elapsed: float, preloaded: set):
+    """Prints how long the API script took to import, and what it pulled in.
+
+    Use `python -X importtime` for a per-module breakdown.
+    """
+    loaded = [
+        name for name in HEAVY_MODULES if name in sys.modules and name not in preloaded
+    ]
+    print(
+        f"Imported {api_script_file} in {elapsed:.2f}s"
+        + (f" (loaded {', '.join(loaded)})" if loaded else "")
+    )
+    if "itk" not in sys.modules:
+        print("ITK will be loaded on first image conversion")
+
+
 def run_server(
     api: VolViewApi,
     *,
@@ -61,7 +236,12 @@ def run_server(
         await rpc_server.teardown()
 
     async def start():
-        app = web.Application(client_max_size=CHUNK_SIZE)
+        # the server only starts listening once warm-up is done
+        for timing in await api.warm_up():
+            status = f"failed: {timing.error}" if timing.error else "ok"
+            print(f"Warm-up {timing.label}: {timing.seconds:.2f}s ({status})")
+
+        app = web.Application(client_max_size=MAX_MESSAGE_SIZE)
         rpc_server.sio.attach(app)
         rpc_server.setup()
         app.on_shutdown.append(stop)
@@ -71,22 +251,51 @@ def run_server(
 
 
 def main(args):
+    preloaded = set(sys.modules)
+    start = time.perf_counter()
     volview_api = import_api_script(args.api_script)
+    report_import_cost(args.api_script, time.perf_counter() - start, preloaded)
 
     if not isinstance(volview_api, VolViewApi):
         raise TypeError("Imported instance is not a VolViewApi")
 
+    if args.profile:
+        volview_api.profiler.enable(args.profile_endpoints, output_dir=args.profile_dir)
+    else:
+        volview_api.profiler.output_dir = args.profile_dir
+
+    if args.profile_admin_rpc:
+        volview_api.add_router(volview_api.profiler.admin_router())
+
+    if args.loop_monitor:
+        volview_api.loop_monitor.enable(args.block_threshold / 1000)
+    if args.loop_monitor_admin_rpc:
+        volview_api.add_router(volview_api.loop_monitor.admin_router())
+
+    if args.trace:
+        volview_api.tracer.enable(args.trace)
+
     run_server(
         volview_api,
         host=args.host,
         port=args.port,
         debug=args.verbose,
+        binary_envelope=args.binary_envelope,
+        admission=parse_admission_policy(args),
+        session_timeout=args.session_timeout,
+        scratch_dir=args.scratch_dir,
+        outbox_ttl=args.outbox_ttl or None,
+        outbox_max_bytes=args.outbox_size * 2**20,
+        # ChunkingAsyncServer kwargs
+        spill_threshold=args.spill_threshold * 2**20 or None,
+        spill_dir=args.spill_dir,
+        resume_ttl=args.resume_ttl or None,
         # socketio.AsyncServer kwargs
         async_handlers=True,
         cors_allowed_origins="*",
         logger=args.verbose,
         engineio_logger=args.verbose,
-        max_http_buffer_size=CHUNK_SIZE,
+        max_http_buffer_size=MAX_MESSAGE_SIZE,
     )
 
 
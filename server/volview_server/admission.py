@@ -0,0 +1,223 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from volview_server.deadlines import wait_with_deadline
+
+# suggested wait before retrying a call rejected for a full queue
+QUEUE_RETRY_AFTER = 1.0  # seconds
+
+logger = logging.getLogger("volview_server.admission")
+
+
+class Overloaded(Exception):
+    """A call was rejected, and can be retried after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionPolicy:
+    """Limits how much of the server each client can use at once.
+
+    Calls over a concurrency or byte limit wait in a per-client queue, and
+    queues are served round-robin across clients. Calls over the rate limit,
+    or that would overflow the queue, are rejected with a retry-after time.
+    Any limit left as None is not enforced.
+
+    Attributes:
+        - max_concurrent: running RPCs and streams per client.
+        - max_inflight_bytes: argument bytes of running calls per client. A
+          larger call still runs once the client has nothing else running.
+        - rate: calls per second per client, with bursts of up to `burst`.
+        - burst: defaults to the rate, rounded up.
+        - max_queued: calls waiting per client before new ones are rejected.
+        - max_total_concurrent: running calls across all clients.
+    """
+
+    max_concurrent: Optional[int] = None
+    max_inflight_bytes: Optional[int] = None
+    rate: Optional[float] = None
+    burst: Optional[int] = None
+    max_queued: Optional[int] = None
+    max_total_concurrent: Optional[int] = None
+
+
+@dataclass
+class _Waiter:
+    nbytes: int
+    future: asyncio.Future
+
+
+@dataclass
+class _ClientState:
+    running: int = 0
+    inflight_bytes: int = 0
+    tokens: float = 0.0
+    refilled: float = field(default_factory=time.monotonic)
+    queue: Deque[_Waiter] = field(default_factory=deque)
+    # dropped once idle, as the client has disconnected
+    forgotten: bool = False
+
+    @property
+    def idle(self) -> bool:
+        return not self.running and not self.queue
+
+
+class AdmissionController:
+    """Admits calls according to an AdmissionPolicy.
+
+    async with controller.admit(client_id, nbytes):
+        ...
+    """
+
+    def __init__(self, policy: AdmissionPolicy):
+        self.policy = policy
+        self.running = 0
+        self.rejected = 0
+        self._clients: Dict[str, _ClientState] = {}
+        # clients with queued calls, in round-robin order
+        self._waiting: "OrderedDict[str, None]" = OrderedDict()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(state.queue) for state in self._clients.values())
+
+    @asynccontextmanager
+    async def admit(self, client_id: str, nbytes: int = 0):
+        """Runs the block once the client's call is admitted.
+
+        Raises Overloaded if the call is rejected.
+        """
+        state = self._clients.get(client_id)
+        if state is None:
+            state = self._clients[client_id] = _ClientState(tokens=self._burst)
+        state.forgotten = False
+
+        self._take_token(client_id, state)
+        if state.queue or not self._can_run(state, nbytes):
+            await wait_with_deadline(
+                self._enqueue(client_id, state, nbytes), "waiting for admission"
+            )
+        else:
+            self._start(state, nbytes)
+
+        try:
+            yield
+        finally:
+            self._finish(client_id, state, nbytes)
+
+    def forget(self, client_id: str):
+        """Drops the state of a disconnected client, once its calls are done."""
+        state = self._clients.get(client_id)
+        if state:
+            state.forgotten = True
+            self._drop_if_forgotten(client_id, state)
+
+    def _drop_if_forgotten(self, client_id: str, state: _ClientState):
+        if state.forgotten and state.idle and self._clients.get(client_id) is state:
+            del self._clients[client_id]
+
+    @property
+    def _burst(self) -> float:
+        policy = self.policy
+        if policy.rate is None:
+            return 0.0
+        return float(policy.burst or max(1, int(-(-policy.rate // 1))))
+
+    def _take_token(self, client_id: str, state: _ClientState):
+        rate = self.policy.rate
+        if rate is None:
+            return
+
+        now = time.monotonic()
+        state.tokens = min(self._burst, state.tokens + (now - state.refilled) * rate)
+        state.refilled = now
+        if state.tokens < 1:
+            self._reject(client_id, "rate limit", (1 - state.tokens) / rate)
+        state.tokens -= 1
+
+    def _reject(self, client_id: str, reason: str, retry_after: float):
+        self.rejected += 1
+        logger.warning(f"Rejected a call from {client_id}: {reason}")
+        raise Overloaded(
+            f"Too many requests ({reason}), retry after {retry_after:.2f}s",
+            retry_after,
+        )
+
+    def _can_run(self, state: _ClientState, nbytes: int) -> bool:
+        policy = self.policy
+        if (
+            policy.max_total_concurrent is not None
+            and self.running >= policy.max_total_concurrent
+        ):
+            return False
+        if policy.max_concurrent is not None and state.running >= policy.max_concurrent:
+            return False
+        if (
+            policy.max_inflight_bytes is not None
+            and state.running
+            and state.inflight_bytes + nbytes > policy.max_inflight_bytes
+        ):
+            return False
+        return True
+
+    def _start(self, state: _ClientState, nbytes: int):
+        state.running += 1
+        state.inflight_bytes += nbytes
+        self.running += 1
+
+    async def _enqueue(self, client_id: str, state: _ClientState, nbytes: int):
+        max_queued = self.policy.max_queued
+        if max_queued is not None and len(state.queue) >= max_queued:
+            self._reject(client_id, "queue full", QUEUE_RETRY_AFTER)
+
+        waiter = _Waiter(nbytes, asyncio.get_running_loop().create_future())
+        state.queue.append(waiter)
+        self._waiting[client_id] = None
+        try:
+            # _dispatch() starts the call before resolving the future
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in state.queue:
+                state.queue.remove(waiter)
+                if not state.queue:
+                    self._waiting.pop(client_id, None)
+                self._drop_if_forgotten(client_id, state)
+            elif not waiter.future.cancelled():
+                # cancelled after being started
+                self._finish(client_id, state, nbytes)
+            raise
+
+    def _finish(self, client_id: str, state: _ClientState, nbytes: int):
+        state.running -= 1
+        state.inflight_bytes -= nbytes
+        self.running -= 1
+        self._dispatch()
+        self._drop_if_forgotten(client_id, state)
+
+    def _dispatch(self):
+        """Starts queued calls, taking one per client in turn."""
+        started = True
+        while started and self._waiting:
+            started = False
+            for client_id in list(self._waiting):
+                state = self._clients[client_id]
+                # skip waiters that were cancelled but not yet removed
+                while state.queue and state.queue[0].future.done():
+                    state.queue.popleft()
+                if state.queue and self._can_run(state, state.queue[0].nbytes):
+                    waiter = state.queue.popleft()
+                    self._start(state, waiter.nbytes)
+                    waiter.future.set_result(None)
+                    started = True
+                    # go to the back of the line
+                    self._waiting.move_to_end(client_id)
+                if not state.queue:
+                    del self._waiting[client_id]
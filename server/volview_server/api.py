@@ -1,12 +1,41 @@
 import asyncio
-import inspect
-from typing import Any, List, Callable, Union
+import logging
+import multiprocessing
+from dataclasses import dataclass
+from typing import Any, Dict, List, Callable, Iterable, Optional, Tuple, Union
 from contextvars import copy_context
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 
-from volview_server.rpc_router import RpcRouter, ExposeType
+from volview_server.rpc_router import (
+    RpcRouter,
+    ExposeType,
+    CallKind,
+    Endpoint,
+    EndpointInfo,
+)
+from volview_server.exceptions import KeyExistsError
+from volview_server.profiling import RpcProfiler
+from volview_server.loop_monitor import LoopMonitor
+from volview_server.tracing import Tracer, span
+from volview_server.single_flight import SingleFlight
+from volview_server.deadlines import current_deadline
+from volview_server.scheduling import Priority, PriorityScheduler, current_priority
+from volview_server.result_cache import (
+    CachePolicy,
+    CacheScope,
+    ResultCache,
+    make_cache_key,
+)
+from volview_server.warmup import (
+    FilterWarmup,
+    Warmup,
+    WarmupTiming,
+    get_worker_timings,
+    run_warmups,
+    warm_up_worker,
+)
 from volview_server.transformers import (
-    pipe,
+    compose,
     transform_object,
     default_serializers,
     default_deserializers,
@@ -15,10 +44,24 @@ from volview_server.transformers import (
 
 DEFAULT_NUM_THREADS = 4
 
+_GENERATOR_DONE = object()
+_CACHE_MISS = object()
+
+logger = logging.getLogger("volview_server.api")
+
+
+@dataclass
+class DispatchEntry:
+    fn: Callable
+    info: EndpointInfo
+    # index of the owning router in RpcApi._routers
+    precedence: int
+
 
 class RpcApi:
-    serializers: List[Transformer]
-    deserializers: List[Transformer]
+    profiler: RpcProfiler
+    loop_monitor: LoopMonitor
+    tracer: Tracer
 
     def __init__(
         self,
@@ -28,14 +71,89 @@ class RpcApi:
     ):
         self.serializers = serializers or []
         self.deserializers = deserializers or []
-        self._default_router = RpcRouter()
-        self._routers = [self._default_router]
+        self._routers: List[RpcRouter] = []
+        self._dispatch: Dict[str, DispatchEntry] = {}
+        self._caches: Dict[str, ResultCache] = {}
+        self._single_flight = SingleFlight()
         self._thread_pool = ThreadPoolExecutor(num_threads)
+        self._scheduler = PriorityScheduler(self._thread_pool, num_threads)
+        self._schedulers: Dict[Executor, PriorityScheduler] = {
+            self._thread_pool: self._scheduler
+        }
+        self.profiler = RpcProfiler()
+        self.loop_monitor = LoopMonitor()
+        self.tracer = Tracer()
+        self._warmups: List[Warmup] = []
+        # (pool, max_workers)
+        self._process_pools: List[Tuple[ProcessPoolExecutor, int]] = []
+        self._warmed_up = False
+        self._warmup_task: Optional[asyncio.Task] = None
+
+        self._default_router = RpcRouter()
+        self.add_router(self._default_router)
+
+    # The transformer lists are composed once, when assigned. Composed
+    # transforms iterate their list on each call, so transformers appended
+    # to the lists later are applied as well.
+
+    @property
+    def serializers(self) -> List[Transformer]:
+        return self._serializers
+
+    @serializers.setter
+    def serializers(self, serializers: List[Transformer]):
+        self._serializers = serializers
+        self._serialize = compose(serializers)
+
+    @property
+    def deserializers(self) -> List[Transformer]:
+        return self._deserializers
+
+    @deserializers.setter
+    def deserializers(self, deserializers: List[Transformer]):
+        self._deserializers = deserializers
+        self._deserialize = compose(deserializers)
 
     def add_router(self, router: RpcRouter):
+        """Adds a router's endpoints to this API.
+
+        Endpoints added to the router afterwards are picked up as well.
+
+        Raises a KeyExistsError if an endpoint name is already exposed by
+        another router.
+        """
+        precedence = len(self._routers)
+        for endpoint in router.endpoints.values():
+            self._check_conflict(endpoint)
+
         self._routers.append(router)
+        for endpoint in router.endpoints.values():
+            self._index_endpoint(endpoint, precedence)
+        router.add_listener(lambda endpoint: self._index_endpoint(endpoint, precedence))
+
+    def _check_conflict(self, endpoint: Endpoint):
+        _, info = endpoint
+        if info.name in self._dispatch:
+            owner = self._dispatch[info.name].precedence
+            raise KeyExistsError(
+                f"{info.name} is already registered by router #{owner}"
+            )
 
-    def expose(self, name_or_func: Union[str, Callable], transform_args=True):
+    def _index_endpoint(self, endpoint: Endpoint, precedence: int):
+        self._check_conflict(endpoint)
+        fn, info = endpoint
+        self._dispatch[info.name] = DispatchEntry(fn, info, precedence)
+        if info.cache:
+            self._caches[info.name] = ResultCache(info.cache)
+
+    def expose(
+        self,
+        name_or_func: Union[str, Callable],
+        transform_args=True,
+        cache: Optional[CachePolicy] = None,
+        single_flight: Union[bool, CacheScope] = False,
+        priority: Priority = Priority.NORMAL,
+    ):
         """Decorator that exposes a function as an RPC endpoint.
 
         See RpcRouter.add_endpoint() for more info.
@@ -55,32 +173,179 @@ class RpcApi:
             - transform_args(=true): transform input arguments and output
               results. Disable this if you do not want transform overhead
               or you want to explicitly transform your inputs and outputs.
+            - cache: a CachePolicy for reusing results of earlier calls with
+              equal arguments. Images and arrays are compared by content.
+
+                @volview.expose("blur", cache=CachePolicy(max_bytes=2**30))
+                def blur(image, sigma):
+                    ...
+
+            - single_flight(=false): concurrent calls with equal arguments
+              share one invocation and its result. True only shares it
+              between calls of the same client. CacheScope.GLOBAL shares it
+              between all clients, and runs it without a current client, so
+              the endpoint cannot use sessions or client stores. Shared
+              invocations have no deadline, as each caller waits within its
+              own.
+            - priority(=NORMAL): scheduling priority of the endpoint's work in
+              worker pools. Clients can override it per call.
         """
+        options = dict(
+            transform_args=transform_args,
+            cache=cache,
+            single_flight=single_flight,
+            priority=priority,
+        )
         if callable(name_or_func):
             fn = name_or_func
             name = fn.__name__
-            self._default_router.add_endpoint(name, fn, transform_args=transform_args)
+            self._default_router.add_endpoint(name, fn, **options)
             return fn
         elif type(name_or_func) is str:
             name = name_or_func
 
             def add_endpoint(fn):
-                self._default_router.add_endpoint(
-                    name, fn, transform_args=transform_args
-                )
+                self._default_router.add_endpoint(name, fn, **options)
                 return fn
 
             return add_endpoint
         else:
             raise TypeError("not given a name or function")
 
-    def _find_endpoint(self, rpc_name: str):
-        for router in self._routers:
-            if rpc_name in router.endpoints:
-                return router.endpoints[rpc_name]
-        raise KeyError(f"Cannot find RPC endpoint {rpc_name}")
+    @property
+    def ready(self) -> bool:
+        """Whether declared warm-ups have finished."""
+        return self._warmed_up or not self._warmups
+
+    def add_warmup(
+        self,
+        filter_or_fn: Union[str, Warmup],
+        pixel_types: Iterable[str] = (),
+        dimension: int = 3,
+    ):
+        """Declares work to run before the server accepts clients.
+
+        Given an ITK filter name, instantiates that filter for each of the
+        given ITK pixel type names (e.g. "F", "SS", "UC") and the dimension.
+        Otherwise, the given function is called with no arguments.
+
+        Warm-ups run in the main process and in every worker of pools created
+        with create_process_pool(). Functions must be picklable to run in
+        workers, i.e. defined at module level. Declare warm-ups before the
+        warm-up starts.
+
+            volview.add_warmup("MedianImageFilter", ["F", "SS"])
+        """
+        if self._warmed_up or self._warmup_task is not None:
+            raise RuntimeError("Cannot add a warm-up after warm-up has started")
+        if isinstance(filter_or_fn, str):
+            self._warmups.extend(
+                FilterWarmup(filter_or_fn, pixel_type, dimension)
+                for pixel_type in pixel_types
+            )
+        elif callable(filter_or_fn):
+            self._warmups.append(filter_or_fn)
+        else:
+            raise TypeError("not given a filter name or function")
+
+    def create_process_pool(self, max_workers: int) -> ProcessPoolExecutor:
+        """Creates a process pool whose workers run the declared warm-ups.
+
+        Declare warm-ups before creating the pool.
+        """
+        pool = ProcessPoolExecutor(
+            max_workers,
+            initializer=warm_up_worker,
+            initargs=(list(self._warmups), multiprocessing.Barrier(max_workers)),
+        )
+        self._process_pools.append((pool, max_workers))
+        self._schedulers[pool] = PriorityScheduler(pool, max_workers)
+        return pool
+
+    async def run_in_executor(
+        self,
+        fn: Callable,
+        *args,
+        executor: Optional[Executor] = None,
+        priority: Optional[Priority] = None,
+    ):
+        """Runs fn(*args) in a worker pool, ordered by priority.
+
+        Defaults to the API's thread pool and to the priority of the RPC
+        being handled. The executor must be the thread pool or a pool made by
+        create_process_pool().
+        """
+        scheduler = self._schedulers[executor or self._thread_pool]
+        return await scheduler.run(fn, *args, priority=priority)
+
+    async def warm_up(self) -> List[WarmupTiming]:
+        """Runs declared warm-ups and marks the API as ready.
 
-    async def invoke_rpc(self, rpc_name: str, *args, asyncio_loop=None, context=None):
+        Runs in the main process, then waits for every worker of pools made
+        by create_process_pool() to have finished its own warm-up.
+        """
+        loop = asyncio.get_running_loop()
+        timings = await loop.run_in_executor(
+            self._thread_pool, run_warmups, self._warmups
+        )
+
+        for pool, max_workers in self._process_pools:
+            reports = await asyncio.gather(
+                *(
+                    loop.run_in_executor(pool, get_worker_timings)
+                    for _ in range(max_workers)
+                )
+            )
+            reports = dict(reports)
+            if len(reports) != max_workers:
+                raise RuntimeError(
+                    f"Only {len(reports)} of {max_workers} workers reported warm-up"
+                )
+            for pid, worker_timings in reports.items():
+                for timing in worker_timings:
+                    timings.append(
+                        WarmupTiming(
+                            f"{timing.label} (worker {pid})",
+                            timing.seconds,
+                            timing.error,
+                        )
+                    )
+
+        self._warmed_up = True
+        total = sum(timing.seconds for timing in timings)
+        logger.info(f"Warm-up finished: {len(timings)} items in {total:.2f}s")
+        return timings
+
+    def start_warm_up(self) -> asyncio.Future:
+        """Starts warm-up in the background, unless it already started.
+
+        Returns the warm-up task. A failed warm-up is logged, and the API
+        serves clients without it.
+        """
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.ensure_future(self._try_warm_up())
+        return self._warmup_task
+
+    async def _try_warm_up(self):
+        try:
+            await self.warm_up()
+        except Exception:
+            logger.exception("Warm-up failed, serving clients without it")
+
+    def _find_endpoint(self, rpc_name: str) -> DispatchEntry:
+        try:
+            return self._dispatch[rpc_name]
+        except KeyError:
+            raise KeyError(f"Cannot find RPC endpoint {rpc_name}") from None
+
+    async def invoke_rpc(
+        self,
+        rpc_name: str,
+        *args,
+        asyncio_loop=None,
+        context=None,
+        priority: Optional[Priority] = None,
+    ):
         """Invokes an RPC endpoint.
 
         If the endpoint is a non-async function, then it is run in an asyncio
@@ -89,47 +354,171 @@ class RpcApi:
         If no asyncio_loop is given, the default running loop is used.
 
         If no context is given, the current context is copied.
+
+        If no priority is given, the endpoint's priority is used.
         """
-        fn, info = self._find_endpoint(rpc_name)
+        entry = self._find_endpoint(rpc_name)
+        info = entry.info
 
         if info.type != ExposeType.RPC:
             raise TypeError(f"Cannot invoke a non-RPC endpoint")
 
+        token = current_priority.set(info.priority if priority is None else priority)
+        try:
+            call = self._invoke_rpc(entry, args, asyncio_loop, context)
+            if self.loop_monitor.enabled:
+                call = self.loop_monitor.watch_awaitable(rpc_name, call)
+            return await call
+        finally:
+            current_priority.reset(token)
+
+    async def _invoke_rpc(self, entry: DispatchEntry, args, asyncio_loop, context):
+        rpc_name, info = entry.info.name, entry.info
+
         if info.transform_args:
-            args = [self.serialize_object(obj) for obj in args]
+            with span("deserialize"):
+                args = [self.deserialize_object(obj) for obj in args]
 
-        if inspect.iscoroutinefunction(fn):
-            result = await fn(*args)
+        cache = self._caches.get(rpc_name)
+        call_key = None
+        if cache is not None or info.single_flight:
+            call_key = await self._get_call_key(info, args)
+
+        if cache is not None and call_key is not None:
+            result = cache.get(call_key, _CACHE_MISS)
+            if result is not _CACHE_MISS:
+                return result
+
+        if info.single_flight and call_key is not None:
+            from volview_server.rpc_server import current_client_id
+
+            key = (rpc_name, call_key)
+            if info.single_flight is CacheScope.SESSION:
+                key = (rpc_name, current_client_id.get(None), call_key)
+            result = await self._single_flight.do(
+                key,
+                lambda: self._call_shared_rpc(entry, args, asyncio_loop, context),
+            )
         else:
-            loop = asyncio_loop or asyncio.get_running_loop()
-            ctx = context or copy_context()
-            result = await loop.run_in_executor(self._thread_pool, ctx.run, fn, *args)
+            result = await self._call_rpc(entry, args, asyncio_loop, context)
 
-        if info.transform_args:
-            result = self.serialize_object(result)
+        if cache is not None and call_key is not None:
+            cache.put(call_key, result)
+        return result
 
+    async def _call_rpc(self, entry: DispatchEntry, args, asyncio_loop, context):
+        fn, info = entry.fn, entry.info
+        profiling = self.profiler.enabled and self.profiler.should_profile(info.name)
+
+        if info.call_kind is CallKind.COROUTINE:
+            if profiling:
+                result = await self.profiler.profile_awaitable(info.name, fn(*args))
+            else:
+                result = await fn(*args)
+        else:
+            if profiling:
+                fn = self.profiler.wrap_sync(info.name, fn)
+            result = await self._scheduler.run_in_context(
+                fn, *args, context=context, loop=asyncio_loop
+            )
+
+        if info.transform_args:
+            with span("serialize"):
+                result = self.serialize_object(result)
         return result
 
-    async def invoke_stream(self, stream_name: str, *args):
+    async def _call_shared_rpc(self, entry: DispatchEntry, args, asyncio_loop, context):
+        """Runs an invocation that concurrent callers share.
+
+        It runs in its own task, so the first caller's deadline and, for
+        calls shared between clients, its client are unset here rather than
+        for the caller.
+        """
+        from volview_server.rpc_server import current_client_id
+
+        def unbind():
+            current_deadline.set(None)
+            if entry.info.single_flight is CacheScope.GLOBAL:
+                current_client_id.set(None)
+
+        unbind()
+        if context is not None:
+            context = context.copy()
+            context.run(unbind)
+        return await self._call_rpc(entry, args, asyncio_loop, context)
+
+    async def _get_call_key(self, info: EndpointInfo, args) -> Optional[Tuple]:
+        """Hashes RPC arguments in the thread pool, since images can be large.
+
+        Keys of session-scoped caches include the client ID. Returns None if
+        the arguments cannot be hashed.
+        """
+        try:
+            digest = await self._scheduler.run(make_cache_key, tuple(args))
+        except TypeError as exc:
+            logger.warning(f"Not caching or deduplicating {info.name}: {exc}")
+            return None
+
+        if info.cache and info.cache.scope is CacheScope.SESSION:
+            from volview_server.rpc_server import current_client_id
+
+            return (current_client_id.get(None), digest)
+        return (digest,)
+
+    def get_cache(self, rpc_name: str) -> Optional[ResultCache]:
+        """Returns the result cache of an endpoint, if it has one."""
+        return self._caches.get(rpc_name)
+
+    async def invoke_stream(
+        self, stream_name: str, *args, priority: Optional[Priority] = None
+    ):
         """Invokes a stream endpoint.
 
         This is an async generator that produces result data.
+
+        If no priority is given, the endpoint's priority is used.
         """
-        fn, info = self._find_endpoint(stream_name)
+        entry = self._find_endpoint(stream_name)
+        fn, info = entry.fn, entry.info
 
         if info.type != ExposeType.STREAM:
             raise TypeError(f"Cannot stream from a non-stream endpoint")
 
+        # the generator's context is that of whoever iterates it
+        current_priority.set(info.priority if priority is None else priority)
+
         if info.transform_args:
-            args = [self.serialize_object(obj) for obj in args]
+            with span("deserialize"):
+                args = [self.deserialize_object(obj) for obj in args]
 
-        async for data in fn(*args):
+        if info.call_kind is CallKind.GENERATOR:
+            stream = self._iterate_in_executor(fn(*args))
+        else:
+            stream = fn(*args)
+        if self.profiler.enabled and self.profiler.should_profile(stream_name):
+            stream = self.profiler.profile_async_generator(stream_name, stream)
+        if self.loop_monitor.enabled:
+            stream = self.loop_monitor.watch_async_generator(stream_name, stream)
+
+        async for data in stream:
             if info.transform_args:
-                data = self.deserialize_object(data)
+                with span("serialize"):
+                    data = self.serialize_object(data)
             yield data
 
+    async def _iterate_in_executor(self, generator):
+        """Runs each step of a sync generator in the thread pool."""
+        ctx = copy_context()
+        while True:
+            item = await self._scheduler.run_in_context(
+                next, generator, _GENERATOR_DONE, context=ctx
+            )
+            if item is _GENERATOR_DONE:
+                return
+            yield item
+
     def serialize_object(self, obj: Any):
-        return transform_object(obj, lambda o: pipe(o, *self.serializers))
+        return transform_object(obj, self._serialize)
 
     def deserialize_object(self, obj: Any):
-        return transform_object(obj, lambda o: pipe(o, *self.deserializers))
+        return transform_object(obj, self._deserialize)
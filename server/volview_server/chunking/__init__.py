@@ -1,4 +1,22 @@
-__all__ = ["CHUNK_SIZE", "ChunkingAsyncServer"]
+__all__ = [
+    "CHUNK_SIZE",
+    "MAX_MESSAGE_SIZE",
+    "SPILL_THRESHOLD",
+    "RESUME_TTL",
+    "CLIENT_ID_QS",
+    "ChunkingAsyncServer",
+    "ChunkingAsyncClient",
+    "ENVELOPE_MODE_JSON",
+    "ENVELOPE_MODE_BINARY",
+]
 
-from .chunking_packet import CHUNK_SIZE
+from .chunking_packet import (
+    CHUNK_SIZE,
+    CLIENT_ID_QS,
+    MAX_MESSAGE_SIZE,
+    SPILL_THRESHOLD,
+)
+from .transfers import RESUME_TTL
 from .chunking_server import ChunkingAsyncServer
+from .chunking_client import ChunkingAsyncClient
+from .binary_envelope import ENVELOPE_MODE_JSON, ENVELOPE_MODE_BINARY
@@ -0,0 +1,263 @@
+import mmap
+import struct
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+ENVELOPE_MAGIC = 0xB1
+ENVELOPE_MODE_JSON = "json"
+ENVELOPE_MODE_BINARY = "binary"
+
+TAG_NULL = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT32 = 3
+TAG_FLOAT64 = 4
+TAG_STRING = 5
+TAG_BYTES = 6
+TAG_ARRAY = 7
+TAG_OBJECT = 8
+TAG_TYPED_ARRAY = 9
+
+# binary payloads start at offsets aligned to this, so that the receiver can
+# create typed array views without copying.
+ALIGNMENT = 8
+
+# typed array code -> little-endian numpy dtype
+TYPED_ARRAY_DTYPES = {
+    1: np.dtype("<i1"),  # Int8Array
+    2: np.dtype("<u1"),  # Uint8Array
+    3: np.dtype("<i2"),  # Int16Array
+    4: np.dtype("<u2"),  # Uint16Array
+    5: np.dtype("<i4"),  # Int32Array
+    6: np.dtype("<u4"),  # Uint32Array
+    7: np.dtype("<f4"),  # Float32Array
+    8: np.dtype("<f8"),  # Float64Array
+    9: np.dtype("<i8"),  # BigInt64Array
+    10: np.dtype("<u8"),  # BigUint64Array
+}
+DTYPE_TYPED_ARRAY_CODES = {dtype: code for code, dtype in TYPED_ARRAY_DTYPES.items()}
+
+INT32_MIN = -(2**31)
+INT32_MAX = 2**31 - 1
+UINT32_MAX = 2**32 - 1
+
+_u8 = struct.Struct("<B")
+_u32 = struct.Struct("<I")
+_i32 = struct.Struct("<i")
+_f64 = struct.Struct("<d")
+_header = struct.Struct("<BB")
+
+
+class EnvelopeError(Exception):
+    """A binary envelope could not be encoded or decoded."""
+
+
+def _pack_length(length: int) -> bytes:
+    if length > UINT32_MAX:
+        raise EnvelopeError(f"Cannot encode {length} items or bytes in an envelope")
+    return _u32.pack(length)
+
+
+class _Writer:
+    def __init__(self):
+        self.parts: List[Any] = []
+        self.offset = 0
+
+    def write(self, data):
+        self.parts.append(data)
+        self.offset += len(data)
+
+    def write_aligned(self, data: memoryview):
+        # the pad length is stored as a byte in front of the padding
+        pad = (ALIGNMENT - (self.offset + 1) % ALIGNMENT) % ALIGNMENT
+        self.write(_u8.pack(pad) + bytes(pad))
+        self.write(data)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+def _write_str(writer: _Writer, string: str):
+    encoded = string.encode("utf-8")
+    writer.write(_pack_length(len(encoded)))
+    writer.write(encoded)
+
+
+def _write_value(writer: _Writer, value: Any):
+    if value is None:
+        writer.write(_u8.pack(TAG_NULL))
+    elif value is True:
+        writer.write(_u8.pack(TAG_TRUE))
+    elif value is False:
+        writer.write(_u8.pack(TAG_FALSE))
+    elif isinstance(value, str):
+        writer.write(_u8.pack(TAG_STRING))
+        _write_str(writer, value)
+    elif isinstance(value, int) and INT32_MIN <= value <= INT32_MAX:
+        writer.write(_u8.pack(TAG_INT32) + _i32.pack(value))
+    elif isinstance(value, (int, float)):
+        writer.write(_u8.pack(TAG_FLOAT64) + _f64.pack(value))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = memoryview(value)
+        data = data.cast("B") if data.nbytes else memoryview(b"")
+        writer.write(_u8.pack(TAG_BYTES) + _pack_length(data.nbytes))
+        writer.write_aligned(data)
+    elif isinstance(value, np.ndarray):
+        _write_ndarray(writer, value)
+    elif isinstance(value, np.generic):
+        _write_value(writer, value.item())
+    elif isinstance(value, (list, tuple)):
+        writer.write(_u8.pack(TAG_ARRAY) + _pack_length(len(value)))
+        for item in value:
+            _write_value(writer, item)
+    elif isinstance(value, dict):
+        writer.write(_u8.pack(TAG_OBJECT) + _pack_length(len(value)))
+        for key, item in value.items():
+            _write_str(writer, str(key))
+            _write_value(writer, item)
+    else:
+        raise EnvelopeError(f"Cannot encode value of type {type(value).__name__}")
+
+
+def _write_ndarray(writer: _Writer, array: np.ndarray):
+    dtype = array.dtype.newbyteorder("<")
+    code = DTYPE_TYPED_ARRAY_CODES.get(dtype)
+    if code is None:
+        if dtype == np.bool_:
+            code, dtype = DTYPE_TYPED_ARRAY_CODES[np.dtype("<u1")], np.dtype("<u1")
+        else:
+            raise EnvelopeError(f"Cannot encode ndarray of dtype {array.dtype}")
+
+    data = np.ascontiguousarray(array, dtype=dtype).reshape(-1)
+    writer.write(_header.pack(TAG_TYPED_ARRAY, code) + _pack_length(data.nbytes))
+    # empty views cannot be cast
+    writer.write_aligned(memoryview(data).cast("B") if data.size else memoryview(b""))
+
+
+def encode_envelope(
+    packet_type: int, namespace: Optional[str], id: Optional[int], data: Any
+) -> bytes:
+    """Encodes a socket.io packet as a binary envelope.
+
+    Format (little-endian):
+
+        u8 magic (0xB1) | u8 packet type | str namespace | i32 id (-1: none)
+        | value
+
+    A str is a u32 byte length followed by UTF-8 bytes. A value is a u8 tag
+    followed by its payload:
+
+        NULL, FALSE, TRUE: no payload
+        INT32: i32
+        FLOAT64: f64
+        STRING: str
+        BYTES: u32 length | aligned data
+        ARRAY: u32 count | values
+        OBJECT: u32 count | (str key, value)...
+        TYPED_ARRAY: u8 type code | u32 byte length | aligned data
+
+    Aligned data is preceded by a u8 pad length and that many zero bytes, so
+    that it starts at a multiple of 8 bytes from the start of the envelope.
+
+    bytes-like values are sent as BYTES and ndarrays as TYPED_ARRAY, both
+    without per-element conversion.
+    """
+    writer = _Writer()
+    writer.write(_header.pack(ENVELOPE_MAGIC, packet_type))
+    _write_str(writer, namespace or "/")
+    writer.write(_i32.pack(-1 if id is None else id))
+    _write_value(writer, data)
+    return writer.getvalue()
+
+
+def is_envelope(message: Any) -> bool:
+    # uploads spilled to disk are reassembled as an mmap
+    return isinstance(message, (bytes, mmap.mmap)) and message[:1] == bytes(
+        [ENVELOPE_MAGIC]
+    )
+
+
+class _Reader:
+    def __init__(self, buffer: bytes):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.offset = 0
+
+    def unpack(self, fmt: struct.Struct):
+        values = fmt.unpack_from(self.buffer, self.offset)
+        self.offset += fmt.size
+        return values[0] if len(values) == 1 else values
+
+    def read_span(self, length: int) -> memoryview:
+        """Returns a view of the next length bytes, without copying them."""
+        end = self.offset + length
+        if end > len(self.view):
+            raise EnvelopeError("Binary envelope is truncated")
+        span = self.view[self.offset : end]
+        self.offset = end
+        return span
+
+    def read_str(self) -> str:
+        return str(self.read_span(self.unpack(_u32)), "utf-8")
+
+    def skip_padding(self):
+        pad = self.unpack(_u8)
+        self.offset += pad
+
+    def read_value(self) -> Any:
+        tag = self.unpack(_u8)
+        if tag == TAG_NULL:
+            return None
+        if tag == TAG_FALSE:
+            return False
+        if tag == TAG_TRUE:
+            return True
+        if tag == TAG_INT32:
+            return self.unpack(_i32)
+        if tag == TAG_FLOAT64:
+            return self.unpack(_f64)
+        if tag == TAG_STRING:
+            return self.read_str()
+        if tag == TAG_BYTES:
+            length = self.unpack(_u32)
+            self.skip_padding()
+            # a read-only view into the received message, without a copy
+            return self.read_span(length)
+        if tag == TAG_ARRAY:
+            return [self.read_value() for _ in range(self.unpack(_u32))]
+        if tag == TAG_OBJECT:
+            count = self.unpack(_u32)
+            return {self.read_str(): self.read_value() for _ in range(count)}
+        if tag == TAG_TYPED_ARRAY:
+            code = self.unpack(_u8)
+            length = self.unpack(_u32)
+            self.skip_padding()
+            dtype = TYPED_ARRAY_DTYPES.get(code)
+            if dtype is None:
+                raise EnvelopeError(f"Unknown typed array code {code}")
+            # a read-only view into the received message, without a copy
+            return np.frombuffer(self.read_span(length), dtype=dtype)
+        raise EnvelopeError(f"Unknown value tag {tag}")
+
+
+def decode_envelope(message: bytes) -> Tuple[int, str, Optional[int], Any]:
+    """Decodes a binary envelope into (packet type, namespace, id, data).
+
+    Bytes are decoded into memoryviews, and typed arrays into read-only
+    ndarrays, that view the message without copying it.
+    """
+    if not is_envelope(message):
+        raise EnvelopeError("Message is not a binary envelope")
+
+    try:
+        reader = _Reader(message)
+        reader.offset = 1
+        packet_type = reader.unpack(_u8)
+        namespace = reader.read_str()
+        id = reader.unpack(_i32)
+        data = reader.read_value()
+    except (struct.error, UnicodeDecodeError, ValueError) as exc:
+        raise EnvelopeError("Malformed binary envelope") from exc
+
+    return packet_type, namespace, None if id == -1 else id, data
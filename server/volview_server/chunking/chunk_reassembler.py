@@ -0,0 +1,267 @@
+import mmap
+import time
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from typing import IO, Dict, List, Optional
+
+from .chunking_packet import (
+    ACK_INTERVAL,
+    ACK_PACKET_TYPE,
+    ChunkingHeader,
+    EncodedMessage,
+    encode_control,
+    parse_header,
+)
+from .transfers import RESUME_TTL
+
+logger = logging.getLogger("volview_server.chunking")
+
+
+@dataclass
+class PartialTransfer:
+    """The received part of a chunked transfer."""
+
+    sizes: List[int]
+    transfer_id: Optional[str] = None
+    # the client that may resume the transfer
+    owner: Optional[str] = None
+    # chunks received across all messages
+    received: int = 0
+    # the message being reassembled
+    index: int = 0
+    chunks: List[EncodedMessage] = field(default_factory=list)
+    num_chunks: int = 0
+    num_bytes: int = 0
+    spill_file: Optional[IO[bytes]] = None
+    # reassembled messages of a resumable transfer, held until it completes
+    messages: List[EncodedMessage] = field(default_factory=list)
+    # monotonic time, once the transfer is parked
+    expires: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.sizes)
+
+    @property
+    def done(self) -> bool:
+        return self.received >= self.total
+
+    def close(self):
+        if self.spill_file:
+            self.spill_file.close()
+            self.spill_file = None
+        self.chunks = []
+        self.messages = []
+
+
+class ChunkReassembler:
+    """Reassembles the chunked messages of a single connection.
+
+    Binary messages larger than spill_threshold bytes are reassembled in an
+    anonymous temporary file under spill_dir instead of in memory, and are
+    returned as a read-only mmap. np.frombuffer() works on it as on bytes. The
+    file is removed once the mmap is garbage collected.
+
+    Resumable transfers that are interrupted by close() are kept in `parked`
+    for resume_ttl seconds, along with recently completed ones. Reassemblers
+    of a server share `parked`, so that a transfer can be resumed over a new
+    connection of the same owner.
+
+    See ChunkedPacket for more info.
+    """
+
+    def __init__(
+        self,
+        spill_threshold: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        parked: Optional[Dict[str, PartialTransfer]] = None,
+        resume_ttl: float = RESUME_TTL,
+        owner: Optional[str] = None,
+    ):
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.parked = {} if parked is None else parked
+        self.resume_ttl = resume_ttl
+        self.owner = owner
+        self._transfer: Optional[PartialTransfer] = None
+        # chunks to drop, e.g. resent ones that were already received
+        self._skip = 0
+        self._ack: Optional[str] = None
+
+    @property
+    def idle(self) -> bool:
+        """Whether the next message is not a chunk."""
+        return self._transfer is None and not self._skip
+
+    def feed(self, data: EncodedMessage) -> List[EncodedMessage]:
+        """Consumes a received message.
+
+        Returns the socket.io messages that are complete, if any.
+        """
+        if self._skip:
+            self._skip -= 1
+            return []
+        if self._transfer is not None:
+            return self._add_chunk(data)
+
+        header = parse_header(data)
+        if header is None:
+            return [data]
+        self._start(header)
+        return []
+
+    def take_ack(self) -> Optional[str]:
+        """Returns an acknowledgement to send to the sender, if one is due."""
+        ack, self._ack = self._ack, None
+        return ack
+
+    def close(self):
+        """Parks an interrupted resumable transfer, and discards others."""
+        transfer, self._transfer = self._transfer, None
+        self._skip = 0
+        if transfer is None:
+            return
+        if transfer.transfer_id is not None and self.resume_ttl:
+            self._park(transfer)
+            logger.info(
+                f"Interrupted transfer {transfer.transfer_id} at chunk "
+                f"{transfer.received} of {transfer.total}"
+            )
+        else:
+            transfer.close()
+
+    def _start(self, header: ChunkingHeader):
+        self._prune()
+        transfer_id = header.transfer_id
+        if transfer_id is None:
+            self._transfer = PartialTransfer(header.sizes)
+            return
+
+        transfer = self.parked.get(transfer_id)
+        if transfer is not None and transfer.owner != self.owner:
+            logger.warning(f"Transfer {transfer_id} belongs to another client")
+            self._skip = header.total - header.offset
+            return
+
+        self.parked.pop(transfer_id, None)
+        if transfer is None and not header.offset:
+            self._transfer = PartialTransfer(header.sizes, transfer_id, self.owner)
+            return
+
+        if (
+            transfer is None
+            or transfer.sizes != header.sizes
+            or transfer.received < header.offset
+        ):
+            logger.warning(f"Cannot resume transfer {transfer_id}, dropping it")
+            if transfer:
+                transfer.close()
+            self._skip = header.total - header.offset
+            return
+
+        self._skip = transfer.received - header.offset
+        if transfer.done:
+            # the sender missed the last acknowledgement
+            self._park(transfer)
+            self._ack = encode_control(ACK_PACKET_TYPE, transfer_id, transfer.received)
+        else:
+            logger.info(
+                f"Resuming transfer {transfer_id} at chunk {transfer.received} "
+                f"of {transfer.total}"
+            )
+            self._transfer = transfer
+
+    def _add_chunk(self, data: EncodedMessage) -> List[EncodedMessage]:
+        transfer = self._transfer
+        transfer.received += 1
+        transfer.num_chunks += 1
+        transfer.num_bytes += len(data)
+
+        if transfer.spill_file:
+            if type(data) is not bytes:
+                raise TypeError("Received a set of unknown chunks")
+            transfer.spill_file.write(data)
+        else:
+            transfer.chunks.append(data)
+            if (
+                self.spill_threshold is not None
+                and type(data) is bytes
+                and transfer.num_bytes > self.spill_threshold
+            ):
+                self._spill(transfer)
+
+        messages = []
+        if transfer.num_chunks == transfer.sizes[transfer.index]:
+            if transfer.spill_file:
+                message = self._reconstruct_spilled(transfer)
+            else:
+                message = self._reconstruct_chunks(transfer.chunks)
+            transfer.chunks = []
+            transfer.num_chunks = 0
+            transfer.num_bytes = 0
+            transfer.index += 1
+            if transfer.transfer_id is None:
+                messages.append(message)
+            else:
+                transfer.messages.append(message)
+
+        if transfer.transfer_id is not None and (
+            transfer.done or transfer.received % ACK_INTERVAL == 0
+        ):
+            self._ack = encode_control(
+                ACK_PACKET_TYPE, transfer.transfer_id, transfer.received
+            )
+
+        if transfer.done:
+            self._transfer = None
+            if transfer.transfer_id is not None:
+                messages, transfer.messages = transfer.messages, []
+                # remembered in case the sender resends it
+                self._park(transfer)
+        return messages
+
+    def _park(self, transfer: PartialTransfer):
+        transfer.expires = time.monotonic() + self.resume_ttl
+        self.parked[transfer.transfer_id] = transfer
+
+    def _prune(self):
+        now = time.monotonic()
+        for transfer_id, transfer in list(self.parked.items()):
+            if transfer.expires <= now:
+                del self.parked[transfer_id]
+                transfer.close()
+
+    def _spill(self, transfer: PartialTransfer):
+        if not all(type(c) is bytes for c in transfer.chunks):
+            raise TypeError("Received a set of unknown chunks")
+
+        logger.info(
+            f"Spilling an upload of more than {transfer.num_bytes} bytes to disk"
+        )
+        transfer.spill_file = tempfile.TemporaryFile(
+            prefix="volview-upload-", dir=self.spill_dir
+        )
+        for chunk in transfer.chunks:
+            transfer.spill_file.write(chunk)
+        transfer.chunks = []
+
+    def _reconstruct_spilled(self, transfer: PartialTransfer) -> mmap.mmap:
+        spill_file, transfer.spill_file = transfer.spill_file, None
+        with spill_file:
+            spill_file.flush()
+            # the mapping stays valid after the file is closed
+            return mmap.mmap(spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _reconstruct_chunks(self, chunks):
+        if all(type(c) is str for c in chunks):
+            return self._reconstruct_string(chunks)
+        if all(type(c) is bytes for c in chunks):
+            return self._reconstruct_binary(chunks)
+        raise TypeError("Received a set of unknown chunks")
+
+    def _reconstruct_string(self, chunks: List[str]):
+        return "".join(chunks)
+
+    def _reconstruct_binary(self, chunks: List[bytes]):
+        return b"".join(chunks)
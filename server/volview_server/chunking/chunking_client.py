@@ -0,0 +1,125 @@
+from typing import Dict, Optional
+
+from socketio import AsyncClient
+from socketio import packet
+
+from .chunking_packet import (
+    ACK_PACKET_TYPE,
+    RESUME_PACKET_TYPE,
+    RESUMABLE_QS,
+    ChunkedPacket,
+    EncodedMessage,
+    chunk_messages,
+    encode_control,
+    parse_control,
+)
+from .chunk_reassembler import ChunkReassembler, PartialTransfer
+from .transfers import OutgoingTransfers, TransferRecorder
+from .binary_envelope import decode_envelope, encode_envelope, is_envelope
+
+
+class ChunkingAsyncClient(AsyncClient):
+    """A socket.io client that handles chunked messages.
+
+    This mirrors the VolView viewer's chunked parser, and is used to drive
+    the server from Python, e.g. for load testing.
+
+    Set `binary_envelope` once the server has agreed to it, to send events
+    as binary envelopes. Received envelopes are always accepted.
+
+    With `resumable_transfers`, chunked transfers interrupted by a dropped
+    connection are resumed once the client reconnects. The server only
+    resumes them for urls with the same `clientId` query parameter.
+
+    See ChunkedPacket for more info.
+    """
+
+    def __init__(self, *args, resumable_transfers: bool = True, **kwargs):
+        super().__init__(*args, serializer=ChunkedPacket, **kwargs)
+        self.resumable_transfers = resumable_transfers
+        self.binary_envelope = False
+        # transfer ID -> interrupted or recently completed download
+        self._parked: Dict[str, PartialTransfer] = {}
+        self._reassembler = ChunkReassembler(parked=self._parked)
+        self._outgoing = OutgoingTransfers()
+        # set once the server accepts resumable transfers
+        self._recorder: Optional[TransferRecorder] = None
+
+    async def connect(self, url: str, *args, **kwargs):
+        if self.resumable_transfers:
+            url += f"{'&' if '?' in url else '?'}{RESUMABLE_QS}=1"
+        await super().connect(url, *args, **kwargs)
+
+    async def _send_packet(self, pkt):
+        if self.binary_envelope and pkt.packet_type in (
+            packet.EVENT,
+            packet.BINARY_EVENT,
+        ):
+            envelope = encode_envelope(packet.EVENT, pkt.namespace, pkt.id, pkt.data)
+            messages = chunk_messages([envelope])
+        else:
+            encoded_packet = pkt.encode()
+            messages = (
+                encoded_packet if type(encoded_packet) is list else [encoded_packet]
+            )
+
+        for message in messages:
+            await self._send_message(message)
+
+    async def _send_message(self, message: EncodedMessage):
+        if self._recorder:
+            message = self._recorder.prepare(message)
+        await self.eio.send(message)
+
+    async def _handle_eio_message(self, data):
+        if self._reassembler.idle:
+            control = parse_control(data)
+            if control is not None:
+                await self._handle_control(*control)
+                return
+
+        messages = self._reassembler.feed(data)
+        ack = self._reassembler.take_ack()
+        if ack:
+            await self.eio.send(ack)
+
+        for message in messages:
+            if is_envelope(message) and self._binary_packet is None:
+                packet_type, namespace, id, data = decode_envelope(message)
+                if packet_type == packet.EVENT:
+                    await self._handle_event(namespace, id, data)
+                elif packet_type == packet.ACK:
+                    await self._handle_ack(namespace, id, data)
+            else:
+                await super()._handle_eio_message(message)
+
+    async def _handle_control(
+        self, packet_type: str, transfer_id: Optional[str], offset: int
+    ):
+        if transfer_id is None:
+            if packet_type != ACK_PACKET_TYPE:
+                return
+            # the server accepts resumable transfers
+            self._recorder = TransferRecorder(self._outgoing)
+            await self._resume_transfers()
+        elif packet_type == ACK_PACKET_TYPE:
+            self._outgoing.ack(transfer_id, offset)
+        elif packet_type == RESUME_PACKET_TYPE:
+            for message in self._outgoing.resume(transfer_id, offset) or []:
+                await self.eio.send(message)
+
+    async def _resume_transfers(self):
+        for transfer_id, transfer in list(self._parked.items()):
+            if not transfer.done:
+                await self.eio.send(
+                    encode_control(RESUME_PACKET_TYPE, transfer_id, transfer.received)
+                )
+        for transfer in self._outgoing.unfinished():
+            for message in transfer.messages(transfer.acked):
+                await self.eio.send(message)
+
+    async def _handle_eio_disconnect(self, *args):
+        self._reassembler.close()
+        self._recorder = None
+        self.binary_envelope = False
+        await super()._handle_eio_disconnect(*args)
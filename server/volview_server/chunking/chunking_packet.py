@@ -1,10 +1,26 @@
 import json
-from typing import List, Union
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
 
 from socketio.packet import Packet
 
 CHUNK_SIZE = 1 * 1024 * 1024
+# Transport limits must admit a full chunk plus framing overhead. aiohttp
+# rejects websocket messages whose size is equal to its limit.
+MAX_MESSAGE_SIZE = CHUNK_SIZE + 1024
+# reassembled binary messages above this size are kept on disk
+SPILL_THRESHOLD = 256 * 1024 * 1024
 CHUNKED_PACKET_TYPE = "C"
+ACK_PACKET_TYPE = "A"
+RESUME_PACKET_TYPE = "R"
+# query parameter with which clients ask for resumable transfers
+RESUMABLE_QS = "resumableTransfers"
+# query parameter that identifies the client across connections
+CLIENT_ID_QS = "clientId"
+# receivers of resumable transfers acknowledge every this many chunks
+ACK_INTERVAL = 16
+
+_CONTROL_PREFIXES = (f"{ACK_PACKET_TYPE}{{", f"{RESUME_PACKET_TYPE}{{")
 
 EncodedMessage = Union[str, bytes]
 
@@ -36,39 +52,158 @@ class ChunkedPacket(Packet):
     message.
 
     Chunking works on both string and binary messages.
+
+    Resumable transfers
+
+    Clients that connect with the `resumableTransfers=1` and `clientId` query
+    parameters can resume chunked transfers that a dropped connection
+    interrupted, over a later connection with the same client ID. The server
+    accepts by sending an empty acknowledgement, `A{}`, as soon as the client
+    connects. Both sides then send chunking messages with a transfer ID:
+
+    `C{"id":"<transfer ID>","sizes":[N1, N2, ...],"offset":K}`
+
+    The chunks that follow start at chunk K of the transfer, counting chunks
+    across all messages. The offset is 0 if missing. Messages of a resumable
+    transfer are only processed once all of its chunks arrived.
+
+    Receivers acknowledge every ACK_INTERVAL chunks, and the last one, with
+    `A{"id":"<transfer ID>","offset":K}`, where K is the number of chunks
+    received. Senders keep chunks until they are acknowledged.
+
+    After reconnecting, the client asks the server to resend the rest of an
+    interrupted download with `R{"id":"<transfer ID>","offset":K}`, and
+    resends interrupted uploads from the last acknowledged offset. Receivers
+    skip chunks they already have.
     """
 
+    @classmethod
+    def data_is_binary(cls, data):
+        if isinstance(data, memoryview):
+            return True
+        return super().data_is_binary(data)
+
+    @classmethod
+    def _deconstruct_binary_internal(cls, data, attachments):
+        # engine.io only sends bytes, so buffer views (e.g. from ndarrays) are
+        # copied once here rather than by the transformers.
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return super()._deconstruct_binary_internal(data, attachments)
+
     def encode(self):
         encoded_packet = super().encode()
         msgs = encoded_packet if type(encoded_packet) is list else [encoded_packet]
+        return chunk_messages(msgs)
+
+
+def chunk_messages(msgs: List[EncodedMessage]) -> List[EncodedMessage]:
+    """Splits socket.io messages into chunks, prefixed by a chunking message.
+
+    See ChunkedPacket for the format.
+    """
+    # skip chunking info if all messages are smaller than chunk size.
+    if all(len(msg) <= CHUNK_SIZE for msg in msgs):
+        return msgs
+
+    output: List[EncodedMessage] = []
+    chunked_sizes: List[int] = []
+
+    for msg in msgs:
+        chunks = _chunk_message(msg)
+        chunked_sizes.append(len(chunks))
+        output.extend(chunks)
+
+    return [encode_header(ChunkingHeader(chunked_sizes)), *output]
+
+
+@dataclass
+class ChunkingHeader:
+    """The contents of a chunking message."""
+
+    sizes: List[int]
+    transfer_id: Optional[str] = None
+    # chunk of the transfer that the following chunks start at
+    offset: int = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.sizes)
+
+
+def encode_header(header: ChunkingHeader) -> str:
+    info = header.sizes
+    if header.transfer_id is not None:
+        info = {"id": header.transfer_id, "sizes": header.sizes}
+        if header.offset:
+            info["offset"] = header.offset
+    return f"{CHUNKED_PACKET_TYPE}{_dumps(info)}"
+
+
+def parse_header(message: EncodedMessage) -> Optional[ChunkingHeader]:
+    """Parses a chunking message. Returns None for other messages."""
+    if type(message) is not str or not message.startswith(CHUNKED_PACKET_TYPE):
+        return None
+
+    info = json.loads(message[1:])
+    if type(info) is dict:
+        header = ChunkingHeader(
+            info.get("sizes"), info.get("id"), info.get("offset", 0)
+        )
+        if type(header.transfer_id) is not str or type(header.offset) is not int:
+            raise TypeError("chunking info has an invalid transfer")
+    else:
+        header = ChunkingHeader(info)
+
+    if type(header.sizes) is not list:
+        raise TypeError("chunking info is not a list")
+    if not all(type(v) is int for v in header.sizes):
+        raise TypeError("chunking info is not comprised of integers")
+    return header
+
+
+def encode_control(
+    packet_type: str, transfer_id: Optional[str] = None, offset: int = 0
+) -> str:
+    """Encodes an acknowledgement or resume request of a transfer."""
+    info = {} if transfer_id is None else {"id": transfer_id, "offset": offset}
+    return f"{packet_type}{_dumps(info)}"
+
+
+def parse_control(message: EncodedMessage) -> Optional[Tuple[str, Optional[str], int]]:
+    """Parses an acknowledgement or resume request.
+
+    Returns the packet type, transfer ID and offset, or None for other
+    messages.
+    """
+    if type(message) is not str or message[:2] not in _CONTROL_PREFIXES:
+        return None
+
+    info = json.loads(message[1:])
+    transfer_id, offset = info.get("id"), info.get("offset", 0)
+    if transfer_id is not None and type(transfer_id) is not str:
+        raise TypeError("transfer ID is not a string")
+    if type(offset) is not int:
+        raise TypeError("transfer offset is not an integer")
+    return message[0], transfer_id, offset
+
 
-        # skip chunking info if all messages are smaller than chunk size.
-        if all(len(msg) <= CHUNK_SIZE for msg in msgs):
-            return msgs
+def _dumps(info) -> str:
+    return json.dumps(info, separators=(",", ":"))
 
-        output: List[EncodedMessage] = []
-        chunked_sizes: List[int] = []
 
-        for msg in msgs:
-            chunks = self._chunk_message(msg)
-            chunked_sizes.append(len(chunks))
-            output.extend(chunks)
+def _chunk_message(msg: EncodedMessage) -> List[EncodedMessage]:
+    if type(msg) is str:
+        return _chunk_str(msg)
+    if type(msg) is bytes:
+        return _chunk_bytes(msg)
 
-        return [
-            f"{CHUNKED_PACKET_TYPE}{json.dumps(chunked_sizes, separators=(',', ':'))}",
-            *output,
-        ]
 
-    def _chunk_message(self, msg: EncodedMessage) -> List[Union[str, bytes]]:
-        if type(msg) is str:
-            return self._chunk_str(msg)
-        if type(msg) is bytes:
-            return self._chunk_bytes(msg)
+def _chunk_str(string: str) -> List[str]:
+    return [string[o : o + CHUNK_SIZE] for o in range(0, len(string), CHUNK_SIZE)]
 
-    def _chunk_str(self, string: str) -> List[str]:
-        return [string[o : o + CHUNK_SIZE] for o in range(0, len(string), CHUNK_SIZE)]
 
-    def _chunk_bytes(self, binary: bytes) -> List[bytes]:
-        # TODO can we get memoryview working here?
-        # at the moment, memoryview doesn't serialize properly.
-        return [binary[o : o + CHUNK_SIZE] for o in range(0, len(binary), CHUNK_SIZE)]
+def _chunk_bytes(binary: bytes) -> List[bytes]:
+    # TODO can we get memoryview working here?
+    # at the moment, memoryview doesn't serialize properly.
+    return [binary[o : o + CHUNK_SIZE] for o in range(0, len(binary), CHUNK_SIZE)]
@@ -1,62 +1,168 @@
-import json
-from typing import List
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import parse_qs
 
+from engineio import packet as eio_packet
 from socketio import AsyncServer
+from socketio import packet
 
-from .chunking_packet import ChunkedPacket, CHUNKED_PACKET_TYPE
+from .chunking_packet import (
+    ACK_PACKET_TYPE,
+    RESUME_PACKET_TYPE,
+    RESUMABLE_QS,
+    CLIENT_ID_QS,
+    ChunkedPacket,
+    EncodedMessage,
+    SPILL_THRESHOLD,
+    chunk_messages,
+    encode_control,
+    parse_control,
+)
+from .chunk_reassembler import ChunkReassembler, PartialTransfer
+from .transfers import OutgoingTransfers, TransferRecorder
+from .binary_envelope import encode_envelope, decode_envelope, is_envelope
 
 
 class ChunkingAsyncServer(AsyncServer):
     """A socket.io server that handles chunked messages.
 
+    Chunking state is tracked per connection, so clients can send chunked
+    messages concurrently.
+
+    The server also accepts events sent as binary envelopes, and can emit
+    them with emit_envelope(). See binary_envelope.encode_envelope().
+
+    Binary uploads larger than spill_threshold bytes are reassembled on disk
+    under spill_dir, so that concurrent large uploads are bounded by disk
+    space rather than memory. Handlers receive them as a read-only mmap. Pass
+    spill_threshold=None to always reassemble in memory.
+
+    With a resume_ttl, chunked transfers with clients that ask for it are
+    resumable for that many seconds after a connection drops. Transfers are
+    only resumed by connections with the same client ID. By default,
+    transfers are not resumable.
+
     See ChunkedPacket for more info.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        spill_threshold: Optional[int] = SPILL_THRESHOLD,
+        spill_dir: Optional[str] = None,
+        resume_ttl: Optional[float] = None,
+        **kwargs,
+    ):
         super().__init__(*args, serializer=ChunkedPacket, **kwargs)
-        self._chunks = None
-        self._chunking_info = None
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.resume_ttl = resume_ttl
+        self._reassemblers: Dict[str, ChunkReassembler] = {}
+        # transfer ID -> interrupted or recently completed upload
+        self._parked: Dict[str, PartialTransfer] = {}
+        self._outgoing = OutgoingTransfers(resume_ttl or 0)
+        # eio_sid -> recorder, for clients with resumable transfers
+        self._recorders: Dict[str, TransferRecorder] = {}
+        # eio_sid -> client ID, for clients with resumable transfers
+        self._owners: Dict[str, str] = {}
+
+    async def emit_envelope(
+        self, event: str, data: Any, room: Union[str, List[str]], namespace="/"
+    ):
+        """Emits an event as a binary envelope to all clients in a room or rooms.
+
+        The envelope is encoded once for all recipients.
+        """
+        envelope = encode_envelope(packet.EVENT, namespace, None, [event, data])
+        messages = chunk_messages([envelope])
+        for _, eio_sid in self.manager.get_participants(namespace, room):
+            for message in messages:
+                await self._send_message(eio_sid, message)
+
+    async def _send_message(self, eio_sid, message: EncodedMessage):
+        recorder = self._recorders.get(eio_sid)
+        if recorder:
+            message = recorder.prepare(message)
+        await self.eio.send(eio_sid, message)
+
+    async def _send_packet(self, eio_sid, pkt):
+        encoded_packet = pkt.encode()
+        if not isinstance(encoded_packet, list):
+            encoded_packet = [encoded_packet]
+        for message in encoded_packet:
+            await self._send_message(eio_sid, message)
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        # the same packet may be sent to many clients, so it is not modified
+        recorder = self._recorders.get(eio_sid)
+        if recorder and eio_pkt.packet_type == eio_packet.MESSAGE:
+            message = recorder.prepare(eio_pkt.data)
+            if message is not eio_pkt.data:
+                eio_pkt = eio_packet.Packet(eio_packet.MESSAGE, message)
+        await super()._send_eio_packet(eio_sid, eio_pkt)
+
+    async def _handle_eio_connect(self, eio_sid, environ):
+        await super()._handle_eio_connect(eio_sid, environ)
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        (owner,) = query.get(CLIENT_ID_QS, [None])
+        if self.resume_ttl and owner and query.get(RESUMABLE_QS) == ["1"]:
+            self._owners[eio_sid] = owner
+            self._recorders[eio_sid] = TransferRecorder(self._outgoing, owner)
+            await self.eio.send(eio_sid, encode_control(ACK_PACKET_TYPE))
 
     async def _handle_eio_message(self, eio_sid, data):
-        if self._chunking_info is not None and len(self._chunking_info):
-            self._chunks.append(data)
-
-            if len(self._chunks) == self._chunking_info[0]:
-                await super()._handle_eio_message(
-                    eio_sid, self._reconstruct_chunks(self._chunks)
-                )
-                self._chunks = []
-                self._chunking_info.pop(0)
-
-            if len(self._chunking_info) == 0:
-                # reset chunking state
-                self._chunks = None
-                self._chunking_info = None
-        elif type(data) is str and data[0] == CHUNKED_PACKET_TYPE:
-            self._chunks = []
-            self._chunking_info = self._try_parse_chunking_info(data[1:])
-        else:
-            await super()._handle_eio_message(eio_sid, data)
+        reassembler = self._reassemblers.get(eio_sid)
+        if reassembler is None:
+            reassembler = self._reassemblers[eio_sid] = ChunkReassembler(
+                self.spill_threshold,
+                self.spill_dir,
+                parked=self._parked,
+                resume_ttl=self.resume_ttl or 0,
+                owner=self._owners.get(eio_sid),
+            )
 
-    def _try_parse_chunking_info(self, data: str):
-        info = json.loads(data)
-        if type(info) is not list:
-            raise TypeError("chunking info is not a list")
+        if reassembler.idle:
+            control = parse_control(data)
+            if control is not None:
+                await self._handle_control(eio_sid, *control)
+                return
 
-        if not all(type(v) is int for v in info):
-            raise TypeError("chunking info is not comprised of integers")
+        messages = reassembler.feed(data)
+        ack = reassembler.take_ack()
+        if ack:
+            await self.eio.send(eio_sid, ack)
 
-        return info
+        for message in messages:
+            # binary attachments of regular packets are never envelopes
+            if is_envelope(message) and eio_sid not in self._binary_packet:
+                await self._handle_envelope(eio_sid, message)
+            else:
+                await super()._handle_eio_message(eio_sid, message)
 
-    def _reconstruct_chunks(self, chunks):
-        if all(type(c) is str for c in chunks):
-            return self._reconstruct_string(chunks)
-        if all(type(c) is bytes for c in chunks):
-            return self._reconstruct_binary(chunks)
-        raise TypeError("Received a set of unknown chunks")
+    async def _handle_control(
+        self, eio_sid, packet_type: str, transfer_id: Optional[str], offset: int
+    ):
+        owner = self._owners.get(eio_sid)
+        if transfer_id is None or owner is None:
+            return
+        if packet_type == ACK_PACKET_TYPE:
+            self._outgoing.ack(transfer_id, offset, owner)
+        elif packet_type == RESUME_PACKET_TYPE:
+            for message in self._outgoing.resume(transfer_id, offset, owner) or []:
+                await self.eio.send(eio_sid, message)
 
-    def _reconstruct_string(self, chunks: List[str]):
-        return "".join(chunks)
+    async def _handle_envelope(self, eio_sid, message: bytes):
+        packet_type, namespace, id, data = decode_envelope(message)
+        if packet_type == packet.EVENT:
+            await self._handle_event(eio_sid, namespace, id, data)
+        elif packet_type == packet.ACK:
+            await self._handle_ack(eio_sid, namespace, id, data)
+        else:
+            raise ValueError("Unexpected packet type in binary envelope")
 
-    def _reconstruct_binary(self, chunks: List[bytes]):
-        return b"".join(chunks)
+    async def _handle_eio_disconnect(self, eio_sid, *args):
+        reassembler = self._reassemblers.pop(eio_sid, None)
+        if reassembler:
+            reassembler.close()
+        self._recorders.pop(eio_sid, None)
+        self._owners.pop(eio_sid, None)
+        await super()._handle_eio_disconnect(eio_sid, *args)
@@ -0,0 +1,144 @@
+import time
+import uuid
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .chunking_packet import (
+    ChunkingHeader,
+    EncodedMessage,
+    encode_header,
+    parse_header,
+)
+
+# how long interrupted transfers are kept to be resumed
+RESUME_TTL = 5 * 60  # seconds
+
+logger = logging.getLogger("volview_server.chunking")
+
+
+@dataclass
+class OutgoingTransfer:
+    id: str
+    sizes: List[int]
+    # the client that may acknowledge and resume the transfer
+    owner: Optional[str] = None
+    # chunks are released once the receiver acknowledges them
+    chunks: List[Optional[EncodedMessage]] = field(default_factory=list)
+    acked: int = 0
+    # monotonic time
+    expires: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.sizes)
+
+    def messages(self, offset: int) -> List[EncodedMessage]:
+        """Returns the messages that resume the transfer at a chunk."""
+        header = encode_header(ChunkingHeader(self.sizes, self.id, offset))
+        return [header, *self.chunks[offset:]]
+
+
+class OutgoingTransfers:
+    """Keeps the chunks of resumable transfers until they are acknowledged.
+
+    Transfers that make no progress for `ttl` seconds are dropped. Only
+    their owner can acknowledge or resume them.
+    """
+
+    def __init__(self, ttl: float = RESUME_TTL):
+        self.ttl = ttl
+        self._transfers: Dict[str, OutgoingTransfer] = {}
+
+    def __len__(self) -> int:
+        return len(self._transfers)
+
+    def start(self, sizes: List[int], owner: Optional[str] = None) -> OutgoingTransfer:
+        self.prune()
+        transfer = OutgoingTransfer(uuid.uuid4().hex, sizes, owner)
+        transfer.expires = time.monotonic() + self.ttl
+        self._transfers[transfer.id] = transfer
+        return transfer
+
+    def _get(self, transfer_id: str, owner: Optional[str]):
+        transfer = self._transfers.get(transfer_id)
+        if transfer is not None and transfer.owner != owner:
+            logger.warning(f"Transfer {transfer_id} belongs to another client")
+            return None
+        return transfer
+
+    def ack(self, transfer_id: str, offset: int, owner: Optional[str] = None):
+        transfer = self._get(transfer_id, owner)
+        if transfer is None:
+            return
+        if offset >= transfer.total:
+            del self._transfers[transfer_id]
+            return
+
+        for index in range(transfer.acked, min(offset, len(transfer.chunks))):
+            transfer.chunks[index] = None
+        transfer.acked = max(transfer.acked, offset)
+        transfer.expires = time.monotonic() + self.ttl
+
+    def resume(
+        self, transfer_id: str, offset: int, owner: Optional[str] = None
+    ) -> Optional[List[EncodedMessage]]:
+        """Returns the messages that resume a transfer, if it can be resumed."""
+        self.prune()
+        transfer = self._get(transfer_id, owner)
+        if (
+            transfer is None
+            or offset < transfer.acked
+            or len(transfer.chunks) < transfer.total
+        ):
+            logger.warning(f"Cannot resume transfer {transfer_id} at chunk {offset}")
+            return None
+
+        logger.info(
+            f"Resuming transfer {transfer_id} at chunk {offset} of {transfer.total}"
+        )
+        transfer.expires = time.monotonic() + self.ttl
+        return transfer.messages(offset)
+
+    def unfinished(self, owner: Optional[str] = None) -> List[OutgoingTransfer]:
+        self.prune()
+        return [
+            transfer
+            for transfer in self._transfers.values()
+            if transfer.owner == owner and len(transfer.chunks) == transfer.total
+        ]
+
+    def prune(self):
+        now = time.monotonic()
+        for transfer_id, transfer in list(self._transfers.items()):
+            if transfer.expires <= now:
+                del self._transfers[transfer_id]
+
+
+class TransferRecorder:
+    """Makes the chunked messages sent over a connection resumable.
+
+    Messages go through prepare() in the order they are sent. Chunking
+    messages get a transfer ID, and the chunks that follow are kept in
+    `transfers` until the receiver acknowledges them.
+    """
+
+    def __init__(self, transfers: OutgoingTransfers, owner: Optional[str] = None):
+        self.transfers = transfers
+        self.owner = owner
+        self._transfer: Optional[OutgoingTransfer] = None
+        self._remaining = 0
+
+    def prepare(self, message: EncodedMessage) -> EncodedMessage:
+        if self._remaining:
+            self._transfer.chunks.append(message)
+            self._remaining -= 1
+            return message
+
+        header = parse_header(message)
+        if header is None or header.transfer_id is not None:
+            return message
+
+        self._transfer = self.transfers.start(header.sizes, self.owner)
+        self._remaining = header.total
+        return encode_header(ChunkingHeader(header.sizes, self._transfer.id))
@@ -1,7 +1,8 @@
 from dataclasses import dataclass
-from typing import List, Union, Any
+from typing import Iterable, List, Optional, Union, Any
 
 from volview_server.rpc_server import current_server
+from volview_server.tracing import span
 
 PropKey = Union[int, str]
 
@@ -16,9 +17,37 @@ def get_current_server():
     return server
 
 
+@dataclass
+class BroadcastTarget:
+    client_ids: Optional[Iterable[str]] = None
+    room: Optional[str] = None
+    # seconds to wait for each client
+    timeout: Optional[float] = None
+
+
 @dataclass
 class StoreOptions:
     transform_args: bool = True
+    # calls every targeted client instead of the current one
+    broadcast: Optional[BroadcastTarget] = None
+
+
+async def call_client(rpc_name: str, args: List[Any], options: StoreOptions):
+    server = get_current_server()
+    store_id, prop_chain = args[0], args[1]
+    with span(f"store {store_id}.{'.'.join(map(str, prop_chain))}"):
+        if options.broadcast is None:
+            return await server.call_client(
+                rpc_name, args, transform_args=options.transform_args
+            )
+        return await server.broadcast_client(
+            rpc_name,
+            args,
+            client_ids=options.broadcast.client_ids,
+            room=options.broadcast.room,
+            timeout=options.broadcast.timeout,
+            transform_args=options.transform_args,
+        )
 
 
 class PropertyDescriptor:
@@ -28,7 +57,10 @@ class PropertyDescriptor:
         self.options = options
 
     def __repr__(self):
-        return f'<{type(self).__name__} store_id={self.store_id} prop_chain={".".join(self.prop_chain)}>'
+        prop_chain = ".".join(map(str, self.prop_chain))
+        return (
+            f"<{type(self).__name__} store_id={self.store_id} prop_chain={prop_chain}>"
+        )
 
 
 class ClientStoreMethodCallDescriptor(PropertyDescriptor):
@@ -44,18 +76,14 @@ class ClientStoreMethodCallDescriptor(PropertyDescriptor):
         self.args = args
 
     def __await__(self):
-        return (
-            get_current_server()
-            .call_client(
-                RPC_CALL_METHOD,
-                [self.store_id, self.prop_chain, self.args],
-                transform_args=self.options.transform_args,
-            )
-            .__await__()
-        )
+        return call_client(
+            RPC_CALL_METHOD, [self.store_id, self.prop_chain, self.args], self.options
+        ).__await__()
 
     def __repr__(self):
-        return f'<{type(self).__name__} store_id={self.store_id} prop_chain={".".join(self.prop_chain)}()>'
+        name = type(self).__name__
+        prop_chain = ".".join(map(str, self.prop_chain))
+        return f"<{name} store_id={self.store_id} prop_chain={prop_chain}()>"
 
 
 class ClientStorePropertyDescriptor(PropertyDescriptor):
@@ -73,15 +101,9 @@ class ClientStorePropertyDescriptor(PropertyDescriptor):
         )
 
     def __await__(self):
-        return (
-            get_current_server()
-            .call_client(
-                RPC_GET_VALUE,
-                [self.store_id, self.prop_chain],
-                transform_args=self.options.transform_args,
-            )
-            .__await__()
-        )
+        return call_client(
+            RPC_GET_VALUE, [self.store_id, self.prop_chain], self.options
+        ).__await__()
 
 
 class ClientStore:
@@ -101,7 +123,32 @@ def get_current_client_store(store_name: str, **kwargs):
 
     This should only be called from inside an RPC endpoint.
 
-    The methods and properties accessed through this client store proxy are not bound to a client until awaited.
+    The methods and properties accessed through this client store proxy are not
+    bound to a client until awaited.
     """
     options = StoreOptions(**kwargs)
     return ClientStore(store_name, options)
+
+
+def get_client_stores(
+    store_name: str,
+    client_ids: Optional[Iterable[str]] = None,
+    room: Optional[str] = None,
+    timeout: Optional[float] = None,
+    **kwargs,
+):
+    """Gets a proxy to a store of many clients at once.
+
+    Targets the given clients, the clients in a socket.io room, or all
+    connected clients. Awaiting a property or method call sends it to all of
+    them concurrently and returns a BroadcastResult with each client's result
+    or error.
+
+        stores = get_client_stores("labelmap", timeout=10)
+        outcome = await stores.updateLabelmap(labelmap_id, labelmap)
+        for client_id, error in outcome.errors.items():
+            ...
+    """
+    target = BroadcastTarget(client_ids, room, timeout)
+    options = StoreOptions(broadcast=target, **kwargs)
+    return ClientStore(store_name, options)
@@ -0,0 +1,56 @@
+import time
+import asyncio
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+from volview_server.exceptions import DeadlineExceeded
+
+T = TypeVar("T")
+
+# time.monotonic() by which the current RPC must finish, if it has a deadline
+current_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def deadline_from_epoch(epoch_ms: float) -> float:
+    """Converts a client deadline in Unix milliseconds to monotonic time.
+
+    Assumes that client and server clocks are roughly in sync.
+    """
+    return time.monotonic() + (epoch_ms / 1000 - time.time())
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds until the current RPC's deadline, or None if it has none."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(action: str):
+    """Raises DeadlineExceeded if the current RPC's deadline has passed."""
+    remaining = time_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {action}")
+
+
+async def wait_with_deadline(awaitable: Awaitable[T], action: str) -> T:
+    """Awaits something, giving up once the current RPC's deadline passes.
+
+    Coroutines are not started if the deadline has already passed.
+    """
+    remaining = time_remaining()
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(f"Deadline exceeded before {action}")
+
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        # only blame the deadline for timeouts it caused
+        if time_remaining() > 0:
+            raise
+        raise DeadlineExceeded(f"Deadline exceeded while {action}") from None
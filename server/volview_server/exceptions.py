@@ -2,3 +2,9 @@ class KeyExistsError(Exception):
     """A given key already exists."""
 
     ...
+
+
+class DeadlineExceeded(Exception):
+    """The deadline of the current RPC has passed."""
+
+    ...
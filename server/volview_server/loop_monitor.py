@@ -0,0 +1,208 @@
+import sys
+import time
+import types
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from volview_server.rpc_router import RpcRouter
+
+# how long the loop may run one callback before it counts as blocked
+DEFAULT_THRESHOLD = 0.1  # seconds
+# how often loop lag is sampled
+DEFAULT_INTERVAL = 0.05  # seconds
+# number of lag samples kept for stats
+LAG_WINDOW = 1200
+
+logger = logging.getLogger("volview_server.loop_monitor")
+
+
+@dataclass
+class BlockedCalls:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    # where the longest block was spent, if the watchdog caught it
+    stack: Optional[str] = None
+
+
+@types.coroutine
+def _time_steps(awaitable: Awaitable, on_step: Callable[[float, float], None]):
+    """Drives an awaitable, reporting the start and duration of each step.
+
+    A step is the time the awaitable runs on the loop between two
+    suspensions.
+    """
+    it = awaitable.__await__()
+    value, error = None, None
+    while True:
+        start = time.monotonic()
+        try:
+            if error is not None:
+                yielded = it.throw(error)
+            else:
+                yielded = it.send(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            on_step(start, time.monotonic() - start)
+
+        value, error = None, None
+        try:
+            value = yield yielded
+        except BaseException as exc:
+            error = exc
+
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoopMonitor:
+    """Detects work that blocks the event loop.
+
+    A task on the loop samples how late its wake-ups are (the loop lag),
+    while a watchdog thread logs the loop thread's stack whenever the loop
+    has not run that task for longer than the threshold. RPCs and streams
+    are timed step by step, so that blocking steps are attributed to their
+    endpoint, along with the stack the watchdog caught.
+
+    Monitoring is disabled by default. RpcApi checks `enabled` before
+    touching the monitor, so a disabled monitor adds no instrumentation.
+    """
+
+    enabled: bool
+
+    def __init__(
+        self, threshold: float = DEFAULT_THRESHOLD, interval: float = DEFAULT_INTERVAL
+    ):
+        self.enabled = False
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+
+        self._lags: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self._blocked: Dict[str, BlockedCalls] = {}
+        self._heartbeat = time.monotonic()
+        # (time caught, stack) of the most recent stall
+        self._stall: Optional[Tuple[float, str]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def enable(self, threshold: Optional[float] = None):
+        """Enables monitoring. It starts with start(), from the event loop."""
+        if threshold:
+            self.threshold = threshold
+        self.enabled = True
+        logger.info(f"Loop monitor enabled, threshold {self.threshold * 1000:.0f}ms")
+
+    def start(self):
+        """Starts monitoring the running loop, if enabled and not started."""
+        if not self.enabled or self._task is not None:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._sample_lag())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="volview-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._stopped.set()
+        self._watchdog = None
+
+    async def _sample_lag(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self._lags.append(max(0.0, now - start - self.interval))
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            beat = self._heartbeat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or reported == beat:
+                continue
+
+            # report each stall once
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            self._stall = (time.monotonic(), stack)
+            self.stalls += 1
+            logger.warning(
+                f"Event loop blocked for over {stalled * 1000:.0f}ms in:\n{stack}"
+            )
+
+    def _on_step(self, name: str, start: float, duration: float):
+        if duration < self.threshold:
+            return
+
+        stall = self._stall
+        stack = stall[1] if stall and stall[0] >= start else None
+        blocked = self._blocked.setdefault(name, BlockedCalls())
+        blocked.count += 1
+        blocked.total += duration
+        if duration > blocked.max:
+            blocked.max = duration
+            blocked.stack = stack or blocked.stack
+        logger.warning(
+            f"{name} blocked the event loop for {duration * 1000:.0f}ms. "
+            "Run blocking work with run_in_executor() or in a sync endpoint."
+        )
+
+    async def watch_awaitable(self, name: str, awaitable: Awaitable) -> Any:
+        """Awaits an awaitable, timing each of its steps on the loop."""
+        return await _time_steps(
+            awaitable, lambda start, duration: self._on_step(name, start, duration)
+        )
+
+    async def watch_async_generator(self, name: str, agen):
+        """Re-yields from an async generator, timing each of its steps."""
+        while True:
+            try:
+                item = await self.watch_awaitable(name, agen.__anext__())
+            except StopAsyncIteration:
+                break
+            yield item
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns loop lag percentiles in ms and blocking calls by endpoint."""
+        lags = list(self._lags)
+        return {
+            "lag": {
+                "p50": _percentile(lags, 0.5) * 1000,
+                "p99": _percentile(lags, 0.99) * 1000,
+                "max": max(lags, default=0.0) * 1000,
+            },
+            "stalls": self.stalls,
+            "blocked": {name: asdict(calls) for name, calls in self._blocked.items()},
+        }
+
+    def admin_router(self, prefix: str = "volview.loop_monitor") -> RpcRouter:
+        """Creates a router with an endpoint for reading loop stats.
+
+        Stats include stacks, so only add this router to APIs that are not
+        reachable by untrusted clients.
+        """
+        router = RpcRouter()
+        router.add_endpoint(f"{prefix}.stats", self.stats, transform_args=False)
+        return router
@@ -0,0 +1,114 @@
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional
+
+from volview_server.result_cache import estimate_nbytes
+
+# how long undelivered results are kept for a disconnected client
+OUTBOX_TTL = 60  # seconds
+# undelivered result bytes kept per client
+OUTBOX_MAX_BYTES = 256 * 2**20
+
+logger = logging.getLogger("volview_server.outbox")
+
+
+@dataclass
+class OutboxMessage:
+    event: str
+    payload: Any
+    nbytes: int
+    # monotonic time
+    expires: float
+
+
+class Outbox:
+    """Holds results that could not be delivered to disconnected clients.
+
+    Clients reconnect with the same client ID, so results of calls that
+    finished while a client was away, and the tails of its streams, are kept
+    here to be replayed in order once it is back.
+
+    Messages expire after `ttl` seconds. Each client keeps at most `max_bytes`
+    of messages, dropping its oldest ones to make room for new ones.
+    """
+
+    def __init__(self, ttl: float = OUTBOX_TTL, max_bytes: int = OUTBOX_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._messages: Dict[str, Deque[OutboxMessage]] = {}
+        self._nbytes: Dict[str, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._nbytes.values())
+
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._messages
+
+    def put(self, client_id: str, event: str, payload: Any) -> bool:
+        """Keeps a message for a client. Returns False if it was dropped."""
+        nbytes = estimate_nbytes(payload)
+        if nbytes > self.max_bytes:
+            self._drop(client_id, 1, "too large")
+            return False
+
+        self._expire(client_id)
+        messages = self._messages.setdefault(client_id, deque())
+        evicted = 0
+        while messages and self._nbytes[client_id] + nbytes > self.max_bytes:
+            self._nbytes[client_id] -= messages.popleft().nbytes
+            evicted += 1
+        if evicted:
+            self._drop(client_id, evicted, "outbox full")
+
+        messages.append(
+            OutboxMessage(event, payload, nbytes, time.monotonic() + self.ttl)
+        )
+        self._nbytes[client_id] = self._nbytes.get(client_id, 0) + nbytes
+        return True
+
+    def pop(self, client_id: str) -> Optional[OutboxMessage]:
+        """Takes a client's oldest message that has not expired."""
+        self._expire(client_id)
+        messages = self._messages.get(client_id)
+        if not messages:
+            return None
+
+        message = messages.popleft()
+        self._nbytes[client_id] -= message.nbytes
+        if not messages:
+            self.discard(client_id)
+        return message
+
+    def discard(self, client_id: str):
+        self._messages.pop(client_id, None)
+        self._nbytes.pop(client_id, None)
+
+    def prune(self):
+        """Drops expired messages of all clients."""
+        for client_id in list(self._messages):
+            self._expire(client_id)
+
+    def _expire(self, client_id: str):
+        messages = self._messages.get(client_id)
+        if messages is None:
+            return
+
+        now = time.monotonic()
+        expired = 0
+        while messages and messages[0].expires <= now:
+            self._nbytes[client_id] -= messages.popleft().nbytes
+            expired += 1
+        if expired:
+            self._drop(client_id, expired, "expired")
+        if not messages:
+            self.discard(client_id)
+
+    def _drop(self, client_id: str, count: int, reason: str):
+        self.dropped += count
+        logger.warning(
+            f"Dropped {count} undelivered result(s) of client {client_id}: {reason}"
+        )
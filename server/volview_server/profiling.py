@@ -0,0 +1,221 @@
+import io
+import os
+import asyncio
+import time
+import types
+import pstats
+import cProfile
+import logging
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Set
+
+from volview_server.rpc_router import RpcRouter
+
+DEFAULT_PROFILE_DIR = "volview_profiles"
+DEFAULT_TOP_N = 25
+DEFAULT_WINDOW = 20
+SUMMARY_FILENAME = "summary.txt"
+
+logger = logging.getLogger("volview_server.profiling")
+
+
+def _try_enable(profile: cProfile.Profile):
+    # Python 3.12+ only allows one active profiler per interpreter, so calls
+    # that overlap with another profiled call run unprofiled.
+    try:
+        profile.enable()
+        return True
+    except ValueError:
+        return False
+
+
+@types.coroutine
+def _profile_awaitable(awaitable: Awaitable, profile: cProfile.Profile):
+    """Drives an awaitable, profiling only while it is actively running.
+
+    The profiler is disabled whenever the awaitable is suspended, so work
+    done by other tasks on the event loop is not attributed to it.
+    """
+    it = awaitable.__await__()
+    value, error = None, None
+    while True:
+        active = _try_enable(profile)
+        try:
+            if error is not None:
+                yielded = it.throw(error)
+            else:
+                yielded = it.send(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            if active:
+                profile.disable()
+
+        value, error = None, None
+        try:
+            value = yield yielded
+        except BaseException as exc:
+            error = exc
+
+
+class RpcProfiler:
+    """Opt-in cProfile instrumentation of RPC and stream endpoints.
+
+    When enabled, each profiled call writes a `<endpoint>-<timestamp>.pstats`
+    file to the output directory and refreshes a `summary.txt` with the top-N
+    functions (by cumulative time) across the last `window` calls of every
+    endpoint.
+
+    Profiling is disabled by default. RpcApi checks `enabled` before touching
+    the profiler, so a disabled profiler adds no instrumentation.
+
+    Sync endpoints are profiled inside the worker thread that runs them. Work
+    that an endpoint hands off to its own process pool is not profiled.
+    Profiles of async endpoints are written from a thread, off the event loop.
+    """
+
+    enabled: bool
+    endpoints: Optional[Set[str]]
+
+    def __init__(
+        self,
+        output_dir: str = DEFAULT_PROFILE_DIR,
+        top_n: int = DEFAULT_TOP_N,
+        window: int = DEFAULT_WINDOW,
+    ):
+        self.enabled = False
+        # None means every endpoint is profiled
+        self.endpoints = None
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._recent: Dict[str, Deque[str]] = {}
+        self._counter = 0
+
+    def enable(
+        self,
+        endpoints: Optional[Iterable[str]] = None,
+        output_dir: Optional[str] = None,
+        top_n: Optional[int] = None,
+    ):
+        """Starts profiling the given endpoints, or all endpoints if None."""
+        self.endpoints = set(endpoints) if endpoints else None
+        if output_dir:
+            self.output_dir = output_dir
+        if top_n:
+            self.top_n = top_n
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.enabled = True
+        logger.info(f"Profiling enabled, writing to {self.output_dir}")
+
+    def disable(self):
+        """Stops profiling. Already written profiles are kept."""
+        self.enabled = False
+        logger.info("Profiling disabled")
+
+    def should_profile(self, name: str):
+        return self.enabled and (self.endpoints is None or name in self.endpoints)
+
+    def wrap_sync(self, name: str, fn: Callable) -> Callable:
+        """Wraps a sync function so it is profiled in the calling thread."""
+
+        def profiled(*args):
+            profile = cProfile.Profile()
+            active = _try_enable(profile)
+            try:
+                return fn(*args)
+            finally:
+                if active:
+                    profile.disable()
+                self._record(name, profile)
+
+        return profiled
+
+    async def profile_awaitable(self, name: str, awaitable: Awaitable) -> Any:
+        """Awaits an awaitable, profiling it while it runs."""
+        profile = cProfile.Profile()
+        try:
+            return await _profile_awaitable(awaitable, profile)
+        finally:
+            await self._record_async(name, profile)
+
+    async def profile_async_generator(self, name: str, agen):
+        """Re-yields from an async generator, profiling each step."""
+        profile = cProfile.Profile()
+        try:
+            while True:
+                try:
+                    item = await _profile_awaitable(agen.__anext__(), profile)
+                except StopAsyncIteration:
+                    break
+                yield item
+        finally:
+            await self._record_async(name, profile)
+
+    def summary(self) -> str:
+        """Returns the rolling top-N summary across recently profiled calls."""
+        with self._lock:
+            paths = [path for recent in self._recent.values() for path in recent]
+        if not paths:
+            return "No profiled calls"
+
+        stream = io.StringIO()
+        stats = pstats.Stats(*paths, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+        return stream.getvalue()
+
+    def admin_router(self, prefix: str = "volview.profiler") -> RpcRouter:
+        """Creates a router with endpoints for toggling profiling at runtime.
+
+        Only add this router to APIs that are not reachable by untrusted
+        clients.
+        """
+        router = RpcRouter()
+
+        def start(endpoints=None):
+            self.enable(endpoints)
+            return True
+
+        def stop():
+            self.disable()
+            return True
+
+        router.add_endpoint(f"{prefix}.start", start, transform_args=False)
+        router.add_endpoint(f"{prefix}.stop", stop, transform_args=False)
+        router.add_endpoint(f"{prefix}.summary", self.summary, transform_args=False)
+        return router
+
+    async def _record_async(self, name: str, profile: cProfile.Profile):
+        # writing the profile and the summary is blocking file I/O
+        await asyncio.to_thread(self._record, name, profile)
+
+    def _record(self, name: str, profile: cProfile.Profile):
+        profile.create_stats()
+        if not profile.stats:
+            return
+
+        with self._lock:
+            self._counter += 1
+            filename = f"{name}-{int(time.time() * 1000)}-{self._counter}.pstats"
+            recent = self._recent.setdefault(name, deque())
+
+        path = os.path.join(self.output_dir, filename)
+        try:
+            profile.dump_stats(path)
+        except OSError:
+            logger.exception(f"Failed to write profile for {name}")
+            return
+
+        with self._lock:
+            recent.append(path)
+            while len(recent) > self.window:
+                recent.popleft()
+
+        try:
+            with open(os.path.join(self.output_dir, SUMMARY_FILENAME), "w") as fp:
+                fp.write(self.summary())
+        except OSError:
+            logger.exception("Failed to write profile summary")
@@ -0,0 +1,150 @@
+import time
+import queue
+import asyncio
+import logging
+import multiprocessing
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from volview_server.transformers.image_data import load_itk
+
+logger = logging.getLogger("volview_server.progress")
+
+# minimum time between two progress reports of a filter
+REPORT_INTERVAL = 0.1  # seconds
+# how long the forwarding loop waits for reports before checking for the end
+POLL_INTERVAL = 0.05  # seconds
+
+_manager = None
+
+
+def get_progress_queue():
+    """Creates a queue that can be passed to thread and process pool jobs.
+
+    Queues are proxies to a manager process, which is started on first use.
+    """
+    global _manager
+    if _manager is None:
+        _manager = multiprocessing.Manager()
+    return _manager.Queue()
+
+
+@dataclass
+class ProgressUpdate:
+    label: str
+    progress: float
+    # seconds since the filter started
+    elapsed: float
+    done: bool = False
+
+
+def observe_itk_progress(
+    itk_filter, progress_queue, label: Optional[str] = None, interval=REPORT_INTERVAL
+):
+    """Reports an ITK filter's progress to a queue, at most once per interval.
+
+    Call this in the worker before updating the filter. A final report is
+    sent when the filter ends, with the time it took.
+    """
+    itk = load_itk()
+    label = label or itk_filter.GetNameOfClass()
+    start = time.perf_counter()
+    last_report = float("-inf")
+
+    def on_start():
+        nonlocal start
+        start = time.perf_counter()
+
+    def on_progress():
+        nonlocal last_report
+        now = time.perf_counter()
+        if now - last_report >= interval:
+            last_report = now
+            update = ProgressUpdate(label, itk_filter.GetProgress(), now - start)
+            progress_queue.put(asdict(update))
+
+    def on_end():
+        update = ProgressUpdate(label, 1.0, time.perf_counter() - start, done=True)
+        progress_queue.put(asdict(update))
+
+    itk_filter.AddObserver(itk.StartEvent(), on_start)
+    itk_filter.AddObserver(itk.ProgressEvent(), on_progress)
+    itk_filter.AddObserver(itk.EndEvent(), on_end)
+
+
+def _drain(progress_queue, timeout: float) -> List[Dict]:
+    try:
+        updates = [progress_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    while True:
+        try:
+            updates.append(progress_queue.get_nowait())
+        except queue.Empty:
+            return updates
+
+
+class ProgressReporter:
+    """Forwards progress reports from worker jobs to the event loop.
+
+    Pass `reporter.queue` to a job that calls observe_itk_progress(), then
+    iterate the reports while the job runs, e.g. from a stream endpoint:
+
+        @volview.expose
+        async def median_filter(image, radius):
+            reporter = ProgressReporter()
+            job = volview.run_in_executor(
+                do_median_filter, image, radius, reporter.queue,
+                executor=process_pool,
+            )
+            async for update in reporter.follow(job):
+                yield update
+            yield {"image": reporter.result}
+
+    Stage timings of finished filters are kept in `timings`.
+    """
+
+    def __init__(self):
+        self.queue = get_progress_queue()
+        self.timings: Dict[str, float] = {}
+        self.result: Any = None
+
+    async def follow(self, job: Awaitable) -> AsyncIterator[Dict]:
+        """Yields progress updates until the job is done.
+
+        The job's result is stored in `result`, and its exception is raised.
+        """
+        task = asyncio.ensure_future(job)
+        try:
+            while True:
+                finished = task.done()
+                updates = await asyncio.to_thread(
+                    _drain, self.queue, 0 if finished else POLL_INTERVAL
+                )
+                for update in updates:
+                    if update["done"]:
+                        self.timings[update["label"]] = update["elapsed"]
+                        logger.info(f"{update['label']} took {update['elapsed']:.2f}s")
+                    yield update
+                if finished and not updates:
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
+
+        self.result = task.result()
+
+    async def forward(
+        self, job: Awaitable, callback: Callable[[Dict], Awaitable[Any]]
+    ) -> Any:
+        """Awaits a job, passing progress updates to an async callback.
+
+        The callback runs in the caller's context, so it can call the
+        current client's stores:
+
+            store = get_current_client_store("jobs")
+            result = await reporter.forward(job, store.setProgress)
+        """
+        async for update in self.follow(job):
+            await callback(update)
+        return self.result
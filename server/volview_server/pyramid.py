@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Sequence
+
+from volview_server.client_store import get_current_client_store
+from volview_server.transformers.image_data import (
+    convert_itk_to_vtkjs_image,
+    convert_vtkjs_to_itk_image,
+    image_digest,
+    load_itk,
+)
+
+logger = logging.getLogger("volview_server.pyramid")
+
+DEFAULT_FACTORS = (4, 2, 1)
+DEFAULT_MAX_IMAGES = 8
+
+
+def shrink_image(serialized_img: Dict, factor: int) -> Dict:
+    """Downsamples a serialized image by averaging factor^3 pixel bins.
+
+    Takes and returns serialized images so that it can run in a process pool.
+    """
+    if factor == 1:
+        return serialized_img
+
+    itk = load_itk()
+    img = convert_vtkjs_to_itk_image(serialized_img)
+    ImageType = type(img)
+    size = img.GetLargestPossibleRegion().GetSize()
+
+    shrink_filter = itk.BinShrinkImageFilter[ImageType, ImageType].New()
+    shrink_filter.SetInput(img)
+    shrink_filter.SetShrinkFactors([min(factor, s) for s in size])
+    shrink_filter.Update()
+    return convert_itk_to_vtkjs_image(shrink_filter.GetOutput())
+
+
+class PreviewPyramid:
+    """Sends an image to the viewer coarse-to-fine.
+
+    Each level is downsampled in the executor. Levels are sent as soon as
+    they are ready, coarsest first, and each finer level replaces the
+    previous one in the client's image cache store.
+
+    Levels are cached by image content for the most recently sent images, so
+    that sending the same image again does not recompute them.
+
+        pyramid = PreviewPyramid(executor=process_pool)
+
+        @volview.expose
+        async def show_result(radius):
+            image = await compute_result(radius)
+            return await pyramid.send(image, "Result")
+    """
+
+    def __init__(
+        self,
+        factors: Sequence[int] = DEFAULT_FACTORS,
+        executor: Optional[Executor] = None,
+        max_images: int = DEFAULT_MAX_IMAGES,
+    ):
+        """
+        Keyword Arguments:
+            - factors: downsampling factors. Include 1 to end with the full
+              resolution image.
+            - executor: where levels are built. Defaults to the loop's
+              default executor.
+            - max_images: number of images whose levels are cached.
+        """
+        self.factors = sorted(set(factors), reverse=True)
+        self.executor = executor
+        self.max_images = max_images
+        # image digest -> one future per factor
+        self._cache: "OrderedDict[str, List[asyncio.Future]]" = OrderedDict()
+
+    def levels(self, itk_image) -> List[asyncio.Future]:
+        """Returns futures of the serialized levels, coarsest first.
+
+        Levels that are not cached start building immediately.
+        """
+        key = image_digest(itk_image)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        loop = asyncio.get_running_loop()
+        serialized_img = convert_itk_to_vtkjs_image(itk_image)
+        levels = []
+        for factor in self.factors:
+            if factor == 1:
+                level = loop.create_future()
+                level.set_result(serialized_img)
+            else:
+                level = asyncio.ensure_future(
+                    loop.run_in_executor(
+                        self.executor, shrink_image, serialized_img, factor
+                    )
+                )
+            levels.append(level)
+        self._cache[key] = levels
+        for level in levels:
+            level.add_done_callback(lambda fut, key=key: self._on_level_done(key, fut))
+
+        while len(self._cache) > self.max_images:
+            self._cache.popitem(last=False)
+        return levels
+
+    def _on_level_done(self, key: str, future: asyncio.Future):
+        # failed levels are not cached, so that the next send retries
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Failed to build preview level for {key}")
+            self._cache.pop(key, None)
+
+    async def send(self, itk_image, name: str) -> str:
+        """Adds the image to the current client's image cache store.
+
+        Returns the image ID once the full resolution level has been sent.
+        """
+        store = get_current_client_store("image-cache")
+        image_id = None
+        for level in self.levels(itk_image):
+            # shielded, so that a cancelled send does not cancel cached levels
+            serialized_img = await asyncio.shield(level)
+            if image_id is None:
+                image_id = await store.addVTKImageData(serialized_img, name)
+            else:
+                await store.updateVTKImageData(image_id, serialized_img)
+        return image_id
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,155 @@
+import sys
+import mmap
+import time
+import enum
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+from volview_server.transformers.image_data import image_digest
+
+
+class CacheScope(enum.Enum):
+    # results are shared by all clients
+    GLOBAL = "global"
+    # results are only reused for the client that computed them
+    SESSION = "session"
+
+
+@dataclass
+class CachePolicy:
+    """Caches the results of an RPC endpoint by its arguments.
+
+    Only use this for endpoints whose result depends on nothing but their
+    arguments.
+
+    Attributes:
+        - max_bytes: budget for cached results, measured by their buffers.
+        - ttl: seconds before a result expires, or None to keep it until it
+          is evicted.
+        - scope: whether results are shared across clients.
+    """
+
+    max_bytes: int
+    ttl: Optional[float] = None
+    scope: CacheScope = CacheScope.GLOBAL
+
+
+def _update_digest(digest, obj: Any):
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        digest.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = memoryview(obj).cast("B")
+        digest.update(f"bytes:{data.nbytes};".encode())
+        digest.update(data)
+    elif isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        digest.update(f"ndarray:{array.dtype.str}:{array.shape};".encode())
+        digest.update(memoryview(array.reshape(-1)).cast("B"))
+    elif type(obj).__name__.startswith("itkImage"):
+        digest.update(f"itkImage:{image_digest(obj)};".encode())
+    elif isinstance(obj, (list, tuple)):
+        digest.update(f"list:{len(obj)};".encode())
+        for item in obj:
+            _update_digest(digest, item)
+    elif isinstance(obj, dict):
+        digest.update(f"dict:{len(obj)};".encode())
+        for key in sorted(obj, key=str):
+            _update_digest(digest, key)
+            _update_digest(digest, obj[key])
+    else:
+        raise TypeError(f"Cannot hash argument of type {type(obj).__name__}")
+
+
+def make_cache_key(args: Tuple[Any, ...]) -> str:
+    """Hashes deserialized RPC arguments.
+
+    Images and arrays are hashed by content, so equal images from different
+    calls produce the same key. Raises a TypeError for arguments that cannot
+    be hashed by value.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    _update_digest(digest, args)
+    return digest.hexdigest()
+
+
+def estimate_nbytes(obj: Any) -> int:
+    """Estimates the memory held by a serialized result, mostly its buffers."""
+    if isinstance(obj, (bytes, bytearray, mmap.mmap)):
+        return len(obj)
+    if isinstance(obj, memoryview):
+        return obj.nbytes
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_nbytes(key) + estimate_nbytes(value) for key, value in obj.items()
+        )
+    return sys.getsizeof(obj)
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    nbytes: int
+    expires: Optional[float]
+
+
+class ResultCache:
+    """An LRU cache bounded by the total size of its values."""
+
+    def __init__(self, policy: CachePolicy):
+        self.policy = policy
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry and entry.expires is not None and entry.expires <= time.monotonic():
+            self._remove(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: Hashable, value: Any):
+        """Stores a value, evicting the least recently used ones to fit.
+
+        Values larger than the whole budget are not stored.
+        """
+        nbytes = estimate_nbytes(value)
+        if key in self._entries:
+            self._remove(key)
+        if nbytes > self.policy.max_bytes:
+            return
+
+        ttl = self.policy.ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+        self._entries[key] = _CacheEntry(value, nbytes, expires)
+        self.nbytes += nbytes
+
+        while self.nbytes > self.policy.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.nbytes -= entry.nbytes
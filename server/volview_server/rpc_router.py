@@ -1,9 +1,11 @@
 from dataclasses import dataclass
 import inspect
 import enum
-from typing import Callable, Tuple, Dict
+from typing import Callable, Tuple, Dict, List, Optional, Union
 
 from volview_server.exceptions import KeyExistsError
+from volview_server.result_cache import CachePolicy, CacheScope
+from volview_server.scheduling import Priority
 
 
 class ExposeType(enum.Enum):
@@ -11,14 +13,37 @@ class ExposeType(enum.Enum):
     STREAM = "stream"
 
 
+class CallKind(enum.Enum):
+    COROUTINE = "coroutine"
+    SYNC = "sync"
+    ASYNC_GENERATOR = "async_generator"
+    GENERATOR = "generator"
+
+
+def get_call_kind(fn: Callable) -> CallKind:
+    if inspect.isasyncgenfunction(fn):
+        return CallKind.ASYNC_GENERATOR
+    if inspect.isgeneratorfunction(fn):
+        return CallKind.GENERATOR
+    if inspect.iscoroutinefunction(fn):
+        return CallKind.COROUTINE
+    return CallKind.SYNC
+
+
 @dataclass
 class EndpointInfo:
     name: str
     type: ExposeType
     transform_args: bool = True
+    call_kind: CallKind = CallKind.SYNC
+    cache: Optional[CachePolicy] = None
+    # who may share a deduplicated call, if calls are deduplicated
+    single_flight: Optional[CacheScope] = None
+    priority: Priority = Priority.NORMAL
 
 
 Endpoint = Tuple[Callable, EndpointInfo]
+EndpointListener = Callable[[Endpoint], None]
 
 
 class RpcRouter:
@@ -26,8 +51,21 @@ class RpcRouter:
 
     def __init__(self):
         self.endpoints = {}
-
-    def add_endpoint(self, public_name: str, fn: Callable, transform_args=True):
+        self._listeners: List[EndpointListener] = []
+
+    def add_listener(self, listener: EndpointListener):
+        """Registers a callback that is invoked for every added endpoint."""
+        self._listeners.append(listener)
+
+    def add_endpoint(
+        self,
+        public_name: str,
+        fn: Callable,
+        transform_args=True,
+        cache: Optional[CachePolicy] = None,
+        single_flight: Union[bool, CacheScope] = False,
+        priority: Priority = Priority.NORMAL,
+    ):
         """Adds a public endpoint.
 
         Arguments:
@@ -38,14 +76,44 @@ class RpcRouter:
             - transform_args(=true): transform input arguments and output
               results. Disable this if you do not want transform overhead
               or you want to explicitly transform your inputs and outputs.
+            - cache: reuse results of earlier calls with equal arguments.
+              Only supported for RPC endpoints.
+            - single_flight(=false): concurrent calls with equal arguments
+              share one invocation. True shares it between calls of the same
+              client, and CacheScope.GLOBAL between all clients. Only
+              supported for RPC endpoints.
+            - priority(=NORMAL): scheduling priority of the endpoint's work in
+              worker pools.
         """
 
         if public_name in self.endpoints:
             raise KeyExistsError(f"{public_name} is already registered")
 
+        call_kind = get_call_kind(fn)
         expose_type = ExposeType.RPC
-        if inspect.isasyncgenfunction(fn) or inspect.isgeneratorfunction(fn):
+        if call_kind in (CallKind.ASYNC_GENERATOR, CallKind.GENERATOR):
             expose_type = ExposeType.STREAM
-
-        info = EndpointInfo(public_name, expose_type, transform_args)
+        if cache and expose_type != ExposeType.RPC:
+            raise TypeError("Cannot cache a stream endpoint")
+        if single_flight and expose_type != ExposeType.RPC:
+            raise TypeError("Cannot deduplicate calls to a stream endpoint")
+        if single_flight is True:
+            single_flight = CacheScope.SESSION
+        elif not single_flight:
+            single_flight = None
+        elif not isinstance(single_flight, CacheScope):
+            raise TypeError("single_flight must be a bool or a CacheScope")
+
+        info = EndpointInfo(
+            public_name,
+            expose_type,
+            transform_args,
+            call_kind,
+            cache,
+            single_flight,
+            Priority.parse(priority),
+        )
+        # listeners may reject the endpoint, so notify them before adding it
+        for listener in self._listeners:
+            listener((fn, info))
         self.endpoints[public_name] = (fn, info)
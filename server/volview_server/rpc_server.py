@@ -4,22 +4,42 @@ import time
 import asyncio
 import uuid
 import logging
-from typing import Any, Union, List, Generator, Dict, Tuple, Optional
+from typing import Any, Union, List, Generator, Dict, Iterable, Tuple, Optional, Set
+from contextlib import nullcontext
 from contextvars import ContextVar
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields
 from urllib.parse import parse_qs
 
 from socketio.exceptions import ConnectionRefusedError
 
 from volview_server.api import RpcApi
-from volview_server.chunking import ChunkingAsyncServer
+from volview_server.admission import AdmissionController, AdmissionPolicy, Overloaded
+from volview_server.result_cache import estimate_nbytes
+from volview_server.outbox import Outbox, OUTBOX_MAX_BYTES
+from volview_server.deadlines import (
+    current_deadline,
+    check_deadline,
+    deadline_from_epoch,
+    time_remaining,
+    wait_with_deadline,
+)
+from volview_server.exceptions import DeadlineExceeded
+from volview_server.tracing import current_trace_id, span
+from volview_server.scheduling import Priority
+from volview_server.session_images import SessionImageStore
+from volview_server.chunking import (
+    CLIENT_ID_QS,
+    ChunkingAsyncServer,
+    ENVELOPE_MODE_BINARY,
+    ENVELOPE_MODE_JSON,
+)
 
 RPC_CALL_EVENT = "rpc:call"
 RPC_RESULT_EVENT = "rpc:result"
 STREAM_CALL_EVENT = "stream:call"
 STREAM_RESULT_EVENT = "stream:result"
+ENVELOPE_EVENT = "rpc:envelope"
 
-CLIENT_ID_QS = "clientId"
 FUTURE_TIMEOUT = 5 * 60  # seconds
 
 current_server: ContextVar[RpcServer] = ContextVar("server")
@@ -33,6 +53,24 @@ class RpcCall:
     rpcId: str
     name: str
     args: List[Any]
+    traceId: Optional[str] = None
+
+
+@dataclass
+class CallOptions:
+    priority: Optional[Priority] = None
+    # monotonic time
+    deadline: Optional[float] = None
+    trace_id: Optional[str] = None
+
+
+def to_payload(obj) -> Dict[str, Any]:
+    """Converts a dataclass to a dict for sending.
+
+    Unlike dataclasses.asdict(), field values are not deep-copied, so that
+    large buffers are sent as-is.
+    """
+    return {f.name: getattr(obj, f.name) for f in fields(obj)}
 
 
 def validate_rpc_call(data: Any):
@@ -51,7 +89,24 @@ def validate_rpc_call(data: Any):
     if type(args) is not list:
         raise TypeError("rpc args is not a list")
 
-    return rpc_id, name, args
+    priority = data.get("priority", None)
+    if priority is not None:
+        try:
+            priority = Priority.parse(priority)
+        except ValueError as exc:
+            raise TypeError(str(exc)) from None
+
+    deadline = data.get("deadline", None)
+    if deadline is not None:
+        if type(deadline) not in (int, float):
+            raise TypeError("rpc deadline is not a number")
+        deadline = deadline_from_epoch(deadline)
+
+    trace_id = data.get("traceId", None)
+    if trace_id is not None and type(trace_id) is not str:
+        raise TypeError("rpc trace ID is not a str")
+
+    return rpc_id, name, args, CallOptions(priority, deadline, trace_id)
 
 
 @dataclass
@@ -68,6 +123,12 @@ class RpcErrorResult:
     error: str
 
 
+@dataclass
+class RpcRejectedResult(RpcErrorResult):
+    # seconds the client should wait before retrying
+    retryAfter: float = field(default=0.0)
+
+
 def validate_rpc_result(result: Any):
     if type(result) is not dict:
         raise TypeError("Result is not a dict")
@@ -87,6 +148,20 @@ class StreamDataResult(RpcOkResult):
 RpcResult = Union[RpcOkResult, RpcErrorResult]
 
 
+@dataclass
+class BroadcastResult:
+    """Per-client outcomes of RpcServer.broadcast_client()."""
+
+    # client ID -> result
+    results: Dict[str, Any] = field(default_factory=dict)
+    # client ID -> exception, e.g. a TimeoutError
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
 @dataclass
 class FutureMetadata:
     transform_args: bool = True
@@ -105,25 +180,63 @@ class RpcServer:
     clients: Dict[str, str]
     # client ID -> session object
     sessions: Dict[str, Any]
+    # client ID -> disk-backed session images
+    image_stores: Dict[str, SessionImageStore]
     future_timeout: int
+    binary_envelope: bool
+    session_timeout: Optional[float]
+    scratch_dir: Optional[str]
+    admission: Optional[AdmissionController]
+    outbox: Optional[Outbox]
 
     def __init__(
         self,
         api: RpcApi,
         future_timeout: int = FUTURE_TIMEOUT,
+        binary_envelope: bool = False,
+        session_timeout: Optional[float] = None,
+        scratch_dir: Optional[str] = None,
+        admission: Optional[AdmissionPolicy] = None,
+        outbox_ttl: Optional[float] = None,
+        outbox_max_bytes: int = OUTBOX_MAX_BYTES,
         **kwargs,
     ):
         """
         Keyword Arguments:
             - future_timeout: number of seconds before an inflight RPC is ignored.
+            - binary_envelope: allow clients to negotiate binary envelopes
+              instead of JSON for RPC messages.
+            - session_timeout: number of seconds after a client disconnects
+              before its session is evicted, or None to keep sessions.
+            - scratch_dir: where session image stores keep their files.
+            - admission: per-client limits on calls. Unlimited if None.
+            - outbox_ttl: number of seconds results are kept for a client
+              that disconnected before receiving them. Dropped if None.
+              OUTBOX_TTL is a reasonable value.
+            - outbox_max_bytes: size of the results kept per client.
         """
         self.sio = ChunkingAsyncServer(**kwargs)
         self.api = api
         self.clients = {}
         self.sessions = {}
+        self.image_stores = {}
         self.future_timeout = future_timeout
-
-        self._inflight_rpcs: Dict[str, Tuple[asyncio.Future, FutureMetadata]] = {}
+        self.binary_envelope = binary_envelope
+        self.session_timeout = session_timeout
+        self.scratch_dir = scratch_dir
+        self.admission = AdmissionController(admission) if admission else None
+        self.outbox = Outbox(outbox_ttl, outbox_max_bytes) if outbox_ttl else None
+        # client ID -> scheduled session eviction
+        self._evictions: Dict[str, asyncio.TimerHandle] = {}
+        # clients whose missed results are being replayed
+        self._replaying: Set[str] = set()
+        # client ID -> negotiated envelope mode
+        self._envelopes: Dict[str, str] = {}
+
+        # (client ID, RPC ID) -> pending call_client result
+        self._inflight_rpcs: Dict[
+            Tuple[str, str], Tuple[asyncio.Future, FutureMetadata]
+        ] = {}
         self._cleanup_task = None
 
         @self.sio.event
@@ -146,32 +259,65 @@ class RpcServer:
         async def on_rpc_result(sid: str, data: Any):
             await self._on_rpc_result(self.clients[sid], data)
 
+        @self.sio.on(ENVELOPE_EVENT)
+        async def on_envelope(sid: str, data: Any):
+            return self._on_envelope(self.clients[sid], data)
+
     def setup(self):
         """Runs setup and starts background tasks.
 
         Needs to be run from inside an async context.
         """
         self._cleanup_task = asyncio.create_task(self.cleanup())
+        self.api.loop_monitor.start()
 
     async def teardown(self):
         """Clean up, including stopping background tasks."""
         if self._cleanup_task:
             self._cleanup_task.cancel()
+        self.api.loop_monitor.stop()
         self._inflight_rpcs.clear()
-        for sid in self.clients.keys():
+        for sid in list(self.clients.keys()):
             await self.sio.disconnect(sid)
+        for client_id in list(self.sessions.keys() | self.image_stores.keys()):
+            self.evict_session(client_id)
+
+    def evict_session(self, client_id: str):
+        """Drops a client's session and deletes its session images.
+
+        Session objects with a close() method are closed.
+        """
+        handle = self._evictions.pop(client_id, None)
+        if handle:
+            handle.cancel()
+
+        if self.outbox:
+            self.outbox.discard(client_id)
+
+        image_store = self.image_stores.pop(client_id, None)
+        if image_store:
+            image_store.close()
+
+        session = self.sessions.pop(client_id, None)
+        close = getattr(session, "close", None)
+        if callable(close):
+            close()
+        logger.info(f"Evicted session of client {client_id}")
 
     async def cleanup(self):
         while True:
             await asyncio.sleep(self.future_timeout)
 
+            if self.outbox:
+                self.outbox.prune()
+
             now = int(time.time())
-            for rpc_id, (future, metadata) in self._inflight_rpcs.items():
+            for key, (future, metadata) in list(self._inflight_rpcs.items()):
                 if (
                     not future.done()
                     and now - metadata.creation_time >= self.future_timeout
                 ):
-                    del self._inflight_rpcs[rpc_id]
+                    del self._inflight_rpcs[key]
 
     async def call_client(
         self,
@@ -186,35 +332,207 @@ class RpcServer:
 
         args: supplies a list of arguments to be sent to the client.
         client_id: targets a specific client.
-        transform_args: whether to apply transforms to the request args and response result.
+        transform_args: whether to apply transforms to the request args and
+            response result.
         """
+        check_deadline(f"calling {rpc_name} on the client")
+        rpc_id = uuid.uuid4().hex
+        client_id = client_id or current_client_id.get(None)
+        if not client_id:
+            raise RuntimeError("No current client")
+
+        with span(f"call_client {rpc_name}", client=client_id):
+            if transform_args:
+                with span("serialize"):
+                    args = [self.api.serialize_object(obj) for obj in args or []]
+
+            call = RpcCall(rpc_id, rpc_name, args, current_trace_id())
+            future = self._track_client_call(client_id, rpc_id, transform_args)
+            try:
+                await self._emit(RPC_CALL_EVENT, to_payload(call), client_id)
+                return await wait_with_deadline(
+                    future, f"waiting for {rpc_name} on the client"
+                )
+            finally:
+                self._inflight_rpcs.pop((client_id, rpc_id), None)
+
+    async def broadcast_client(
+        self,
+        rpc_name: str,
+        args: List[Any] = None,
+        client_ids: Optional[Iterable[str]] = None,
+        room: Optional[str] = None,
+        timeout: Optional[float] = None,
+        transform_args: bool = True,
+    ) -> BroadcastResult:
+        """Calls an RPC method on many clients concurrently.
+
+        The arguments are serialized and encoded once for all clients, and the
+        results are gathered as they arrive. A client that fails, times out
+        or is not connected does not fail the others; see BroadcastResult.
+
+        args: supplies a list of arguments to be sent to the clients.
+        client_ids: targets these clients. Defaults to all connected clients.
+        room: targets the clients in a socket.io room instead.
+        timeout: number of seconds to wait for each client. The current RPC's
+            deadline, if sooner, takes precedence.
+        transform_args: whether to apply transforms to the request args and
+            response result.
+        """
+        check_deadline(f"calling {rpc_name} on clients")
+        remaining = time_remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        connected = set(self.clients.values())
+        if client_ids is None and room is not None:
+            participants = self.sio.manager.get_participants("/", room)
+            client_ids = [
+                self.clients[sid] for sid, _ in participants if sid in self.clients
+            ]
+        elif client_ids is None:
+            client_ids = connected
+        # dedupe while keeping order
+        client_ids = list(dict.fromkeys(client_ids))
+
+        broadcast = BroadcastResult()
+        for client_id in client_ids:
+            if client_id not in connected:
+                broadcast.errors[client_id] = ConnectionError(
+                    f"Client {client_id} is not connected"
+                )
+        targets = [client_id for client_id in client_ids if client_id in connected]
+        if not targets:
+            return broadcast
+
+        # results are matched by client and RPC ID, so all clients share one
+        # call payload
         rpc_id = uuid.uuid4().hex
-        client_id = client_id or current_client_id.get()
-
-        future: asyncio.Future = asyncio.Future()
-
         if transform_args:
-            args = [self.api.serialize_object(obj) for obj in args]
+            args = [self.api.serialize_object(obj) for obj in args or []]
+        futures = [
+            self._track_client_call(client_id, rpc_id, transform_args)
+            for client_id in targets
+        ]
 
+        try:
+            with span(f"broadcast_client {rpc_name}", clients=len(targets)):
+                await self._emit_many(
+                    RPC_CALL_EVENT,
+                    to_payload(RpcCall(rpc_id, rpc_name, args, current_trace_id())),
+                    targets,
+                )
+                outcomes = await asyncio.gather(
+                    *(asyncio.wait_for(future, timeout) for future in futures),
+                    return_exceptions=True,
+                )
+        finally:
+            for client_id in targets:
+                self._inflight_rpcs.pop((client_id, rpc_id), None)
+
+        for client_id, outcome in zip(targets, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                broadcast.errors[client_id] = TimeoutError(
+                    f"Client {client_id} did not respond to {rpc_name}"
+                )
+            elif isinstance(outcome, BaseException):
+                broadcast.errors[client_id] = outcome
+            else:
+                broadcast.results[client_id] = outcome
+
+        if broadcast.errors:
+            logger.warning(
+                f"Broadcast of {rpc_name} failed for {len(broadcast.errors)} "
+                f"of {len(client_ids)} clients"
+            )
+        return broadcast
+
+    def _track_client_call(
+        self, client_id: str, rpc_id: str, transform_args: bool
+    ) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
         info = FutureMetadata(transform_args=transform_args)
-        self._inflight_rpcs[rpc_id] = (future, info)
+        self._inflight_rpcs[(client_id, rpc_id)] = (future, info)
+        return future
 
-        await self.sio.emit(
-            RPC_CALL_EVENT,
-            asdict(RpcCall(rpc_id, rpc_name, args)),
-            room=client_id,
-        )
-        return await future
+    async def _emit(self, event: str, data: Any, client_id: str):
+        with span(f"emit {event}"):
+            if self._envelopes.get(client_id) == ENVELOPE_MODE_BINARY:
+                await self.sio.emit_envelope(event, data, room=client_id)
+            else:
+                await self.sio.emit(event, data, room=client_id)
+
+    async def _deliver(self, event: str, payload: Any, client_id: str):
+        """Emits a result, or keeps it in the outbox if the client is away.
+
+        Results queue behind undelivered ones, so they arrive in order.
+        """
+        if self.outbox is not None and (
+            client_id in self.outbox
+            or client_id in self._replaying
+            or client_id not in self.clients.values()
+        ):
+            self.outbox.put(client_id, event, payload)
+        else:
+            await self._emit(event, payload, client_id)
+
+    async def _replay(self, client_id: str):
+        """Sends the results a client missed while it was disconnected."""
+        if client_id in self._replaying:
+            return
+
+        replayed = 0
+        self._replaying.add(client_id)
+        try:
+            while client_id in self.clients.values():
+                message = self.outbox.pop(client_id)
+                if message is None:
+                    break
+                await self._emit(message.event, message.payload, client_id)
+                replayed += 1
+        finally:
+            self._replaying.discard(client_id)
+        if replayed:
+            logger.info(f"Replayed {replayed} result(s) to client {client_id}")
+
+    async def _emit_many(self, event: str, data: Any, client_ids: List[str]):
+        """Emits to many clients, encoding once per envelope mode."""
+        binary = [
+            c for c in client_ids if self._envelopes.get(c) == ENVELOPE_MODE_BINARY
+        ]
+        plain = [c for c in client_ids if c not in binary]
+        emits = []
+        if binary:
+            emits.append(self.sio.emit_envelope(event, data, room=binary))
+        if plain:
+            emits.append(self.sio.emit(event, data, room=plain))
+        with span(f"emit {event}", clients=len(client_ids)):
+            await asyncio.gather(*emits)
+
+    def _on_envelope(self, client_id: str, data: Any):
+        """Negotiates the envelope mode for a client.
+
+        Returns the accepted mode, which is JSON unless the client asked for
+        binary and the server allows it.
+        """
+        requested = data.get("mode") if type(data) is dict else None
+        if self.binary_envelope and requested == ENVELOPE_MODE_BINARY:
+            self._envelopes[client_id] = ENVELOPE_MODE_BINARY
+        else:
+            self._envelopes.pop(client_id, None)
+        return {"mode": self._envelopes.get(client_id, ENVELOPE_MODE_JSON)}
 
     async def _on_rpc_result(self, client_id: str, result: Any):
         try:
             rpc_id, ok, data, error = validate_rpc_result(result)
-            future, info = self._inflight_rpcs[rpc_id]
+            future, info = self._inflight_rpcs.pop((client_id, rpc_id))
         except (TypeError, KeyError):
             # ignore invalid RPC result
             logger.error("Received invalid RPC result")
         else:
-            del self._inflight_rpcs[rpc_id]
+            if future.done():
+                # the caller stopped waiting, e.g. after a timeout
+                return
             if ok:
                 if info.transform_args:
                     data = self.api.deserialize_object(data)
@@ -227,59 +545,126 @@ class RpcServer:
         (client_id,) = qs.get(CLIENT_ID_QS, [None])
         if not client_id:
             raise ConnectionRefusedError("No clientId provided")
+        if not self.api.ready:
+            # Servers whose warm-up did not run at startup warm up for their
+            # first client. Clients that connect meanwhile wait for it too.
+            await asyncio.shield(self.api.start_warm_up())
 
         self.clients[sid] = client_id
+        # setup() does not run in ASGI deployments
+        self.api.loop_monitor.start()
+        handle = self._evictions.pop(client_id, None)
+        if handle:
+            handle.cancel()
 
         await self.sio.enter_room(sid, client_id)
 
+        if self.outbox and client_id in self.outbox:
+            # emits made in this handler would arrive before the client is
+            # told it is connected
+            self.sio.start_background_task(self._replay, client_id)
+
     async def _on_disconnect(self, sid: str):
-        client_id = self.clients[sid]
+        client_id = self.clients.pop(sid)
+        self._envelopes.pop(client_id, None)
         await self.sio.leave_room(sid, client_id)
         await self.sio.close_room(client_id)
 
+        if self.admission and client_id not in self.clients.values():
+            self.admission.forget(client_id)
+
+        # the session is kept while another connection uses it
+        if self.session_timeout is not None and client_id not in self.clients.values():
+            loop = asyncio.get_running_loop()
+            self._evictions[client_id] = loop.call_later(
+                self.session_timeout, self.evict_session, client_id
+            )
+
     async def _on_rpc_call(self, client_id: str, data: Any):
         try:
-            rpc_id, name, args = validate_rpc_call(data)
+            rpc_id, name, args, options = validate_rpc_call(data)
         except TypeError:
             logger.error("Received invalid RPC call")
-        else:
-            result = await self._try_rpc_call(client_id, name, args)
+            return
+
+        with self.api.tracer.trace(f"rpc {name}", options.trace_id, client=client_id):
+            result = await self._try_rpc_call(client_id, name, args, options)
             result.rpcId = rpc_id
-            await self.sio.emit(RPC_RESULT_EVENT, asdict(result), room=client_id)
+            await self._deliver(RPC_RESULT_EVENT, to_payload(result), client_id)
 
     async def _try_rpc_call(
-        self, client_id: str, name: str, args: List[Any]
+        self,
+        client_id: str,
+        name: str,
+        args: List[Any],
+        options: Optional[CallOptions] = None,
     ) -> RpcResult:
+        options = options or CallOptions()
         current_server.set(self)
         current_client_id.set(client_id)
+        current_deadline.set(options.deadline)
 
         try:
-            result = await self.api.invoke_rpc(name, *args)
+            async with self._admit(client_id, args):
+                result = await wait_with_deadline(
+                    self.api.invoke_rpc(name, *args, priority=options.priority),
+                    f"running {name}",
+                )
             return RpcOkResult(result)
+        except Overloaded as exc:
+            return RpcRejectedResult(str(exc), retryAfter=exc.retry_after)
+        except DeadlineExceeded as exc:
+            logger.warning(f"Dropped RPC {name}: {exc}")
+            return RpcErrorResult(str(exc))
         except Exception as exc:
             logger.exception(f"RPC {name} raised an exception", stack_info=True)
             return RpcErrorResult(str(exc))
 
+    def _admit(self, client_id: str, args: List[Any]):
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.admit(client_id, estimate_nbytes(args))
+
     async def _on_stream_call(self, client_id: str, data: Any):
         try:
-            rpc_id, name, args = validate_rpc_call(data)
+            rpc_id, name, args, options = validate_rpc_call(data)
         except TypeError:
             logger.error("Received invalid RPC call")
             return
 
-        async for result in self._try_generate_stream(client_id, name, args):
-            result.rpcId = rpc_id
-            await self.sio.emit(STREAM_RESULT_EVENT, asdict(result), room=client_id)
+        with self.api.tracer.trace(
+            f"stream {name}", options.trace_id, client=client_id
+        ):
+            async for result in self._try_generate_stream(
+                client_id, name, args, options
+            ):
+                result.rpcId = rpc_id
+                await self._deliver(STREAM_RESULT_EVENT, to_payload(result), client_id)
 
     async def _try_generate_stream(
-        self, client_id: str, name: str, args: List[Any]
+        self,
+        client_id: str,
+        name: str,
+        args: List[Any],
+        options: Optional[CallOptions] = None,
     ) -> Generator[RpcResult, None, None]:
+        options = options or CallOptions()
         current_server.set(self)
         current_client_id.set(client_id)
+        current_deadline.set(options.deadline)
 
         try:
-            async for data in self.api.invoke_stream(name, *args):
-                yield StreamDataResult(done=False, data=data)
+            check_deadline(f"running {name}")
+            async with self._admit(client_id, args):
+                stream = self.api.invoke_stream(name, *args, priority=options.priority)
+                async for data in stream:
+                    check_deadline(f"sending {name} results")
+                    yield StreamDataResult(done=False, data=data)
             yield StreamDataResult(done=True)
+        except Overloaded as exc:
+            yield RpcRejectedResult(str(exc), retryAfter=exc.retry_after)
+        except DeadlineExceeded as exc:
+            logger.warning(f"Dropped stream {name}: {exc}")
+            yield RpcErrorResult(str(exc))
         except Exception as exc:
             yield RpcErrorResult(str(exc))
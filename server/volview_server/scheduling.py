@@ -0,0 +1,130 @@
+import time
+import enum
+import asyncio
+import itertools
+from contextvars import ContextVar, copy_context
+from dataclasses import dataclass, field
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional
+
+from volview_server.deadlines import check_deadline, wait_with_deadline
+from volview_server.tracing import span
+
+# a waiting task gains one priority level per this many seconds, so that
+# background work is not starved by a steady stream of interactive calls
+AGING_INTERVAL = 2.0  # seconds
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+    @classmethod
+    def parse(cls, value: Any) -> "Priority":
+        """Parses a priority from its name, e.g. "interactive"."""
+        if isinstance(value, cls):
+            return value
+        try:
+            return cls[str(value).upper()]
+        except KeyError:
+            raise ValueError(f"Invalid priority: {value}") from None
+
+
+# priority of the RPC being handled in the current context
+current_priority: ContextVar[Priority] = ContextVar("priority", default=Priority.NORMAL)
+
+
+@dataclass
+class _Waiter:
+    priority: Priority
+    seq: int
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+    def rank(self, now: float):
+        return (self.priority - (now - self.enqueued) / AGING_INTERVAL, self.seq)
+
+
+class PriorityScheduler:
+    """Runs work in an executor, ordered by priority rather than FIFO.
+
+    At most `slots` jobs are submitted to the executor at once, which should
+    match its number of workers. Queued jobs are started by priority, then in
+    arrival order, with priorities aging while they wait.
+    """
+
+    def __init__(self, executor: Executor, slots: int):
+        self.executor = executor
+        self.slots = slots
+        self._running = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def run(
+        self, fn: Callable, *args, priority: Optional[Priority] = None, loop=None
+    ) -> Any:
+        """Runs fn(*args) in the executor once a slot is free.
+
+        Defaults to the priority of the current RPC. Raises DeadlineExceeded
+        instead of starting fn once the current RPC's deadline has passed.
+        """
+        if priority is None:
+            priority = current_priority.get()
+
+        with span("executor.wait", priority=priority.name, queued=self.queued):
+            await wait_with_deadline(self._acquire(priority), "waiting for a worker")
+        try:
+            # dropped if the deadline passed just as a slot freed up
+            check_deadline("starting work")
+            loop = loop or asyncio.get_running_loop()
+            with span("executor.run"):
+                return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self._release()
+
+    async def run_in_context(
+        self,
+        fn: Callable,
+        *args,
+        priority: Optional[Priority] = None,
+        context=None,
+        loop=None,
+    ) -> Any:
+        """Like run(), but runs fn in the given or a copy of the current context."""
+        ctx = context or copy_context()
+        return await self.run(ctx.run, fn, *args, priority=priority, loop=loop)
+
+    async def _acquire(self, priority: Priority):
+        if self._running < self.slots and not self._waiters:
+            self._running += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, next(self._seq), loop.create_future())
+        self._waiters.append(waiter)
+        try:
+            # the releasing job hands its slot over to this one
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif not waiter.future.cancelled():
+                # cancelled after being handed a slot, so pass it on
+                self._release()
+            raise
+
+    def _release(self):
+        now = time.monotonic()
+        while self._waiters:
+            waiter = min(self._waiters, key=lambda w: w.rank(now))
+            self._waiters.remove(waiter)
+            # skip waiters that were cancelled but not yet removed
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self._running -= 1
@@ -1,6 +1,7 @@
-from typing import Callable, Any, TypeVar
+from typing import Callable, TypeVar
 
 from volview_server.rpc_server import current_server, current_client_id
+from volview_server.session_images import SessionImageStore
 
 T = TypeVar("T")
 
@@ -24,8 +25,29 @@ def get_current_session(default_factory: Callable[[], T] = None) -> T:
 
     client_id = current_client_id.get()
     if not client_id:
-        raise RuntimeError("No no current client")
+        raise RuntimeError("No current client")
 
     if client_id not in server.sessions and default_factory:
         server.sessions[client_id] = default_factory()
     return server.sessions.get(client_id, None)
+
+
+def get_session_image_store() -> SessionImageStore:
+    """Retrieves the disk-backed image store of the current client.
+
+    The store is created on first use under the server's scratch directory,
+    and its files are deleted when the client's session is evicted.
+
+    If there is no current client, then this will raise a RuntimeError.
+    """
+    server = current_server.get()
+    if not server:
+        raise RuntimeError("No current server")
+
+    client_id = current_client_id.get()
+    if not client_id:
+        raise RuntimeError("No current client")
+
+    if client_id not in server.image_stores:
+        server.image_stores[client_id] = SessionImageStore(server.scratch_dir)
+    return server.image_stores[client_id]
@@ -0,0 +1,134 @@
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from volview_server.transformers.image_data import load_itk
+
+logger = logging.getLogger("volview_server.session_images")
+
+
+@dataclass
+class _StoredImage:
+    path: str
+    dtype: np.dtype
+    shape: Tuple[int, ...]
+    # ITK image info, or None for plain arrays
+    is_vector: Optional[bool] = None
+    origin: Any = None
+    spacing: Any = None
+    direction: Any = None
+
+
+class SessionImageStore:
+    """Keeps a session's volumes in memory-mapped files instead of RAM.
+
+    Stored ITK images and NumPy arrays are copied into files under a scratch
+    directory. Reading them back returns ITK image views, or np.memmap
+    arrays, backed by those files, so the OS pages them in and out as they
+    are used. Writes to the returned views are written to the files.
+
+    Files are deleted on close(), which the server calls when the session is
+    evicted. Use get_session_image_store() to get the current client's store.
+    """
+
+    def __init__(self, scratch_dir: Optional[str] = None):
+        """
+        Keyword Arguments:
+            - scratch_dir: where image files are created. Defaults to the
+              system temporary directory.
+        """
+        if scratch_dir is not None:
+            os.makedirs(scratch_dir, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="volview-session-", dir=scratch_dir)
+        self._images: Dict[str, _StoredImage] = {}
+        # one mapping per image, shared by all of its views
+        self._arrays: Dict[str, np.memmap] = {}
+
+    def __contains__(self, name: str):
+        return name in self._images
+
+    def __len__(self):
+        return len(self._images)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the stored images on disk."""
+        return sum(
+            int(np.prod(image.shape)) * image.dtype.itemsize
+            for image in self._images.values()
+        )
+
+    def put(self, name: str, image: Union[np.ndarray, Any]):
+        """Stores an ITK image or a NumPy array, replacing any previous one.
+
+        Returns the disk-backed view, so that the caller can drop the
+        in-memory original.
+        """
+        if type(image).__name__.startswith(("itkImage", "itkVectorImage")):
+            itk = load_itk()
+            array = itk.array_view_from_image(image)
+            stored = _StoredImage(
+                path="",
+                dtype=array.dtype,
+                shape=array.shape,
+                is_vector=image.GetNumberOfComponentsPerPixel() > 1,
+                origin=tuple(image.GetOrigin()),
+                spacing=tuple(image.GetSpacing()),
+                direction=itk.array_from_matrix(image.GetDirection()).copy(),
+            )
+        elif isinstance(image, np.ndarray):
+            array = image
+            stored = _StoredImage(path="", dtype=array.dtype, shape=array.shape)
+        else:
+            raise TypeError(f"Cannot store object of type {type(image).__name__}")
+
+        self.delete(name)
+        digest = hashlib.blake2b(name.encode(), digest_size=8).hexdigest()
+        stored.path = os.path.join(self.directory, f"{digest}.dat")
+
+        mapped = np.memmap(
+            stored.path, dtype=stored.dtype, mode="w+", shape=stored.shape
+        )
+        mapped[...] = array
+        mapped.flush()
+
+        self._images[name] = stored
+        self._arrays[name] = mapped
+        return self.get(name)
+
+    def get(self, name: str, default=None):
+        """Returns a view of a stored image, backed by its file."""
+        stored = self._images.get(name)
+        if stored is None:
+            return default
+
+        array = self._arrays[name]
+        if stored.is_vector is None:
+            return array
+
+        itk = load_itk()
+        image = itk.image_view_from_array(array, is_vector=stored.is_vector)
+        image.SetOrigin(stored.origin)
+        image.SetSpacing(stored.spacing)
+        image.SetDirection(itk.matrix_from_array(stored.direction))
+        return image
+
+    def delete(self, name: str):
+        stored = self._images.pop(name, None)
+        self._arrays.pop(name, None)
+        if stored:
+            # views that are still referenced keep their mapping alive
+            os.unlink(stored.path)
+
+    def close(self):
+        """Deletes all stored images."""
+        self._images.clear()
+        self._arrays.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        logger.debug(f"Removed session images in {self.directory}")
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import uuid
+import logging
+import itertools
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+FORMAT_JSONL = "jsonl"
+FORMAT_CHROME = "chrome"
+
+logger = logging.getLogger("volview_server.tracing")
+
+
+@dataclass
+class Span:
+    tracer: "Tracer"
+    trace_id: str
+    name: str
+    # one row per trace in Chrome's trace viewer
+    row: int
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: Optional[str] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    # Unix time in microseconds
+    start: int = field(default_factory=lambda: time.time_ns() // 1000)
+    _perf_start: float = field(default_factory=time.perf_counter)
+
+    def child(self, name: str, attrs: Dict[str, Any]) -> "Span":
+        return Span(
+            self.tracer,
+            self.trace_id,
+            name,
+            self.row,
+            parent_id=self.span_id,
+            attrs=attrs,
+        )
+
+    def finish(self):
+        duration = int((time.perf_counter() - self._perf_start) * 1e6)
+        self.tracer.record(self, duration)
+
+
+# span of the work being done in the current context, if it is traced
+current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+@contextmanager
+def _enter(span: Span) -> Iterator[Span]:
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.attrs["error"] = repr(exc)
+        raise
+    finally:
+        current_span.reset(token)
+        span.finish()
+
+
+def current_trace_id() -> Optional[str]:
+    parent = current_span.get()
+    return parent.trace_id if parent else None
+
+
+def span(name: str, **attrs):
+    """Times a block of work as a child of the current span.
+
+    Does nothing outside of a traced RPC, so it is cheap to leave in place:
+
+        with span("threshold", level=level):
+            ...
+    """
+    parent = current_span.get()
+    if parent is None:
+        return nullcontext()
+    return _enter(parent.child(name, attrs))
+
+
+class Tracer:
+    """Records spans of RPCs to a local file.
+
+    Each RPC is a trace, identified by the trace ID that the client sent or a
+    new one. Spans are written when they end, either as JSON lines or as
+    Chrome trace events that can be opened with chrome://tracing or Perfetto.
+
+    Tracing is disabled by default, in which case no spans are created.
+    """
+
+    enabled: bool
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.format = FORMAT_JSONL
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+        self._rows = itertools.count(1)
+
+    def enable(self, path: str, format: Optional[str] = None):
+        """Starts writing spans to a file.
+
+        The format defaults to Chrome trace events for .json files and JSON
+        lines otherwise.
+        """
+        self.disable()
+        if format is None:
+            format = FORMAT_CHROME if path.endswith(".json") else FORMAT_JSONL
+        if format not in (FORMAT_JSONL, FORMAT_CHROME):
+            raise ValueError(f"Invalid trace format: {format}")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.format = format
+        self._file = open(path, "w")
+        if format == FORMAT_CHROME:
+            # the trace event format allows a trailing comma and no "]"
+            self._file.write("[\n")
+        self.enabled = True
+        logger.info(f"Tracing enabled, writing to {path}")
+
+    def disable(self):
+        self.enabled = False
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def trace(self, name: str, trace_id: Optional[str] = None, **attrs):
+        """Starts a trace with a root span, if tracing is enabled."""
+        if not self.enabled:
+            return nullcontext()
+        root = Span(self, trace_id or uuid.uuid4().hex, name, next(self._rows))
+        root.attrs.update(attrs)
+        return _enter(root)
+
+    def record(self, span: Span, duration: int):
+        if self.format == FORMAT_CHROME:
+            event = {
+                "name": span.name,
+                "ph": "X",
+                "ts": span.start,
+                "dur": duration,
+                "pid": os.getpid(),
+                "tid": span.row,
+                "args": {"traceId": span.trace_id, **span.attrs},
+            }
+            line = json.dumps(event, default=str) + ",\n"
+        else:
+            event = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentId": span.parent_id,
+                "name": span.name,
+                "start": span.start,
+                "duration": duration,
+                "attrs": span.attrs,
+            }
+            line = json.dumps(event, default=str) + "\n"
+
+        with self._lock:
+            if self._file:
+                self._file.write(line)
+                self._file.flush()
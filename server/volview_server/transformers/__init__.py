@@ -1,11 +1,36 @@
-from typing import Callable, List, Any
+__all__ = [
+    "Transformer",
+    "pipe",
+    "compose",
+    "transform_object",
+    "default_serializers",
+    "default_deserializers",
+    "convert_itk_to_vtkjs_image",
+    "convert_vtkjs_to_itk_image",
+    "convert_itk_to_image_sequence",
+    "ImageSequence",
+    "convert_ndarray_to_descriptor",
+    "convert_descriptor_to_ndarray",
+    "iter_image_slabs",
+]
 
-Transformer = Callable[[Any], Any]
+from typing import Callable, List, Any
 
 from volview_server.transformers.image_data import (
     convert_itk_to_vtkjs_image,
     convert_vtkjs_to_itk_image,
 )
+from volview_server.transformers.image_sequence import (
+    ImageSequence,
+    convert_itk_to_image_sequence,
+)
+from volview_server.transformers.image_slabs import iter_image_slabs
+from volview_server.transformers.ndarray import (
+    convert_ndarray_to_descriptor,
+    convert_descriptor_to_ndarray,
+)
+
+Transformer = Callable[[Any], Any]
 
 
 def pipe(input, *fns: List[Transformer]):
@@ -15,6 +40,20 @@ def pipe(input, *fns: List[Transformer]):
     return intermediate
 
 
+def compose(fns: List[Transformer]) -> Transformer:
+    """Combines transformers into one that applies them in order.
+
+    Cheaper than pipe() for transforms applied to every node of an object.
+    """
+
+    def composed(input):
+        for fn in fns:
+            input = fn(input)
+        return input
+
+    return composed
+
+
 def transform_object(input: Any, transform: Callable):
     output = transform(input)
 
@@ -29,5 +68,13 @@ def transform_object(input: Any, transform: Callable):
     return output
 
 
-default_serializers: List[Transformer] = [convert_itk_to_vtkjs_image]
-default_deserializers: List[Transformer] = [convert_vtkjs_to_itk_image]
+default_serializers: List[Transformer] = [
+    # image sequences are packed before their frames are converted
+    convert_itk_to_image_sequence,
+    convert_itk_to_vtkjs_image,
+    convert_ndarray_to_descriptor,
+]
+default_deserializers: List[Transformer] = [
+    convert_vtkjs_to_itk_image,
+    convert_descriptor_to_ndarray,
+]
@@ -1,6 +1,9 @@
-from typing import Dict
+import time
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Dict, Optional
 
-import itk
 import numpy as np
 
 from volview_server.transformers.itk_helpers import (
@@ -8,6 +11,68 @@ from volview_server.transformers.itk_helpers import (
     TYPE_ARRAY_JS_TO_NUMPY,
 )
 from volview_server.transformers.exceptions import ConvertError
+from volview_server.transformers.run_length import (
+    RUN_LENGTH_ENCODING,
+    SPARSE_THRESHOLD,
+    is_sparse,
+    run_length_decode,
+    run_length_encode,
+)
+
+logger = logging.getLogger("volview_server.transformers.image_data")
+
+_itk = None
+
+
+def load_itk():
+    """Imports ITK on first use.
+
+    Importing ITK is slow and memory hungry, so it is deferred until an image
+    is actually converted. API scripts and workers that never touch images do
+    not pay for it.
+    """
+    global _itk
+    if _itk is None:
+        start = time.perf_counter()
+        import itk
+
+        _itk = itk
+        logger.info(f"Loaded ITK in {time.perf_counter() - start:.2f}s")
+    return _itk
+
+
+@lru_cache(maxsize=1024)
+def _is_itk_image_type(cls: type) -> bool:
+    return cls.__name__.startswith("itkImage")
+
+
+def is_itk_image(obj) -> bool:
+    """Whether obj is an ITK image, without importing ITK.
+
+    Serializers call this on every node of a result, so the answer is cached
+    per type.
+    """
+    return _is_itk_image_type(type(obj))
+
+
+def image_digest(itk_image) -> str:
+    """Hashes the pixels and geometry of an ITK image.
+
+    Equal images have equal digests, regardless of where they came from.
+    """
+    if not type(itk_image).__name__.startswith("itkImage"):
+        raise ConvertError("Provided data is not an ITK image")
+
+    itk = load_itk()
+    array = itk.GetArrayViewFromImage(itk_image)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(type(itk_image).__name__).encode())
+    digest.update(repr(array.shape).encode())
+    digest.update(repr(tuple(itk_image.GetOrigin())).encode())
+    digest.update(repr(tuple(itk_image.GetSpacing())).encode())
+    digest.update(itk.GetArrayFromMatrix(itk_image.GetDirection()).tobytes())
+    digest.update(memoryview(array.reshape(-1)).cast("B"))
+    return digest.hexdigest()
 
 
 def vtk_to_itk_image(vtk_image: Dict):
@@ -17,6 +82,7 @@ def vtk_to_itk_image(vtk_image: Dict):
     if vtk_image.get("vtkClass", None) != "vtkImageData":
         raise ConvertError("Provided vtk_image is not a serialized vtkImageData")
 
+    itk = load_itk()
     try:
         extent = vtk_image["extent"]
         # numpy indexes in ZYX order, where X varies the fastest
@@ -44,6 +110,14 @@ def vtk_to_itk_image(vtk_image: Dict):
             )
 
         pixel_data = np.frombuffer(pixel_data_array["values"], dtype=pixel_dtype)
+        encoding = pixel_data_array.get("encoding")
+        if encoding == RUN_LENGTH_ENCODING:
+            run_lengths = np.frombuffer(pixel_data_array["runLengths"], np.uint32)
+            pixel_data = run_length_decode(
+                pixel_data, run_lengths, pixel_data_array["size"]
+            )
+        elif encoding is not None:
+            raise TypeError(f"Unknown pixel encoding {encoding}")
         itk_image = itk.GetImageFromArray(np.reshape(pixel_data, dims))
 
         # https://discourse.itk.org/t/set-image-direction-from-numpy-array/844/10
@@ -56,33 +130,63 @@ def vtk_to_itk_image(vtk_image: Dict):
         raise ConvertError("Cannot convert provided vtk_image to an ITK image") from exc
 
 
-def itk_to_vtk_image(itk_image):
-    """Converts an ITK image to a serialized vtkImageData for vtk.js."""
+def itk_to_vtk_image(itk_image, sparse_threshold: Optional[float] = SPARSE_THRESHOLD):
+    """Converts an ITK image to a serialized vtkImageData for vtk.js.
+
+    Integer images with at least a sparse_threshold fraction of zero pixels,
+    such as label maps, are run-length encoded when that is smaller. Pass
+    sparse_threshold=None to always send dense pixels.
+    """
     if not type(itk_image).__name__.startswith("itkImage"):
         raise ConvertError("Provided data is not an ITK image")
 
-    size = list(itk_image.GetLargestPossibleRegion().GetSize())
-    values = itk.GetArrayViewFromImage(itk_image).flatten(order="C")
+    itk = load_itk()
+    view = itk.GetArrayViewFromImage(itk_image)
+    if (
+        sparse_threshold is not None
+        and itk_image.GetNumberOfComponentsPerPixel() == 1
+        and is_sparse(view, sparse_threshold)
+    ):
+        encoded = run_length_encode(view.reshape(-1))
+        if encoded is not None:
+            run_values, run_lengths = encoded
+            image = make_vtk_image_dict(itk_image, run_values.tobytes(), view.size)
+            data = image["pointData"]["arrays"][0]["data"]
+            data["encoding"] = RUN_LENGTH_ENCODING
+            data["runLengths"] = run_lengths.tobytes()
+            return image
+
+    values = view.flatten(order="C")
+    return make_vtk_image_dict(itk_image, values.tobytes(), len(values))
+
+
+def make_vtk_image_dict(itk_image, values, size: int):
+    """Builds a serialized vtkImageData with the geometry of an ITK image.
+
+    values are the raw pixel bytes, or None when they are sent separately.
+    size is the total number of pixel components. The geometry of a 4D image
+    is that of its 3D frames.
+    """
+    itk = load_itk()
+    dims = list(itk_image.GetLargestPossibleRegion().GetSize())
+    direction = itk.GetArrayFromVnlMatrix(
+        itk_image.GetDirection().GetVnlMatrix().as_matrix()
+    )
     return {
         "vtkClass": "vtkImageData",
         "dataDescription": 8,
-        "direction": list(
-            itk.GetArrayFromVnlMatrix(
-                itk_image.GetDirection().GetVnlMatrix().as_matrix()
-            )
-            .transpose()  # vtk.js is column-major, ITK is row-major
-            .flatten()
-        ),
+        # vtk.js is column-major, ITK is row-major
+        "direction": list(direction[:3, :3].transpose().flatten()),
         "extent": [
             0,
-            size[0] - 1,
+            dims[0] - 1,
             0,
-            size[1] - 1,
+            dims[1] - 1,
             0,
-            size[2] - 1,
+            dims[2] - 1,
         ],
-        "spacing": list(itk_image.GetSpacing()),
-        "origin": list(itk_image.GetOrigin()),
+        "spacing": list(itk_image.GetSpacing())[:3],
+        "origin": list(itk_image.GetOrigin())[:3],
         "pointData": {
             "vtkClass": "vtkDataSetAttributes",
             # the index of the only array
@@ -91,8 +195,8 @@ def itk_to_vtk_image(itk_image):
                 {
                     "data": {
                         "vtkClass": "vtkDataArray",
-                        "size": len(values),
-                        "values": values.tobytes(),
+                        "size": size,
+                        "values": values,
                         "dataType": itk_image_pixel_type_to_js(itk_image),
                         "numberOfComponents": itk_image.GetNumberOfComponentsPerPixel(),
                         "name": "Scalars",
@@ -104,14 +208,20 @@ def itk_to_vtk_image(itk_image):
 
 
 def convert_vtkjs_to_itk_image(obj):
+    if not isinstance(obj, dict) or "vtkClass" not in obj:
+        return obj
     try:
         return vtk_to_itk_image(obj)
     except ConvertError:
         return obj
 
 
-def convert_itk_to_vtkjs_image(obj):
+def convert_itk_to_vtkjs_image(
+    obj, sparse_threshold: Optional[float] = SPARSE_THRESHOLD
+):
+    if not is_itk_image(obj):
+        return obj
     try:
-        return itk_to_vtk_image(obj)
+        return itk_to_vtk_image(obj, sparse_threshold)
     except ConvertError:
         return obj
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from volview_server.transformers.image_data import (
+    is_itk_image,
+    load_itk,
+    make_vtk_image_dict,
+)
+from volview_server.transformers.run_length import (
+    RUN_LENGTH_ENCODING,
+    SPARSE_THRESHOLD,
+    is_sparse,
+    run_length_encode,
+)
+from volview_server.transformers.exceptions import ConvertError
+
+IMAGE_SEQUENCE_MARKER = "_imageSequence"
+
+
+@dataclass
+class ImageSequence:
+    """Sends images packed in one buffer, as an image sequence.
+
+    Attributes:
+        - images: a 4D ITK image, or a list of 3D ITK images with the same
+          size, pixel type and geometry.
+
+    Images that cannot be packed are sent image by image.
+    """
+
+    images: Any
+
+
+def _same_geometry(image, other) -> bool:
+    itk = load_itk()
+    return (
+        type(image) is type(other)
+        and image.GetLargestPossibleRegion().GetSize()
+        == other.GetLargestPossibleRegion().GetSize()
+        and tuple(image.GetSpacing()) == tuple(other.GetSpacing())
+        and tuple(image.GetOrigin()) == tuple(other.GetOrigin())
+        and np.array_equal(
+            itk.GetArrayFromMatrix(image.GetDirection()),
+            itk.GetArrayFromMatrix(other.GetDirection()),
+        )
+    )
+
+
+def itk_to_image_sequence(
+    images, sparse_threshold: Optional[float] = SPARSE_THRESHOLD
+) -> Dict:
+    """Packs a 4D ITK image, or a list of same-geometry 3D ITK images.
+
+    Frames are copied into one contiguous buffer and share a single
+    vtkImageData header, so that a time series is sent as one attachment:
+
+        {"_imageSequence": True, "image": <vtkImageData without values>,
+         "offsets": <first pixel component of each frame>,
+         "values": <raw pixel bytes of all frames>}
+
+    Sparse integer frames are run-length encoded as a whole, as in
+    itk_to_vtk_image. The viewer receives a list of vtkImageData.
+    """
+    if is_itk_image(images):
+        if images.GetImageDimension() != 4:
+            raise ConvertError("Only 4D images are sent as image sequences")
+        # TZYX[C] order, where X varies the fastest
+        array = load_itk().GetArrayViewFromImage(images)
+        header = images
+        copied = False
+    elif (
+        isinstance(images, (list, tuple))
+        and len(images) > 1
+        and all(is_itk_image(image) for image in images)
+    ):
+        header = images[0]
+        if header.GetImageDimension() != 3 or not all(
+            _same_geometry(header, image) for image in images[1:]
+        ):
+            raise ConvertError("Images do not share a 3D geometry")
+        # one vectorized copy into the contiguous buffer
+        itk = load_itk()
+        array = np.stack([itk.GetArrayViewFromImage(image) for image in images])
+        copied = True
+    else:
+        raise ConvertError("Provided data is not an image sequence")
+
+    if array.size == 0:
+        raise ConvertError("Cannot pack empty images")
+
+    frame_size = array[0].size
+    values = array.reshape(-1)
+    sequence = {
+        IMAGE_SEQUENCE_MARKER: True,
+        "image": make_vtk_image_dict(header, None, frame_size),
+        "offsets": list(range(0, values.size, frame_size)),
+    }
+
+    if (
+        sparse_threshold is not None
+        and header.GetNumberOfComponentsPerPixel() == 1
+        and is_sparse(values, sparse_threshold)
+    ):
+        encoded = run_length_encode(values)
+        if encoded is not None:
+            run_values, run_lengths = encoded
+            sequence["values"] = run_values.tobytes()
+            sequence["encoding"] = RUN_LENGTH_ENCODING
+            sequence["runLengths"] = run_lengths.tobytes()
+            return sequence
+
+    # ITK pixel buffers are copied, as the image may change after it is sent
+    sequence["values"] = memoryview(values).cast("B") if copied else values.tobytes()
+    return sequence
+
+
+def convert_itk_to_image_sequence(
+    obj, sparse_threshold: Optional[float] = SPARSE_THRESHOLD
+):
+    # only wrapped images are packed, so that plain lists of images keep
+    # their wire format
+    if not isinstance(obj, ImageSequence):
+        return obj
+    try:
+        return itk_to_image_sequence(obj.images, sparse_threshold)
+    except ConvertError:
+        return obj.images
@@ -0,0 +1,68 @@
+import math
+from typing import Dict, Iterator
+
+from volview_server.transformers.image_data import load_itk, make_vtk_image_dict
+from volview_server.transformers.exceptions import ConvertError
+
+# target size of a slab payload
+SLAB_BYTES = 4 * 1024 * 1024
+
+SLAB_HEADER = "header"
+SLAB_DATA = "slab"
+
+
+def iter_image_slabs(itk_image, slab_bytes: int = SLAB_BYTES) -> Iterator[Dict]:
+    """Splits an ITK image into a geometry header and ordered Z-slabs.
+
+    Yield from this in a stream endpoint so that the viewer can show the
+    image before all of it has arrived:
+
+        @volview.expose("streamImage")
+        def stream_image(...):
+            yield from iter_image_slabs(image)
+
+    The first message is the header:
+
+        {"type": "header", "image": <vtkImageData without values>,
+         "slabDepth": <slices per slab>, "numberOfSlabs": <count>}
+
+    Every following message is a slab, in Z order:
+
+        {"type": "slab", "index": <slab index>, "zOffset": <first slice>,
+         "depth": <slices>, "values": <raw pixel bytes>}
+
+    Slabs hold whole slices, about slab_bytes each. Slab values are views of
+    the image buffer, so the image must not be modified while streaming.
+    """
+    if not type(itk_image).__name__.startswith("itkImage"):
+        raise ConvertError("Provided data is not an ITK image")
+
+    itk = load_itk()
+    # ZYX[C] order, where X varies the fastest
+    array = itk.GetArrayViewFromImage(itk_image)
+    if array.ndim < 3:
+        raise ConvertError("Only 3D images can be streamed as slabs")
+
+    depth = array.shape[0]
+    slice_bytes = max(array[0].nbytes, 1)
+    slab_depth = max(1, min(depth, slab_bytes // slice_bytes))
+    num_slabs = math.ceil(depth / slab_depth)
+
+    yield {
+        "type": SLAB_HEADER,
+        "image": make_vtk_image_dict(itk_image, None, array.size),
+        "slabDepth": slab_depth,
+        "numberOfSlabs": num_slabs,
+    }
+
+    for index in range(num_slabs):
+        z_offset = index * slab_depth
+        slab = array[z_offset : z_offset + slab_depth]
+        yield {
+            "type": SLAB_DATA,
+            "index": index,
+            "zOffset": z_offset,
+            "depth": slab.shape[0],
+            # contiguous, since slabs are split on the slowest axis
+            "values": memoryview(slab).cast("B"),
+        }
@@ -1,4 +1,3 @@
-import struct
 import numpy as np
 
 TYPE_ARRAY_JS_TO_NUMPY = {
@@ -11,6 +10,14 @@ TYPE_ARRAY_JS_TO_NUMPY = {
     "Uint32Array": np.uint32,
     "Float32Array": np.float32,
     "Float64Array": np.float64,
+    "BigInt64Array": np.int64,
+    "BigUint64Array": np.uint64,
+}
+
+# reversed so that the first JS type wins, e.g. int8 maps to Int8Array
+TYPE_ARRAY_NUMPY_TO_JS = {
+    np.dtype(np_type): js_type
+    for js_type, np_type in reversed(TYPE_ARRAY_JS_TO_NUMPY.items())
 }
 
 TYPE_ARRAY_ITKCOMP_TO_JS = {
@@ -0,0 +1,81 @@
+from typing import Dict
+
+import numpy as np
+
+from volview_server.transformers.itk_helpers import (
+    TYPE_ARRAY_JS_TO_NUMPY,
+    TYPE_ARRAY_NUMPY_TO_JS,
+)
+from volview_server.transformers.exceptions import ConvertError
+
+NDARRAY_MARKER = "_ndarray"
+
+
+def is_ndarray_descriptor(obj) -> bool:
+    return isinstance(obj, dict) and obj.get(NDARRAY_MARKER) is True
+
+
+def ndarray_to_descriptor(array: np.ndarray) -> Dict:
+    """Converts an ndarray to a typed array descriptor.
+
+    The descriptor holds the JS typed array name, the shape in C order and the
+    raw little-endian buffer. Contiguous little-endian arrays are not copied.
+    """
+    if not isinstance(array, np.ndarray):
+        raise ConvertError("Provided data is not an ndarray")
+
+    dtype = array.dtype
+    if dtype == np.bool_:
+        array = array.view(np.uint8)
+    elif dtype == np.float16:
+        array = array.astype(np.float32)
+
+    dtype = array.dtype.newbyteorder("<")
+    js_type = TYPE_ARRAY_NUMPY_TO_JS.get(dtype.newbyteorder("="))
+    if js_type is None:
+        raise ConvertError(f"Cannot convert ndarray of dtype {array.dtype}")
+
+    shape = list(array.shape)
+    # ascontiguousarray() makes 0-d arrays 1-d, so the shape is taken first
+    array = np.ascontiguousarray(array, dtype=dtype).reshape(-1)
+    return {
+        NDARRAY_MARKER: True,
+        "dataType": js_type,
+        "shape": shape,
+        # empty views cannot be cast
+        "values": memoryview(array).cast("B") if array.size else b"",
+    }
+
+
+def descriptor_to_ndarray(descriptor: Dict) -> np.ndarray:
+    """Converts a typed array descriptor back to an ndarray.
+
+    The result is a read-only view of the received buffer.
+    """
+    if not is_ndarray_descriptor(descriptor):
+        raise ConvertError("Provided data is not an ndarray descriptor")
+
+    try:
+        dtype = np.dtype(TYPE_ARRAY_JS_TO_NUMPY[descriptor["dataType"]])
+        values = np.frombuffer(descriptor["values"], dtype=dtype.newbyteorder("<"))
+        return values.reshape(descriptor["shape"])
+    except Exception as exc:
+        raise ConvertError("Cannot convert provided descriptor to an ndarray") from exc
+
+
+def convert_ndarray_to_descriptor(obj):
+    if not isinstance(obj, np.ndarray):
+        return obj
+    try:
+        return ndarray_to_descriptor(obj)
+    except ConvertError:
+        return obj
+
+
+def convert_descriptor_to_ndarray(obj):
+    if not is_ndarray_descriptor(obj):
+        return obj
+    try:
+        return descriptor_to_ndarray(obj)
+    except ConvertError:
+        return obj
@@ -0,0 +1,43 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from volview_server.transformers.exceptions import ConvertError
+
+RUN_LENGTH_ENCODING = "rle"
+
+# images with at least this fraction of zero pixels are sent run-length encoded
+SPARSE_THRESHOLD = 0.9
+
+
+def is_sparse(values: np.ndarray, threshold: float = SPARSE_THRESHOLD) -> bool:
+    """Whether an integer array has at least a threshold fraction of zeros."""
+    if values.size == 0 or values.dtype.kind not in "iu":
+        return False
+    return np.count_nonzero(values) <= (1 - threshold) * values.size
+
+
+def run_length_encode(
+    values: np.ndarray,
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Encodes a flat array as run values and uint32 run lengths.
+
+    Returns None when the encoding would not be smaller than the array.
+    """
+    if values.size == 0 or values.size > np.iinfo(np.uint32).max:
+        return None
+
+    starts = np.flatnonzero(values[1:] != values[:-1]) + 1
+    if len(starts) * (values.itemsize + 4) >= values.nbytes:
+        return None
+
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(starts, append=values.size).astype(np.uint32)
+    return values[starts], lengths
+
+
+def run_length_decode(run_values: np.ndarray, run_lengths: np.ndarray, size: int):
+    """Expands run values and run lengths back to a flat array of size items."""
+    if len(run_values) != len(run_lengths) or run_lengths.sum() != size:
+        raise ConvertError("Run lengths do not match the array size")
+    return np.repeat(run_values, run_lengths)
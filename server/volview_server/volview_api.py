@@ -1,7 +1,9 @@
+import inspect
+
 import socketio
 
 from volview_server.rpc_server import RpcServer
-from volview_server.chunking import CHUNK_SIZE
+from volview_server.chunking import MAX_MESSAGE_SIZE
 from volview_server.api import RpcApi
 
 
@@ -14,6 +16,11 @@ class VolViewApi(RpcApi):
             - server_kwargs: RpcServer options
             - asgi_kwargs: socketio.ASGIApp options
 
+        Declared warm-ups run on the ASGI startup event, after any given
+        on_startup handler. The ASGIApp then handles lifespan events itself,
+        so pass the app's own startup and shutdown handlers as on_startup and
+        on_shutdown.
+
         RPCServer options:
         https://python-socketio.readthedocs.io/en/latest/api.html#asyncserver-class
 
@@ -27,8 +34,22 @@ class VolViewApi(RpcApi):
             async_handlers=True,
             # allow upstream handling of CORS
             cors_allowed_origins=[],
-            # default to chunk size
-            max_http_buffer_size=CHUNK_SIZE,
+            # admit a full chunk
+            max_http_buffer_size=MAX_MESSAGE_SIZE,
             **server_kwargs,
         )
+
+        asgi_kwargs = dict(asgi_kwargs)
+        if self._warmups:
+            on_startup = asgi_kwargs.pop("on_startup", None)
+
+            async def startup():
+                if on_startup:
+                    result = on_startup()
+                    if inspect.isawaitable(result):
+                        await result
+                await self.start_warm_up()
+
+            asgi_kwargs["on_startup"] = startup
+
         return socketio.ASGIApp(server.sio, app, **asgi_kwargs)
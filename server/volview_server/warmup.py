@@ -0,0 +1,90 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger("volview_server.warmup")
+
+Warmup = Callable[[], None]
+
+
+@dataclass
+class FilterWarmup:
+    """Instantiates an ITK filter template for a pixel type and dimension.
+
+    ITK instantiates wrapped templates lazily, so the first use of a filter
+    for a given image type is slow. Warm-ups are picklable so they can be run
+    in process pool workers.
+    """
+
+    filter_name: str
+    pixel_type: str
+    dimension: int = 3
+
+    def __call__(self):
+        from volview_server.transformers.image_data import load_itk
+
+        itk = load_itk()
+        image_type = itk.Image[getattr(itk, self.pixel_type), self.dimension]
+        getattr(itk, self.filter_name)[image_type, image_type].New()
+
+    def __str__(self):
+        return f"{self.filter_name}[{self.pixel_type}, {self.dimension}]"
+
+
+@dataclass
+class WarmupTiming:
+    label: str
+    seconds: float
+    error: Optional[str] = None
+
+
+def run_warmups(warmups: List[Warmup]) -> List[WarmupTiming]:
+    """Runs warm-ups in order, logging the time each one took.
+
+    A failing warm-up is logged and reported, but does not stop the others.
+    """
+    timings = []
+    for warmup in warmups:
+        # e.g. functools.partial objects have no __name__
+        label = getattr(warmup, "__name__", None) or str(warmup)
+        start = time.perf_counter()
+        error = None
+        try:
+            warmup()
+        except Exception as exc:
+            error = str(exc)
+            logger.exception(f"Warm-up {label} failed")
+        timing = WarmupTiming(label, time.perf_counter() - start, error)
+        logger.info(f"[pid {os.getpid()}] warmed up {label} in {timing.seconds:.2f}s")
+        timings.append(timing)
+    return timings
+
+
+_worker_timings: List[WarmupTiming] = []
+_worker_barrier: Optional[threading.Barrier] = None
+
+
+def warm_up_worker(warmups: List[Warmup], barrier: threading.Barrier):
+    """Process pool initializer that runs warm-ups in each worker.
+
+    barrier is a multiprocessing.Barrier for the number of workers in the
+    pool, see get_worker_timings().
+    """
+    global _worker_timings, _worker_barrier
+    _worker_barrier = barrier
+    _worker_timings = run_warmups(warmups)
+
+
+def get_worker_timings() -> Tuple[int, List[WarmupTiming]]:
+    """Returns the warm-up timings of the worker that runs this task.
+
+    Submit one task per worker at once. Each task waits on the pool's barrier
+    until all of them run, which can only happen once each is held by a
+    different worker, so every worker reports. Workers run their initializer
+    before any task, so a worker answering this task is already warm.
+    """
+    _worker_barrier.wait()
+    return os.getpid(), _worker_timings
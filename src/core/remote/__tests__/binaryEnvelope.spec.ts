@@ -0,0 +1,220 @@
+/**
+ * For some reason, `new Uint8Array().buffer instanceof ArrayBuffer` is false under jsdom.
+ * This may be due to conflicting ArrayBuffer impls.
+ *
+ * Use node env for now.
+ *
+ * @vitest-environment node
+ */
+import { describe, it, expect } from 'vitest';
+import { PacketType, Packet } from 'socket.io-parser';
+import {
+  ENVELOPE_MAGIC,
+  decodeEnvelope,
+  encodeEnvelope,
+  isEnvelope,
+} from '@/src/core/remote/binaryEnvelope';
+
+/**
+ * Produced by the server's encoder:
+ *
+ *   encode_envelope(2, "/", 7, ["rpc:result", {"rpcId": "1", "ok": True,
+ *     "data": {"n": -3, "x": 1.5, "s": "héllo", "none": None, "f": False,
+ *              "bytes": b"\x01\x02\x03",
+ *              "u16": np.array([1, 2, 65535], np.uint16),
+ *              "f32": np.array([0.5, -2], np.float32),
+ *              "i64": np.array([-1, 2**40], np.int64),
+ *              "list": [1, [2, "a"]]}}])
+ */
+const PYTHON_FIXTURE = [
+  'b102010000002f070000000702000000050a0000007270633a726573756c7408',
+  '03000000050000007270634964050100000031020000006f6b02040000006461',
+  '7461080a000000010000006e03fdffffff010000007804000000000000f83f01',
+  '00000073050600000068c3a96c6c6f040000006e6f6e65000100000066010500',
+  '0000627974657306030000000300000001020303000000753136090406000000',
+  '070000000000000001000200ffff030000006633320907080000000400000000',
+  '0000003f000000c003000000693634090910000000020000ffffffffffffffff',
+  '0000000000010000040000006c69737407020000000301000000070200000003',
+  '02000000050100000061',
+].join('');
+
+function fromHex(hex: string) {
+  const bytes = new Uint8Array(hex.length / 2);
+  for (let i = 0; i < bytes.length; i++) {
+    bytes[i] = parseInt(hex.slice(i * 2, i * 2 + 2), 16);
+  }
+  return bytes.buffer;
+}
+
+function toHex(buffer: ArrayBuffer) {
+  return Array.from(new Uint8Array(buffer))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+}
+
+function makeFixturePacket(): Packet {
+  return {
+    type: PacketType.EVENT,
+    nsp: '/',
+    id: 7,
+    data: [
+      'rpc:result',
+      {
+        rpcId: '1',
+        ok: true,
+        data: {
+          n: -3,
+          x: 1.5,
+          s: 'héllo',
+          none: null,
+          f: false,
+          bytes: Uint8Array.of(1, 2, 3).buffer,
+          u16: Uint16Array.of(1, 2, 65535),
+          f32: Float32Array.of(0.5, -2),
+          i64: BigInt64Array.of(BigInt(-1), BigInt(2 ** 40)),
+          list: [1, [2, 'a']],
+        },
+      },
+    ],
+  };
+}
+
+function expectAligned(view: ArrayBufferView, message: ArrayBuffer) {
+  // a view into the message, not a copy
+  expect(view.buffer).toBe(message);
+  expect(view.byteOffset % 8).toBe(0);
+}
+
+describe('Binary envelope', () => {
+  it('should round-trip nested objects', () => {
+    const packet: Packet = {
+      type: PacketType.EVENT,
+      nsp: '/',
+      data: [
+        'rpc:call',
+        {
+          rpcId: 'abc',
+          name: 'method',
+          args: [
+            { a: 'foo', b: [1, 2.5, -7, null, true, false], c: {} },
+            [],
+            'ünïcödé',
+            2 ** 31,
+          ],
+        },
+      ],
+    };
+
+    const message = encodeEnvelope(packet);
+    expect(isEnvelope(message)).toBe(true);
+    expect(new Uint8Array(message)[0]).toBe(ENVELOPE_MAGIC);
+    expect(decodeEnvelope(message)).toEqual(packet);
+  });
+
+  it('should keep packet ids', () => {
+    const packet: Packet = {
+      type: PacketType.ACK,
+      nsp: '/ns',
+      id: 42,
+      data: ['ok'],
+    };
+    expect(decodeEnvelope(encodeEnvelope(packet))).toEqual(packet);
+  });
+
+  it('should round-trip typed arrays with unaligned offsets', () => {
+    const source = new ArrayBuffer(64);
+    const u8 = new Uint8Array(source, 3, 5);
+    const u16 = new Uint16Array(source, 10, 3);
+    const f32 = new Float32Array(source, 20, 2);
+    const i32 = new Int32Array(source, 36, 1);
+    u8.set([1, 2, 3, 4, 5]);
+    u16.set([1000, 2000, 65535]);
+    f32.set([0.25, -1.5]);
+    i32.set([-123456]);
+    const f64 = Float64Array.of(Math.PI);
+    const u64 = BigUint64Array.of(BigInt(2) ** BigInt(63));
+
+    const packet: Packet = {
+      type: PacketType.EVENT,
+      nsp: '/',
+      // odd-length strings shift the following payloads
+      data: ['e', { a: u8, bb: u16, ccc: f32, d: [i32, f64, u64] }],
+    };
+
+    const message = encodeEnvelope(packet);
+    const [, decoded] = decodeEnvelope(message).data as any[];
+
+    expect(decoded.a).toBeInstanceOf(Uint8Array);
+    expect(Array.from(decoded.a)).toEqual([1, 2, 3, 4, 5]);
+    expect(decoded.bb).toBeInstanceOf(Uint16Array);
+    expect(Array.from(decoded.bb)).toEqual([1000, 2000, 65535]);
+    expect(decoded.ccc).toBeInstanceOf(Float32Array);
+    expect(Array.from(decoded.ccc)).toEqual([0.25, -1.5]);
+    expect(decoded.d[0]).toBeInstanceOf(Int32Array);
+    expect(Array.from(decoded.d[0])).toEqual([-123456]);
+    expect(Array.from(decoded.d[1])).toEqual([Math.PI]);
+    expect(decoded.d[2]).toBeInstanceOf(BigUint64Array);
+    expect(decoded.d[2][0]).toBe(BigInt(2) ** BigInt(63));
+
+    [decoded.a, decoded.bb, decoded.ccc, ...decoded.d].forEach((view) =>
+      expectAligned(view, message)
+    );
+  });
+
+  it('should round-trip empty buffers and typed arrays', () => {
+    const packet: Packet = {
+      type: PacketType.EVENT,
+      nsp: '/',
+      data: ['e', new ArrayBuffer(0), new Float32Array(0)],
+    };
+    const [, bytes, array] = decodeEnvelope(encodeEnvelope(packet))
+      .data as any[];
+    expect(bytes.byteLength).toBe(0);
+    expect(array).toBeInstanceOf(Float32Array);
+    expect(array.length).toBe(0);
+  });
+
+  it('should decode a message from the Python encoder', () => {
+    const message = fromHex(PYTHON_FIXTURE);
+    const packet = decodeEnvelope(message);
+    expect(packet.type).toBe(PacketType.EVENT);
+    expect(packet.nsp).toBe('/');
+    expect(packet.id).toBe(7);
+
+    const [event, result] = packet.data;
+    expect(event).toBe('rpc:result');
+    expect(result.rpcId).toBe('1');
+    expect(result.ok).toBe(true);
+
+    const { data } = result;
+    expect(data.n).toBe(-3);
+    expect(data.x).toBe(1.5);
+    expect(data.s).toBe('héllo');
+    expect(data.none).toBeNull();
+    expect(data.f).toBe(false);
+    expect(Array.from(new Uint8Array(data.bytes))).toEqual([1, 2, 3]);
+    expect(data.u16).toBeInstanceOf(Uint16Array);
+    expect(Array.from(data.u16)).toEqual([1, 2, 65535]);
+    expect(data.f32).toBeInstanceOf(Float32Array);
+    expect(Array.from(data.f32)).toEqual([0.5, -2]);
+    expect(data.i64).toBeInstanceOf(BigInt64Array);
+    expect(Array.from(data.i64)).toEqual([BigInt(-1), BigInt(2 ** 40)]);
+    expect(data.list).toEqual([1, [2, 'a']]);
+
+    [data.u16, data.f32, data.i64].forEach((view) =>
+      expectAligned(view, message)
+    );
+  });
+
+  it('should encode the same bytes as the Python encoder', () => {
+    expect(toHex(encodeEnvelope(makeFixturePacket()))).toBe(PYTHON_FIXTURE);
+  });
+
+  it('should reject unknown tags', () => {
+    const message = new Uint8Array(
+      encodeEnvelope({ type: PacketType.EVENT, nsp: '/', data: null })
+    );
+    message[message.length - 1] = 0xff;
+    expect(() => decodeEnvelope(message.buffer)).toThrow('Unknown value tag');
+  });
+});
@@ -8,7 +8,14 @@
  */
 import { describe, it, expect } from 'vitest';
 import { PacketType, Packet } from 'socket.io-parser';
-import { CHUNK_SIZE, Decoder, Encoder } from '@/src/core/remote/chunkedParser';
+import {
+  ACK_PACKET_TYPE,
+  CHUNK_SIZE,
+  Decoder,
+  Encoder,
+  RESUME_PACKET_TYPE,
+  ResumableTransfers,
+} from '@/src/core/remote/chunkedParser';
 
 function makeBinaryPacket(): Packet {
   const N = 3;
@@ -33,6 +40,16 @@ function makeBinaryPacket(): Packet {
   };
 }
 
+// make slice copies, since the encoder produces views over a single ArrayBuffer
+function toReceived(msgs: any[]) {
+  return msgs.map((msg) => {
+    if (ArrayBuffer.isView(msg)) {
+      return msg.buffer.slice(msg.byteOffset, msg.byteOffset + msg.byteLength);
+    }
+    return msg;
+  });
+}
+
 function makeStringPacket(): Packet {
   return {
     type: PacketType.EVENT,
@@ -48,6 +65,16 @@ function makeStringPacket(): Packet {
   };
 }
 
+function createDecoder() {
+  const decoder = new Decoder();
+  const promise = new Promise<Packet>((resolve) => {
+    decoder.on('decoded', (packet) => {
+      resolve(packet);
+    });
+  });
+  return { decoder, promise };
+}
+
 describe('Chunked Parser', () => {
   describe('ChunkedEncoder', () => {
     it('should encode a large binary packet', () => {
@@ -68,30 +95,10 @@ describe('Chunked Parser', () => {
   });
 
   describe('ChunkedDecoder', () => {
-    function createDecoder() {
-      const decoder = new Decoder();
-      const promise = new Promise<Packet>((resolve) => {
-        decoder.on('decoded', (packet) => {
-          resolve(packet);
-        });
-      });
-      return { decoder, promise };
-    }
-
     it('should decode chunked binary messages', async () => {
       const binaryPacket = makeBinaryPacket();
       const encoder = new Encoder();
-      const msgs = encoder.encode(binaryPacket).map((msg) => {
-        if (ArrayBuffer.isView(msg)) {
-          // make a slice copy, since the encoder produces views
-          // over a single ArrayBuffer
-          return msg.buffer.slice(
-            msg.byteOffset,
-            msg.byteOffset + msg.byteLength
-          );
-        }
-        return msg;
-      });
+      const msgs = toReceived(encoder.encode(binaryPacket));
 
       const { decoder, promise } = createDecoder();
       msgs.forEach((msg) => {
@@ -118,4 +125,58 @@ describe('Chunked Parser', () => {
       expect(packet).to.deep.equal(stringPacket);
     });
   });
+
+  describe('Resumable transfers', () => {
+    it('should add a transfer ID once enabled', () => {
+      const transfers = new ResumableTransfers(() => {});
+      const encoder = new Encoder();
+      encoder.transfers = transfers;
+
+      expect(encoder.encode(makeBinaryPacket())[0]).to.match(/^C\[/);
+      transfers.enabled = true;
+      expect(encoder.encode(makeBinaryPacket())[0]).to.match(/^C\{"id":/);
+    });
+
+    it('should resume an interrupted transfer', async () => {
+      const sent: any[] = [];
+      const senderTransfers = new ResumableTransfers((msg) => sent.push(msg));
+      senderTransfers.enabled = true;
+      const encoder = new Encoder();
+      encoder.transfers = senderTransfers;
+      const binaryPacket = makeBinaryPacket();
+      const msgs = toReceived(encoder.encode(binaryPacket));
+
+      const received: any[] = [];
+      const receiverTransfers = new ResumableTransfers((msg) =>
+        received.push(msg)
+      );
+      const { decoder, promise } = createDecoder();
+      decoder.transfers = receiverTransfers;
+
+      // header, string message and the first binary chunk
+      msgs.slice(0, 3).forEach((msg) => decoder.add(msg));
+      decoder.destroy();
+      expect(receiverTransfers.parked.size).to.equal(1);
+
+      // the server accepts resumable transfers on the new connection
+      receiverTransfers.handleControl(ACK_PACKET_TYPE, null, 0);
+      expect(received).to.have.length(1);
+      expect(received[0].charAt(0)).to.equal(RESUME_PACKET_TYPE);
+      const { id, offset } = JSON.parse(received[0].substring(1));
+      expect(offset).to.equal(2);
+
+      senderTransfers.handleControl(RESUME_PACKET_TYPE, id, offset);
+      // header and the remaining binary chunks
+      expect(sent).to.have.length(1 + 2);
+      toReceived(sent).forEach((msg) => decoder.add(msg));
+
+      const packet = await promise;
+      expect(packet.data[1].args[0].c.byteLength).to.equal(
+        binaryPacket.data[1].args[0].c.byteLength
+      );
+      expect(received[received.length - 1]).to.equal(
+        `${ACK_PACKET_TYPE}${JSON.stringify({ id, offset: 4 })}`
+      );
+    });
+  });
 });
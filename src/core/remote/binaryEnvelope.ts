@@ -0,0 +1,326 @@
+/* eslint-disable no-bitwise */
+import { PacketType } from 'socket.io-parser';
+
+import type { Packet } from 'socket.io-parser';
+
+/**
+ * Binary envelopes encode socket.io event packets without JSON.
+ *
+ * Typed arrays are written as raw aligned bytes, so they are decoded into
+ * views of the received message without a copy. This must stay in sync with
+ * the server's `volview_server/chunking/binary_envelope.py`.
+ *
+ * Format (little-endian):
+ *
+ *   u8 magic (0xB1) | u8 packet type | str namespace | i32 id (-1: none)
+ *   | value
+ *
+ * A str is a u32 byte length followed by UTF-8 bytes. A value is a u8 tag
+ * followed by its payload:
+ *
+ *   NULL, FALSE, TRUE: no payload
+ *   INT32: i32
+ *   FLOAT64: f64
+ *   STRING: str
+ *   BYTES: u32 length | aligned data
+ *   ARRAY: u32 count | values
+ *   OBJECT: u32 count | (str key, value)...
+ *   TYPED_ARRAY: u8 type code | u32 byte length | aligned data
+ *
+ * Aligned data is preceded by a u8 pad length and that many zero bytes, so
+ * that it starts at a multiple of 8 bytes from the start of the envelope.
+ */
+
+export const ENVELOPE_MAGIC = 0xb1;
+export const ENVELOPE_MODE_JSON = 'json';
+export const ENVELOPE_MODE_BINARY = 'binary';
+
+const ALIGNMENT = 8;
+
+enum Tag {
+  Null = 0,
+  False = 1,
+  True = 2,
+  Int32 = 3,
+  Float64 = 4,
+  String = 5,
+  Bytes = 6,
+  Array = 7,
+  Object = 8,
+  TypedArray = 9,
+}
+
+const TypedArrayCodes = [
+  [1, Int8Array],
+  [2, Uint8Array],
+  [3, Int16Array],
+  [4, Uint16Array],
+  [5, Int32Array],
+  [6, Uint32Array],
+  [7, Float32Array],
+  [8, Float64Array],
+  [9, BigInt64Array],
+  [10, BigUint64Array],
+] as const;
+
+type TypedArrayConstructor = (typeof TypedArrayCodes)[number][1];
+
+const CodeToTypedArray = new Map<number, TypedArrayConstructor>(
+  TypedArrayCodes.map(([code, ctor]) => [code, ctor])
+);
+
+function getTypedArrayCode(view: ArrayBufferView) {
+  const entry = TypedArrayCodes.find(([, ctor]) => view instanceof ctor);
+  return entry?.[0];
+}
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+class EnvelopeWriter {
+  private parts: Uint8Array[] = [];
+  private offset = 0;
+
+  write(bytes: Uint8Array) {
+    this.parts.push(bytes);
+    this.offset += bytes.byteLength;
+  }
+
+  writeU8(value: number) {
+    this.write(Uint8Array.of(value));
+  }
+
+  writeU32(value: number) {
+    const bytes = new Uint8Array(4);
+    new DataView(bytes.buffer).setUint32(0, value, true);
+    this.write(bytes);
+  }
+
+  writeI32(value: number) {
+    const bytes = new Uint8Array(4);
+    new DataView(bytes.buffer).setInt32(0, value, true);
+    this.write(bytes);
+  }
+
+  writeF64(value: number) {
+    const bytes = new Uint8Array(8);
+    new DataView(bytes.buffer).setFloat64(0, value, true);
+    this.write(bytes);
+  }
+
+  writeStr(str: string) {
+    const encoded = textEncoder.encode(str);
+    this.writeU32(encoded.byteLength);
+    this.write(encoded);
+  }
+
+  writeAligned(bytes: Uint8Array) {
+    // the pad length is stored as a byte in front of the padding
+    const pad = (ALIGNMENT - ((this.offset + 1) % ALIGNMENT)) % ALIGNMENT;
+    this.writeU8(pad);
+    this.write(new Uint8Array(pad));
+    this.write(bytes);
+  }
+
+  getValue() {
+    const output = new Uint8Array(this.offset);
+    let offset = 0;
+    this.parts.forEach((part) => {
+      output.set(part, offset);
+      offset += part.byteLength;
+    });
+    return output.buffer;
+  }
+}
+
+function asBytes(view: ArrayBufferView | ArrayBuffer) {
+  if (view instanceof ArrayBuffer) return new Uint8Array(view);
+  return new Uint8Array(view.buffer, view.byteOffset, view.byteLength);
+}
+
+function writeValue(writer: EnvelopeWriter, value: unknown): void {
+  if (value === null || value === undefined) {
+    writer.writeU8(Tag.Null);
+  } else if (value === true) {
+    writer.writeU8(Tag.True);
+  } else if (value === false) {
+    writer.writeU8(Tag.False);
+  } else if (typeof value === 'string') {
+    writer.writeU8(Tag.String);
+    writer.writeStr(value);
+  } else if (typeof value === 'number') {
+    if ((value | 0) === value) {
+      writer.writeU8(Tag.Int32);
+      writer.writeI32(value);
+    } else {
+      writer.writeU8(Tag.Float64);
+      writer.writeF64(value);
+    }
+  } else if (value instanceof ArrayBuffer || value instanceof DataView) {
+    const bytes = asBytes(value);
+    writer.writeU8(Tag.Bytes);
+    writer.writeU32(bytes.byteLength);
+    writer.writeAligned(bytes);
+  } else if (ArrayBuffer.isView(value)) {
+    const code = getTypedArrayCode(value);
+    if (code === undefined) {
+      throw new TypeError('Cannot encode an unknown typed array');
+    }
+    writer.writeU8(Tag.TypedArray);
+    writer.writeU8(code);
+    writer.writeU32(value.byteLength);
+    writer.writeAligned(asBytes(value));
+  } else if (Array.isArray(value)) {
+    writer.writeU8(Tag.Array);
+    writer.writeU32(value.length);
+    value.forEach((item) => writeValue(writer, item));
+  } else if (typeof value === 'object') {
+    const entries = Object.entries(value);
+    writer.writeU8(Tag.Object);
+    writer.writeU32(entries.length);
+    entries.forEach(([key, item]) => {
+      writer.writeStr(key);
+      writeValue(writer, item);
+    });
+  } else {
+    throw new TypeError(`Cannot encode value of type ${typeof value}`);
+  }
+}
+
+export function encodeEnvelope(packet: Packet): ArrayBuffer {
+  const writer = new EnvelopeWriter();
+  writer.writeU8(ENVELOPE_MAGIC);
+  writer.writeU8(packet.type);
+  writer.writeStr(packet.nsp || '/');
+  writer.writeI32(packet.id ?? -1);
+  writeValue(writer, packet.data);
+  return writer.getValue();
+}
+
+export function isEnvelope(message: unknown): message is ArrayBuffer {
+  return (
+    message instanceof ArrayBuffer &&
+    message.byteLength > 0 &&
+    new Uint8Array(message, 0, 1)[0] === ENVELOPE_MAGIC
+  );
+}
+
+class EnvelopeReader {
+  private view: DataView;
+  private offset = 0;
+
+  constructor(private buffer: ArrayBuffer) {
+    this.view = new DataView(buffer);
+  }
+
+  readU8() {
+    const value = this.view.getUint8(this.offset);
+    this.offset += 1;
+    return value;
+  }
+
+  readU32() {
+    const value = this.view.getUint32(this.offset, true);
+    this.offset += 4;
+    return value;
+  }
+
+  readI32() {
+    const value = this.view.getInt32(this.offset, true);
+    this.offset += 4;
+    return value;
+  }
+
+  readF64() {
+    const value = this.view.getFloat64(this.offset, true);
+    this.offset += 8;
+    return value;
+  }
+
+  readStr() {
+    const length = this.readU32();
+    const bytes = new Uint8Array(this.buffer, this.offset, length);
+    this.offset += length;
+    return textDecoder.decode(bytes);
+  }
+
+  skipPadding() {
+    // read the pad length first, as `offset += readU8()` would add it to the
+    // offset from before the read
+    const pad = this.readU8();
+    this.offset += pad;
+  }
+
+  readValue(): unknown {
+    const tag = this.readU8();
+    switch (tag) {
+      case Tag.Null:
+        return null;
+      case Tag.False:
+        return false;
+      case Tag.True:
+        return true;
+      case Tag.Int32:
+        return this.readI32();
+      case Tag.Float64:
+        return this.readF64();
+      case Tag.String:
+        return this.readStr();
+      case Tag.Bytes: {
+        const length = this.readU32();
+        this.skipPadding();
+        const bytes = this.buffer.slice(this.offset, this.offset + length);
+        this.offset += length;
+        return bytes;
+      }
+      case Tag.Array: {
+        const count = this.readU32();
+        const array: unknown[] = [];
+        for (let i = 0; i < count; i++) array.push(this.readValue());
+        return array;
+      }
+      case Tag.Object: {
+        const count = this.readU32();
+        const obj: Record<string, unknown> = {};
+        for (let i = 0; i < count; i++) {
+          const key = this.readStr();
+          obj[key] = this.readValue();
+        }
+        return obj;
+      }
+      case Tag.TypedArray: {
+        const code = this.readU8();
+        const byteLength = this.readU32();
+        this.skipPadding();
+        const TypedArray = CodeToTypedArray.get(code);
+        if (!TypedArray) {
+          throw new Error(`Unknown typed array code ${code}`);
+        }
+        // a view into the received message, without a copy
+        const array = new TypedArray(
+          this.buffer,
+          this.offset,
+          byteLength / TypedArray.BYTES_PER_ELEMENT
+        );
+        this.offset += byteLength;
+        return array;
+      }
+      default:
+        throw new Error(`Unknown value tag ${tag}`);
+    }
+  }
+}
+
+export function decodeEnvelope(message: ArrayBuffer): Packet {
+  if (!isEnvelope(message)) {
+    throw new Error('Message is not a binary envelope');
+  }
+
+  const reader = new EnvelopeReader(message);
+  reader.readU8();
+  const type = reader.readU8() as PacketType;
+  const nsp = reader.readStr();
+  const id = reader.readI32();
+  const data = reader.readValue();
+  return id === -1 ? { type, nsp, data } : { type, nsp, id, data };
+}
@@ -2,12 +2,209 @@
 /* eslint-disable class-methods-use-this */
 import { Maybe } from '@/src/types';
 import { ensureError } from '@/src/utils';
+import { debug } from '@/src/utils/loggers';
+import { nanoid } from 'nanoid';
 import * as BaseParser from 'socket.io-parser';
+import { PacketType } from 'socket.io-parser';
+import {
+  decodeEnvelope,
+  encodeEnvelope,
+  isEnvelope,
+} from '@/src/core/remote/binaryEnvelope';
 
 import type { Packet } from 'socket.io-parser';
 
 export const CHUNK_SIZE = 1 * 1024 * 1024;
 export const CHUNKED_PACKET_TYPE = 'C';
+export const ACK_PACKET_TYPE = 'A';
+export const RESUME_PACKET_TYPE = 'R';
+// query parameter with which clients ask for resumable transfers
+export const RESUMABLE_QS = 'resumableTransfers';
+// receivers of resumable transfers acknowledge every this many chunks
+export const ACK_INTERVAL = 16;
+// how long interrupted transfers are kept to be resumed
+export const RESUME_TTL = 5 * 60 * 1000; // ms
+const TRANSFER_ID_SIZE = 24;
+
+type Message = string | ArrayBuffer | ArrayBufferView | Blob;
+
+interface ChunkingHeader {
+  sizes: number[];
+  id?: string;
+  // chunk of the transfer that the following chunks start at
+  offset?: number;
+}
+
+interface OutgoingTransfer {
+  id: string;
+  sizes: number[];
+  // chunks are released once the receiver acknowledges them
+  chunks: Array<Message | null>;
+  acked: number;
+  expires: number;
+}
+
+interface IncomingTransfer {
+  id: Maybe<string>;
+  sizes: number[];
+  // chunks received across all messages
+  received: number;
+  // the message being reassembled
+  index: number;
+  chunks: Array<string | ArrayBuffer>;
+  // reassembled messages of a resumable transfer, held until it completes
+  messages: any[];
+  expires: number;
+}
+
+function sum(values: number[]) {
+  return values.reduce((total, value) => total + value, 0);
+}
+
+function encodeHeader({ sizes, id, offset }: ChunkingHeader) {
+  if (!id) {
+    return `${CHUNKED_PACKET_TYPE}${JSON.stringify(sizes)}`;
+  }
+  const info = offset ? { id, sizes, offset } : { id, sizes };
+  return `${CHUNKED_PACKET_TYPE}${JSON.stringify(info)}`;
+}
+
+function encodeControl(type: string, id: string, offset: number) {
+  return `${type}${JSON.stringify({ id, offset })}`;
+}
+
+function newIncomingTransfer(
+  sizes: number[],
+  id: Maybe<string> = null
+): IncomingTransfer {
+  return {
+    id,
+    sizes,
+    received: 0,
+    index: 0,
+    chunks: [],
+    messages: [],
+    expires: 0,
+  };
+}
+
+/**
+ * Tracks the resumable transfers of a connection.
+ *
+ * The encoder and decoder of a connection share one instance. `send` writes
+ * a raw message to the current connection.
+ *
+ * Outgoing chunks are kept until the server acknowledges them. Incoming
+ * transfers that a dropped connection interrupted are parked. Once the server
+ * accepts resumable transfers on a new connection, parked downloads are
+ * requested from where they stopped, and uploads are resent from the last
+ * acknowledged chunk.
+ */
+export class ResumableTransfers {
+  public enabled = false;
+  public readonly parked = new Map<string, IncomingTransfer>();
+  private outgoing = new Map<string, OutgoingTransfer>();
+
+  constructor(
+    public send: (message: Message) => void,
+    public ttl = RESUME_TTL
+  ) {}
+
+  start(sizes: number[], chunks: Message[]) {
+    this.prune();
+    const id = nanoid(TRANSFER_ID_SIZE);
+    this.outgoing.set(id, {
+      id,
+      sizes,
+      chunks,
+      acked: 0,
+      expires: Date.now() + this.ttl,
+    });
+    return id;
+  }
+
+  handleControl(type: string, id: Maybe<string>, offset: number) {
+    if (id == null) {
+      if (type === ACK_PACKET_TYPE) this.accept();
+      return;
+    }
+    if (type === ACK_PACKET_TYPE) {
+      this.ack(id, offset);
+    } else if (type === RESUME_PACKET_TYPE) {
+      this.resume(id, offset);
+    }
+  }
+
+  park(transfer: IncomingTransfer) {
+    if (!transfer.id) return;
+    transfer.expires = Date.now() + this.ttl;
+    this.parked.set(transfer.id, transfer);
+  }
+
+  unpark(id: string) {
+    this.prune();
+    const transfer = this.parked.get(id);
+    this.parked.delete(id);
+    return transfer;
+  }
+
+  clear() {
+    this.parked.clear();
+    this.outgoing.clear();
+  }
+
+  protected accept() {
+    this.enabled = true;
+    this.prune();
+    this.parked.forEach((transfer, id) => {
+      if (transfer.received < sum(transfer.sizes)) {
+        this.send(encodeControl(RESUME_PACKET_TYPE, id, transfer.received));
+      }
+    });
+    this.outgoing.forEach((transfer) => {
+      this.sendFrom(transfer, transfer.acked);
+    });
+  }
+
+  protected ack(id: string, offset: number) {
+    const transfer = this.outgoing.get(id);
+    if (!transfer) return;
+    if (offset >= sum(transfer.sizes)) {
+      this.outgoing.delete(id);
+      return;
+    }
+    transfer.chunks.fill(null, transfer.acked, offset);
+    transfer.acked = Math.max(transfer.acked, offset);
+    transfer.expires = Date.now() + this.ttl;
+  }
+
+  protected resume(id: string, offset: number) {
+    this.prune();
+    const transfer = this.outgoing.get(id);
+    if (!transfer || offset < transfer.acked) {
+      debug.warn(`Cannot resume transfer ${id} at chunk ${offset}`);
+      return;
+    }
+    transfer.expires = Date.now() + this.ttl;
+    this.sendFrom(transfer, offset);
+  }
+
+  protected sendFrom(transfer: OutgoingTransfer, offset: number) {
+    const { id, sizes } = transfer;
+    this.send(encodeHeader({ sizes, id, offset }));
+    transfer.chunks.slice(offset).forEach((chunk) => this.send(chunk!));
+  }
+
+  protected prune() {
+    const now = Date.now();
+    this.parked.forEach((transfer, id) => {
+      if (transfer.expires <= now) this.parked.delete(id);
+    });
+    this.outgoing.forEach((transfer, id) => {
+      if (transfer.expires <= now) this.outgoing.delete(id);
+    });
+  }
+}
 
 function isBinary(obj: any) {
   return (
@@ -59,10 +256,23 @@ function allArrayBufferChunks(chunks: any[]): chunks is ArrayBuffer[] {
  * message.
  *
  * Chunking works on both string and binary messages.
+ *
+ * When `binaryEnvelope` is set, event packets are encoded as a single binary
+ * envelope message instead. See binaryEnvelope.ts.
+ *
+ * Once `transfers` is set and enabled, chunking messages carry a transfer ID
+ * so that the transfer can be resumed after a dropped connection:
+ *
+ * `C{"id":"<transfer ID>","sizes":[N1, N2, ...],"offset":K}`
+ *
+ * See ChunkedPacket in the server's chunking_packet.py for the protocol.
  */
 class ChunkedEncoder extends BaseParser.Encoder {
+  public binaryEnvelope = false;
+  public transfers: Maybe<ResumableTransfers> = null;
+
   encode(packet: Packet) {
-    const messages = super.encode(packet);
+    const messages = this.encodeMessages(packet);
 
     // All messages are smaller than the chunk size.
     // Skip wrapping the socket.io message with chunking.
@@ -80,7 +290,22 @@ class ChunkedEncoder extends BaseParser.Encoder {
       output.push(...chunks);
     }
 
-    return [`${CHUNKED_PACKET_TYPE}${JSON.stringify(chunkedSizes)}`, ...output];
+    const header: ChunkingHeader = { sizes: chunkedSizes };
+    if (this.transfers?.enabled) {
+      header.id = this.transfers.start(chunkedSizes, output);
+    }
+    return [encodeHeader(header), ...output];
+  }
+
+  protected encodeMessages(packet: Packet): any[] {
+    if (
+      this.binaryEnvelope &&
+      (packet.type === PacketType.EVENT ||
+        packet.type === PacketType.BINARY_EVENT)
+    ) {
+      return [encodeEnvelope({ ...packet, type: PacketType.EVENT })];
+    }
+    return super.encode(packet);
   }
 
   protected chunkMessage(msg: any) {
@@ -133,50 +358,142 @@ class ChunkedEncoder extends BaseParser.Encoder {
 }
 
 class ChunkedDecoder extends BaseParser.Decoder {
-  protected chunkingInfo: Maybe<number[]>;
-  protected chunks: Array<string | Uint8Array> = [];
+  public transfers: Maybe<ResumableTransfers> = null;
+  protected transfer: Maybe<IncomingTransfer>;
+  // chunks to drop, e.g. resent ones that were already received
+  protected skip = 0;
 
   add(obj: any): void {
-    if (this.chunkingInfo?.length) {
-      // process chunk
-      this.chunks.push(obj);
-
-      if (this.chunks.length === this.chunkingInfo[0]) {
-        super.add(this.reconstructChunks(this.chunks));
-        this.chunks.length = 0;
-        this.chunkingInfo.shift();
-      }
-
-      if (this.chunkingInfo.length === 0) {
-        // reset chunking state
-        this.chunkingInfo = null;
-      }
+    if (this.skip > 0) {
+      this.skip--;
+    } else if (this.transfer) {
+      this.addChunk(obj);
     } else if (
       typeof obj === 'string' &&
       obj.charAt(0) === CHUNKED_PACKET_TYPE
     ) {
       // chunking message
-      if (obj.charAt(1) !== '[') {
+      if (obj.charAt(1) !== '[' && obj.charAt(1) !== '{') {
         throw new Error('Failed to parse start of chunking info.');
       }
-      this.chunkingInfo = this.parseChunkingInfo(obj.substring(1));
-      this.chunks = [];
+      this.startTransfer(this.parseChunkingInfo(obj.substring(1)));
+    } else if (
+      typeof obj === 'string' &&
+      (obj.charAt(0) === ACK_PACKET_TYPE ||
+        obj.charAt(0) === RESUME_PACKET_TYPE) &&
+      obj.charAt(1) === '{'
+    ) {
+      const { id, offset } = JSON.parse(obj.substring(1));
+      this.transfers?.handleControl(obj.charAt(0), id, offset ?? 0);
+    } else {
+      this.addMessage(obj);
+    }
+  }
+
+  destroy() {
+    super.destroy();
+    // the connection is gone
+    if (this.transfer) this.transfers?.park(this.transfer);
+    this.transfer = null;
+    this.skip = 0;
+    if (this.transfers) this.transfers.enabled = false;
+  }
+
+  protected startTransfer({ sizes, id, offset = 0 }: ChunkingHeader) {
+    if (!id) {
+      this.transfer = newIncomingTransfer(sizes);
+      return;
+    }
+
+    const parked = this.transfers?.unpark(id);
+    if (!parked && !offset) {
+      this.transfer = newIncomingTransfer(sizes, id);
+      return;
+    }
+
+    if (
+      !parked ||
+      parked.sizes.join() !== sizes.join() ||
+      parked.received < offset
+    ) {
+      debug.warn(`Cannot resume transfer ${id}, dropping it`);
+      this.skip = sum(sizes) - offset;
+      return;
+    }
+
+    this.skip = parked.received - offset;
+    if (parked.received >= sum(sizes)) {
+      // the sender missed the last acknowledgement
+      this.transfers?.park(parked);
+      this.acknowledge(parked);
+    } else {
+      this.transfer = parked;
+    }
+  }
+
+  protected addChunk(obj: any) {
+    const transfer = this.transfer!;
+    transfer.chunks.push(obj);
+    transfer.received++;
+
+    if (transfer.chunks.length === transfer.sizes[transfer.index]) {
+      const message = this.reconstructChunks(transfer.chunks);
+      transfer.chunks = [];
+      transfer.index++;
+      if (transfer.id) {
+        transfer.messages.push(message);
+      } else {
+        this.addMessage(message);
+      }
+    }
+
+    const done = transfer.received >= sum(transfer.sizes);
+    if (transfer.id && (done || transfer.received % ACK_INTERVAL === 0)) {
+      this.acknowledge(transfer);
+    }
+
+    if (done) {
+      // reset chunking state
+      this.transfer = null;
+      if (transfer.id) {
+        const { messages } = transfer;
+        transfer.messages = [];
+        // remembered in case the sender resends it
+        this.transfers?.park(transfer);
+        messages.forEach((message) => this.addMessage(message));
+      }
+    }
+  }
+
+  protected acknowledge(transfer: IncomingTransfer) {
+    this.transfers?.send(
+      encodeControl(ACK_PACKET_TYPE, transfer.id!, transfer.received)
+    );
+  }
+
+  protected addMessage(message: any) {
+    // envelopes are never binary attachments of a pending packet
+    if (!(this as any).reconstructor && isEnvelope(message)) {
+      this.emitReserved('decoded', decodeEnvelope(message));
     } else {
       // let the parent take care of it.
-      super.add(obj);
+      super.add(message);
     }
   }
 
-  protected parseChunkingInfo(serialized: string): number[] {
+  protected parseChunkingInfo(serialized: string): ChunkingHeader {
     try {
       const result = JSON.parse(serialized);
-      if (!Array.isArray(result)) {
+      const header: ChunkingHeader = Array.isArray(result)
+        ? { sizes: result }
+        : result;
+      if (!Array.isArray(header.sizes)) {
         throw new TypeError('Chunking info is not an array');
       }
-      if (!result.every((item) => Number.isInteger(item))) {
+      if (!header.sizes.every((item) => Number.isInteger(item))) {
         throw new TypeError('Chunking info is invalid');
       }
-      return result as number[];
+      return header;
     } catch (err) {
       throw new Error('Failed to parse chunking info', {
         cause: ensureError(err),
@@ -12,6 +12,10 @@ import { nanoid } from 'nanoid';
 import { Socket, io } from 'socket.io-client';
 import { z } from 'zod';
 import * as ChunkedParser from '@/src/core/remote/chunkedParser';
+import {
+  ENVELOPE_MODE_BINARY,
+  ENVELOPE_MODE_JSON,
+} from '@/src/core/remote/binaryEnvelope';
 import { parseUrl } from '@/src/utils/url';
 
 const CLIENT_ID_SIZE = 24;
@@ -20,6 +24,8 @@ const RPC_CALL_EVENT = 'rpc:call';
 const RPC_RESULT_EVENT = 'rpc:result';
 const STREAM_CALL_EVENT = 'stream:call';
 const STREAM_RESULT_EVENT = 'stream:result';
+const ENVELOPE_EVENT = 'rpc:envelope';
+const ENVELOPE_TIMEOUT = 5000; // ms
 
 interface RpcOkResult<R> {
   rpcId: string;
@@ -41,18 +47,40 @@ interface RpcErrorResult {
   rpcId: string;
   ok: false;
   error: string;
+  // set when the server rejected the call because it is overloaded
+  retryAfter?: number;
 }
 
 const RpcErrorResultSchema = z.object({
   rpcId: z.string(),
   ok: z.literal(false),
   error: z.string(),
+  retryAfter: z.number().optional(),
 });
 
 export function makeRpcErrorResult(error: string): RpcErrorResult {
   return { rpcId: '', ok: false, error };
 }
 
+/**
+ * A call the server rejected for going over its limits.
+ *
+ * It can be retried after `retryAfter` seconds.
+ */
+export class RpcRejectedError extends Error {
+  constructor(message: string, public readonly retryAfter: number) {
+    super(message);
+    this.name = 'RpcRejectedError';
+  }
+}
+
+function toRpcError(result: RpcErrorResult) {
+  if (result.retryAfter != null) {
+    return new RpcRejectedError(result.error, result.retryAfter);
+  }
+  return new Error(result.error);
+}
+
 type RpcResult<R> = RpcOkResult<R> | RpcErrorResult;
 
 const RpcResultSchema = z.union([RpcOkResultSchema, RpcErrorResultSchema]);
@@ -82,10 +110,40 @@ function validateStreamResult<T>(result: unknown): result is StreamResult<T> {
 
 type StreamCallback<D> = (data: D) => void;
 
+export type RpcPriority = 'interactive' | 'normal' | 'background';
+
+export interface RpcCallOptions {
+  /**
+   * Overrides the server-side scheduling priority of the endpoint.
+   */
+  priority?: RpcPriority;
+  /**
+   * Milliseconds after which the server drops the call and replies with an
+   * error, including work it has queued on the call's behalf.
+   */
+  timeout?: number;
+  /**
+   * Identifies the call in server-side traces. The server generates one if
+   * it is not given.
+   */
+  traceId?: string;
+}
+
 export interface RpcCall {
   rpcId: string;
   name: string;
   args?: unknown[];
+  priority?: RpcPriority;
+  /**
+   * Unix time in milliseconds.
+   */
+  deadline?: number;
+  traceId?: string | null;
+}
+
+function toCallFields({ timeout, ...options }: RpcCallOptions = {}) {
+  if (timeout == null) return options;
+  return { ...options, deadline: Date.now() + timeout };
 }
 
 const RpcCallSchema = z.object({
@@ -106,6 +164,11 @@ export interface RpcClientOptions {
   serializers?: Array<(input: any) => any>;
   deserializers?: Array<(input: any) => any>;
   path?: string;
+  /**
+   * Ask the server to use binary envelopes instead of JSON for RPC messages.
+   * Falls back to JSON if the server does not allow it.
+   */
+  binaryEnvelope?: boolean;
 }
 
 function justHostUrl(url: string) {
@@ -131,6 +194,8 @@ export default class RpcClient {
 
   public serializers = DefaultSerializeTransformers;
   public deserializers = DefaultDeserializeTransformers;
+  public readonly binaryEnvelope: boolean;
+  public readonly transfers: ChunkedParser.ResumableTransfers;
 
   private waiting: Map<string, Promise<unknown>>;
   private pendingRpcs: Map<string, Deferred<any>>;
@@ -142,6 +207,7 @@ export default class RpcClient {
     this.serializers = options?.serializers ?? DefaultSerializeTransformers;
     this.deserializers =
       options?.deserializers ?? DefaultDeserializeTransformers;
+    this.binaryEnvelope = options?.binaryEnvelope ?? false;
 
     this.waiting = new Map();
     this.pendingRpcs = new Map();
@@ -150,21 +216,62 @@ export default class RpcClient {
     this.socket = io('', {
       query: {
         clientId: this.clientId,
+        [ChunkedParser.RESUMABLE_QS]: '1',
       },
       autoConnect: false,
       parser: ChunkedParser,
     });
 
+    // chunked transfers interrupted by a dropped connection are resumed
+    // once the client reconnects
+    this.transfers = new ChunkedParser.ResumableTransfers((message) =>
+      this.socket.io.engine.write(message)
+    );
+    this.encoder.transfers = this.transfers;
+    this.decoder.transfers = this.transfers;
+
     this.socket.on(RPC_CALL_EVENT, this.onRpcCallEvent);
     this.socket.on(RPC_RESULT_EVENT, this.onRpcResultEvent);
     this.socket.on(STREAM_RESULT_EVENT, this.onStreamResultEvent);
+    this.socket.on('connect', this.negotiateEnvelope);
   }
 
+  private get encoder(): InstanceType<typeof ChunkedParser.Encoder> {
+    return (this.socket.io as any).encoder;
+  }
+
+  private get decoder(): InstanceType<typeof ChunkedParser.Decoder> {
+    return (this.socket.io as any).decoder;
+  }
+
+  /**
+   * Negotiates the envelope mode on every (re)connect.
+   *
+   * Messages are sent as JSON until the server accepts binary envelopes.
+   * Received envelopes are decoded regardless of the negotiated mode.
+   */
+  private negotiateEnvelope = async () => {
+    this.encoder.binaryEnvelope = false;
+    if (!this.binaryEnvelope) return;
+
+    try {
+      const reply = await this.socket
+        .timeout(ENVELOPE_TIMEOUT)
+        .emitWithAck(ENVELOPE_EVENT, { mode: ENVELOPE_MODE_BINARY });
+      const mode = reply?.mode ?? ENVELOPE_MODE_JSON;
+      this.encoder.binaryEnvelope = mode === ENVELOPE_MODE_BINARY;
+    } catch (err) {
+      debug.warn('Failed to negotiate binary envelopes:', err);
+    }
+  };
+
   protected serialize = flow(...this.serializers);
   protected deserialize = flow(...this.deserializers);
 
   async connect(uri: string) {
     await this.disconnect();
+    // transfers cannot be resumed on another server
+    this.transfers.clear();
     // @ts-ignore reset socket.io URI
     this.socket.io.uri = justHostUrl(uri);
     this.socket.io.opts.path = getSocketIoPath(uri);
@@ -225,8 +332,13 @@ export default class RpcClient {
    * Calls a remote RPC given some arguments.
    * @param rpcName
    * @param args
+   * @param options
    */
-  async call<R = unknown>(rpcName: string, args?: unknown[]) {
+  async call<R = unknown>(
+    rpcName: string,
+    args?: unknown[],
+    options?: RpcCallOptions
+  ) {
     if (!this.socket.connected) {
       throw new Error('Not connected to server');
     }
@@ -240,6 +352,7 @@ export default class RpcClient {
       rpcId,
       name: rpcName,
       args: transformObjects(args ?? [], this.serialize),
+      ...toCallFields(options),
     });
 
     return pending.promise;
@@ -264,7 +377,7 @@ export default class RpcClient {
     if (result.ok) {
       deferred.resolve(transformObject(result.data, this.deserialize));
     } else {
-      deferred.reject(new Error(result.error));
+      deferred.reject(toRpcError(result));
     }
   };
 
@@ -283,17 +396,20 @@ export default class RpcClient {
    * @param methodName
    * @param args
    * @param callback
+   * @param options
    */
   async stream<D>(
     methodName: string,
     args: unknown[],
-    callback: StreamCallback<D>
+    callback: StreamCallback<D>,
+    options?: RpcCallOptions
   ): Promise<void>;
 
   async stream<D>(
     methodName: string,
     argsOrCallback: unknown[] | StreamCallback<D>,
-    maybeCallback?: StreamCallback<D>
+    maybeCallback?: StreamCallback<D>,
+    options?: RpcCallOptions
   ) {
     if (!this.socket.connected) {
       throw new Error('Not connected to server');
@@ -314,6 +430,7 @@ export default class RpcClient {
       rpcId,
       name: methodName,
       args: transformObjects(args ?? [], this.serialize),
+      ...toCallFields(options),
     });
 
     return deferred.promise;
@@ -346,7 +463,7 @@ export default class RpcClient {
       }
     } else {
       clearListeners();
-      deferred.reject(new Error(result.error));
+      deferred.reject(toRpcError(result));
     }
   };
 
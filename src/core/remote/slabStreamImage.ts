@@ -0,0 +1,181 @@
+import vtk from '@kitware/vtk.js/vtk';
+import vtkDataArray from '@kitware/vtk.js/Common/Core/DataArray';
+import vtkImageData from '@kitware/vtk.js/Common/DataModel/ImageData';
+import { TypedArray } from '@kitware/vtk.js/types';
+import mitt, { Emitter } from 'mitt';
+import {
+  BaseProgressiveImage,
+  ProgressiveImageEvents,
+} from '@/src/core/progressiveImage';
+import type RpcClient from '@/src/core/remote/client';
+import { TypedArrayConstructorName } from '@/src/types';
+import { ensureError } from '@/src/utils';
+
+const { fastComputeRange } = vtkDataArray;
+
+/**
+ * Matches `iter_image_slabs` in volview_server/transformers/image_slabs.py.
+ */
+interface SlabHeader {
+  type: 'header';
+  image: any;
+  slabDepth: number;
+  numberOfSlabs: number;
+}
+
+interface SlabData {
+  type: 'slab';
+  index: number;
+  zOffset: number;
+  depth: number;
+  values: ArrayBuffer | ArrayBufferView;
+}
+
+type SlabMessage = SlabHeader | SlabData;
+
+/**
+ * An image streamed from a server stream endpoint as ordered Z-slabs.
+ *
+ * The image is allocated from the geometry header, and each slab is written
+ * into it as it arrives.
+ */
+export class SlabStreamImage extends BaseProgressiveImage {
+  private events: Emitter<ProgressiveImageEvents>;
+  private slabsLoaded = 0;
+  private numberOfSlabs = 0;
+  // ignore slabs from a stream that was stopped
+  private streamId = 0;
+
+  constructor(
+    private client: RpcClient,
+    private streamName: string,
+    private args: unknown[],
+    name: string
+  ) {
+    super();
+    this.name.value = name;
+    this.events = mitt();
+
+    this.addEventListener('loading', (loading) => {
+      this.loading.value = loading;
+    });
+
+    this.addEventListener('status', (status) => {
+      this.status.value = status;
+      this.loaded.value = status === 'complete';
+    });
+  }
+
+  addEventListener<T extends keyof ProgressiveImageEvents>(
+    type: T,
+    callback: (info: ProgressiveImageEvents[T]) => void
+  ): void {
+    this.events.on(type, callback);
+  }
+
+  removeEventListener<T extends keyof ProgressiveImageEvents>(
+    type: T,
+    callback: (info: ProgressiveImageEvents[T]) => void
+  ): void {
+    this.events.off(type, callback);
+  }
+
+  dispose() {
+    super.dispose();
+    this.streamId++;
+    this.events.all.clear();
+    this.vtkImageData.value.delete();
+  }
+
+  startLoad() {
+    if (this.loading.value || this.status.value === 'complete') return;
+
+    this.streamId++;
+    const { streamId } = this;
+    this.slabsLoaded = 0;
+    this.events.emit('loading', true);
+
+    this.client
+      .stream<SlabMessage>(this.streamName, this.args, (message) => {
+        if (streamId === this.streamId) this.onMessage(message);
+      })
+      .then(() => {
+        if (streamId !== this.streamId) return;
+        this.events.emit('loading', false);
+      })
+      .catch((err) => {
+        if (streamId !== this.streamId) return;
+        this.events.emit('error', ensureError(err));
+        this.events.emit('loading', false);
+      });
+  }
+
+  stopLoad() {
+    // the server keeps streaming, but further slabs are ignored
+    this.streamId++;
+    this.events.emit('loading', false);
+  }
+
+  private onMessage(message: SlabMessage) {
+    if (message.type === 'header') {
+      this.onHeader(message);
+    } else if (message.type === 'slab') {
+      this.onSlab(message);
+    }
+  }
+
+  private onHeader(header: SlabHeader) {
+    const { image } = header;
+    const array = image.pointData.arrays[0].data;
+    const TypedArrayCtor =
+      globalThis[array.dataType as TypedArrayConstructorName];
+    array.values = new TypedArrayCtor(array.size);
+
+    this.numberOfSlabs = header.numberOfSlabs;
+    this.vtkImageData.value.delete();
+    this.vtkImageData.value = vtk(image) as vtkImageData;
+    this.events.emit('status', 'incomplete');
+  }
+
+  private onSlab(slab: SlabData) {
+    const scalars = this.vtkImageData.value.getPointData().getScalars();
+    const pixelData = scalars.getData() as TypedArray;
+    const TypedArrayCtor = pixelData.constructor as new (
+      buffer: ArrayBuffer
+    ) => TypedArray;
+
+    const dims = this.vtkImageData.value.getDimensions();
+    const numComps = scalars.getNumberOfComponents();
+    const slabValues = new TypedArrayCtor(
+      ArrayBuffer.isView(slab.values)
+        ? slab.values.buffer.slice(
+            slab.values.byteOffset,
+            slab.values.byteOffset + slab.values.byteLength
+          )
+        : slab.values
+    );
+    pixelData.set(slabValues, dims[0] * dims[1] * numComps * slab.zOffset);
+
+    for (let comp = 0; comp < numComps; comp++) {
+      const { min, max } = fastComputeRange(
+        slabValues as unknown as number[],
+        comp,
+        numComps
+      );
+      const [curMin, curMax] = scalars.getRange(comp);
+      scalars.setRange(
+        this.slabsLoaded
+          ? { min: Math.min(min, curMin), max: Math.max(max, curMax) }
+          : { min, max },
+        comp
+      );
+    }
+    scalars.modified(); // so image-stats will trigger update of range
+    this.vtkImageData.value.modified();
+
+    this.slabsLoaded++;
+    if (this.slabsLoaded === this.numberOfSlabs) {
+      this.events.emit('status', 'complete');
+    }
+  }
+}
@@ -0,0 +1,127 @@
+import { describe, it, expect } from 'vitest';
+import {
+  deserializeImageSequence,
+  isImageSequence,
+} from '@/src/core/remote/transformers/imageSequence';
+import {
+  RUN_LENGTH_ENCODING,
+  encodeRunLength,
+} from '@/src/core/remote/transformers/runLength';
+
+function makeSequence(
+  dataType: string,
+  frameSize: number,
+  sequence: Record<string, any>
+) {
+  return {
+    _imageSequence: true,
+    image: {
+      vtkClass: 'vtkImageData',
+      extent: [0, frameSize - 1, 0, 0, 0, 0],
+      spacing: [1, 1, 1],
+      origin: [0, 0, 0],
+      direction: [1, 0, 0, 0, 1, 0, 0, 0, 1],
+      pointData: {
+        vtkClass: 'vtkDataSetAttributes',
+        activeScalars: 0,
+        arrays: [
+          {
+            data: {
+              vtkClass: 'vtkDataArray',
+              name: 'Scalars',
+              numberOfComponents: 1,
+              size: frameSize,
+              dataType,
+              values: null,
+            },
+          },
+        ],
+      },
+    },
+    ...sequence,
+  };
+}
+
+function getFrameValues(frames: any[]) {
+  return frames.map((frame) => frame.getPointData().getScalars().getData());
+}
+
+describe('Image sequences', () => {
+  it('should expand frames from the server encoder', () => {
+    // itk_to_image_sequence() of two int16 images of 3 pixels,
+    // [1, -2, 3] and [11, -2, 3]
+    const values = Int16Array.of(1, -2, 3, 11, -2, 3);
+    const frames = deserializeImageSequence(
+      makeSequence('Int16Array', 3, { offsets: [0, 3], values: values.buffer })
+    );
+
+    expect(frames.length).toBe(2);
+    const [first, second] = getFrameValues(frames);
+    expect(first).toBeInstanceOf(Int16Array);
+    expect(Array.from(first)).toEqual([1, -2, 3]);
+    expect(Array.from(second)).toEqual([11, -2, 3]);
+    // views of the received buffer, not copies
+    expect(first.buffer).toBe(second.buffer);
+  });
+
+  it('should expand run-length encoded frames from the server encoder', () => {
+    // itk_to_image_sequence() of three uint8 images of 20 pixels, where
+    // frame i has the label i + 1 at pixel i
+    const frames = deserializeImageSequence(
+      makeSequence('Uint8Array', 20, {
+        offsets: [0, 20, 40],
+        values: Uint8Array.of(1, 0, 2, 0, 3, 0).buffer,
+        encoding: RUN_LENGTH_ENCODING,
+        runLengths: Uint32Array.of(1, 20, 1, 20, 1, 17).buffer,
+      })
+    );
+
+    getFrameValues(frames).forEach((values, i) => {
+      const expected = new Uint8Array(20);
+      expected[i] = i + 1;
+      expect(values).toEqual(expected);
+    });
+  });
+
+  it('should round-trip sparse label frames', () => {
+    const labels = new Uint16Array(4 * 250);
+    labels.fill(3, 10, 40);
+    labels.fill(9, 700, 720);
+    const encoded = encodeRunLength(labels)!;
+    expect(encoded).not.toBeNull();
+
+    const frames = deserializeImageSequence(
+      makeSequence('Uint16Array', 250, {
+        offsets: [0, 250, 500, 750],
+        // typed arrays, as decoded from a binary envelope
+        values: encoded.runValues,
+        encoding: RUN_LENGTH_ENCODING,
+        runLengths: encoded.runLengths,
+      })
+    );
+
+    getFrameValues(frames).forEach((values, i) => {
+      expect(values).toEqual(labels.subarray(i * 250, (i + 1) * 250));
+    });
+  });
+
+  it('should reject unknown encodings', () => {
+    const sequence = makeSequence('Uint8Array', 2, {
+      offsets: [0],
+      values: new Uint8Array(2).buffer,
+      encoding: 'zstd',
+    });
+    expect(() => deserializeImageSequence(sequence)).toThrow(
+      'Unknown pixel encoding zstd'
+    );
+  });
+
+  it('should leave other objects as they are', () => {
+    const image = { vtkClass: 'vtkImageData' };
+    const list = [image, image];
+    expect(isImageSequence(list)).toBe(false);
+    expect(deserializeImageSequence(list)).toBe(list);
+    expect(deserializeImageSequence(image)).toBe(image);
+    expect(deserializeImageSequence(null)).toBeNull();
+  });
+});
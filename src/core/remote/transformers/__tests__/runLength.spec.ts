@@ -0,0 +1,212 @@
+import { describe, it, expect } from 'vitest';
+import {
+  RUN_LENGTH_ENCODING,
+  decodeRunLength,
+  encodeRunLength,
+} from '@/src/core/remote/transformers/runLength';
+import type { RunLengthArray } from '@/src/core/remote/transformers/runLength';
+import { deserializeVtkImageData } from '@/src/core/remote/transformers/vtkImageData';
+
+const IntegerArrays = [
+  Int8Array,
+  Uint8Array,
+  Uint8ClampedArray,
+  Int16Array,
+  Uint16Array,
+  Int32Array,
+  Uint32Array,
+  BigInt64Array,
+  BigUint64Array,
+];
+
+function isBigIntArray(array: RunLengthArray) {
+  return array instanceof BigInt64Array || array instanceof BigUint64Array;
+}
+
+// a label map: mostly zeros, with two small labeled regions
+function makeLabels<T extends RunLengthArray>(
+  Ctor: new (length: number) => T,
+  size = 1000
+) {
+  const labels = new Ctor(size);
+  const one: any = isBigIntArray(labels) ? BigInt(1) : 1;
+  const seven: any = isBigIntArray(labels) ? BigInt(7) : 7;
+  labels.fill(one, 100, 140);
+  labels.fill(seven, 600, 650);
+  return labels;
+}
+
+describe('Run-length encoding', () => {
+  it('should handle empty arrays', () => {
+    expect(encodeRunLength(new Uint8Array(0))).toBeNull();
+
+    const decoded = decodeRunLength(new Uint8Array(0), new Uint32Array(0), 0);
+    expect(decoded).toBeInstanceOf(Uint8Array);
+    expect(decoded.length).toBe(0);
+  });
+
+  it('should encode a single run', () => {
+    const encoded = encodeRunLength(new Uint16Array(4096));
+    expect(encoded).not.toBeNull();
+    expect(Array.from(encoded!.runValues)).toEqual([0]);
+    expect(Array.from(encoded!.runLengths)).toEqual([4096]);
+
+    const decoded = decodeRunLength(
+      encoded!.runValues,
+      encoded!.runLengths,
+      4096
+    );
+    expect(decoded).toEqual(new Uint16Array(4096));
+  });
+
+  it('should decode a single nonzero run', () => {
+    const decoded = decodeRunLength(
+      Int32Array.of(-5),
+      Uint32Array.of(3),
+      3
+    );
+    expect(Array.from(decoded)).toEqual([-5, -5, -5]);
+  });
+
+  it('should encode up to the run count that still saves space', () => {
+    // 1000 bytes fit 200 runs of a 1-byte value and a 4-byte length
+    const maximal = new Uint8Array(1000);
+    // 100 isolated labels, starting at the first value, make 200 runs. A
+    // lower sparsity threshold leaves only the run count to limit encoding.
+    for (let i = 0; i < 100; i++) maximal[i * 10] = 1;
+    const encoded = encodeRunLength(maximal, 0.5);
+    expect(encoded).not.toBeNull();
+    expect(encoded!.runLengths.length).toBe(200);
+    expect(
+      decodeRunLength(encoded!.runValues, encoded!.runLengths, 1000)
+    ).toEqual(maximal);
+
+    // shifting the labels by one adds a leading run of zeros
+    const tooMany = new Uint8Array(1000);
+    for (let i = 0; i < 100; i++) tooMany[i * 10 + 1] = 1;
+    expect(encodeRunLength(tooMany, 0.5)).toBeNull();
+  });
+
+  it('should decode runs of length one', () => {
+    const decoded = decodeRunLength(
+      Uint8Array.of(1, 2, 3, 4),
+      Uint32Array.of(1, 1, 1, 1),
+      4
+    );
+    expect(Array.from(decoded)).toEqual([1, 2, 3, 4]);
+  });
+
+  it('should not encode dense or floating point arrays', () => {
+    expect(encodeRunLength(new Uint8Array(100).fill(1))).toBeNull();
+    expect(encodeRunLength(new Float32Array(100))).toBeNull();
+    expect(encodeRunLength(new Float64Array(100))).toBeNull();
+  });
+
+  it('should round-trip each integer typed array', () => {
+    IntegerArrays.forEach((Ctor) => {
+      const labels = makeLabels(Ctor as new (length: number) => RunLengthArray);
+      const encoded = encodeRunLength(labels);
+      expect(encoded).not.toBeNull();
+      expect(encoded!.runValues).toBeInstanceOf(Ctor);
+      expect(encoded!.runLengths.length).toBe(5);
+
+      const decoded = decodeRunLength(
+        encoded!.runValues,
+        encoded!.runLengths,
+        labels.length
+      );
+      expect(decoded).toBeInstanceOf(Ctor);
+      expect(decoded).toEqual(labels);
+    });
+  });
+
+  it('should decode floating point run values', () => {
+    const decoded = decodeRunLength(
+      Float32Array.of(0, 0.5),
+      Uint32Array.of(2, 2),
+      4
+    );
+    expect(Array.from(decoded)).toEqual([0, 0, 0.5, 0.5]);
+  });
+
+  it('should decode runs from the server encoder', () => {
+    // run_length_encode() of an int16 array of 24 zeros, with [5:8] = 3
+    // and [20] = -2
+    const decoded = decodeRunLength(
+      Int16Array.of(0, 3, 0, -2, 0),
+      Uint32Array.of(5, 3, 12, 1, 3),
+      24
+    );
+    const expected = new Int16Array(24);
+    expected.fill(3, 5, 8);
+    expected[20] = -2;
+    expect(decoded).toEqual(expected);
+  });
+
+  it('should reject run lengths that do not match the size', () => {
+    expect(() =>
+      decodeRunLength(Uint8Array.of(0, 1), Uint32Array.of(2, 2), 5)
+    ).toThrow('Run lengths do not match the array size');
+  });
+});
+
+describe('Run-length encoded vtkImageData', () => {
+  function makeSerializedImage(data: Record<string, any>) {
+    return {
+      vtkClass: 'vtkImageData',
+      dimensions: [10, 10, 10],
+      spacing: [1, 1, 1],
+      origin: [0, 0, 0],
+      direction: [1, 0, 0, 0, 1, 0, 0, 0, 1],
+      pointData: {
+        vtkClass: 'vtkDataSetAttributes',
+        arrays: [
+          {
+            data: {
+              vtkClass: 'vtkDataArray',
+              name: 'Scalars',
+              numberOfComponents: 1,
+              size: 1000,
+              ...data,
+            },
+          },
+        ],
+      },
+    };
+  }
+
+  it('should expand encoded pixels', () => {
+    const labels = makeLabels(Uint8Array);
+    const encoded = encodeRunLength(labels)!;
+    const image = deserializeVtkImageData(
+      makeSerializedImage({
+        dataType: 'Uint8Array',
+        // as received from the server, in raw buffers
+        values: encoded.runValues.buffer,
+        runLengths: encoded.runLengths.buffer,
+        encoding: RUN_LENGTH_ENCODING,
+      })
+    );
+
+    const scalars = image.getPointData().getScalars();
+    expect(scalars.getData()).toEqual(labels);
+  });
+
+  it('should keep dense pixels', () => {
+    const values = Int16Array.from({ length: 1000 }, (_, i) => i - 500);
+    const image = deserializeVtkImageData(
+      makeSerializedImage({ dataType: 'Int16Array', values: values.buffer })
+    );
+    expect(image.getPointData().getScalars().getData()).toEqual(values);
+  });
+
+  it('should leave images with an unknown encoding undecoded', () => {
+    const serialized = makeSerializedImage({
+      dataType: 'Uint8Array',
+      values: new Uint8Array(2).buffer,
+      runLengths: Uint32Array.of(500, 500).buffer,
+      encoding: 'zstd',
+    });
+    expect(deserializeVtkImageData(serialized)).toBe(serialized);
+  });
+});
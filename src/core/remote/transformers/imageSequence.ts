@@ -0,0 +1,86 @@
+import vtk from '@kitware/vtk.js/vtk';
+import vtkImageData from '@kitware/vtk.js/Common/DataModel/ImageData';
+import type { TypedArray } from '@kitware/vtk.js/types';
+import { TypedArrayConstructorName } from '@/src/types';
+import {
+  RUN_LENGTH_ENCODING,
+  decodeRunLength,
+} from '@/src/core/remote/transformers/runLength';
+
+const IMAGE_SEQUENCE_MARKER = '_imageSequence';
+
+/**
+ * The frames of a 4D image, or of a list of images with the same geometry,
+ * packed in one buffer.
+ *
+ * Matches `itk_to_image_sequence` in
+ * volview_server/transformers/image_sequence.py.
+ */
+interface ImageSequence {
+  [IMAGE_SEQUENCE_MARKER]: true;
+  // a vtkImageData without values
+  image: any;
+  // first pixel component of each frame
+  offsets: number[];
+  values: ArrayBuffer | ArrayBufferView;
+  encoding?: string;
+  runLengths?: ArrayBuffer | ArrayBufferView;
+}
+
+export function isImageSequence(obj: any): obj is ImageSequence {
+  return obj?.[IMAGE_SEQUENCE_MARKER] === true && Array.isArray(obj.offsets);
+}
+
+function toArrayBuffer(values: ArrayBuffer | ArrayBufferView) {
+  return ArrayBuffer.isView(values)
+    ? values.buffer.slice(
+        values.byteOffset,
+        values.byteOffset + values.byteLength
+      )
+    : values;
+}
+
+/**
+ * Expands an image sequence into a list of vtkImageData.
+ *
+ * Frames are views of the received buffer, so nothing is copied unless the
+ * sequence is run-length encoded.
+ */
+export function deserializeImageSequence(obj: any) {
+  if (!isImageSequence(obj)) {
+    return obj;
+  }
+
+  const { image, offsets } = obj;
+  const array = image.pointData.arrays[0].data;
+  const TypedArrayCtor =
+    globalThis[array.dataType as TypedArrayConstructorName];
+  let values: TypedArray = new TypedArrayCtor(toArrayBuffer(obj.values));
+  if (obj.encoding === RUN_LENGTH_ENCODING) {
+    values = decodeRunLength(
+      values,
+      new Uint32Array(toArrayBuffer(obj.runLengths!)),
+      array.size * offsets.length
+    );
+  } else if (obj.encoding !== undefined) {
+    throw new Error(`Unknown pixel encoding ${obj.encoding}`);
+  }
+
+  return offsets.map((offset) => {
+    const frame = {
+      ...image,
+      pointData: {
+        ...image.pointData,
+        arrays: [
+          {
+            data: {
+              ...array,
+              values: values.subarray(offset, offset + array.size),
+            },
+          },
+        ],
+      },
+    };
+    return vtk(frame) as vtkImageData;
+  });
+}
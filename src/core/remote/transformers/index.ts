@@ -2,9 +2,15 @@ import {
   serializeVtkImageData,
   deserializeVtkImageData,
 } from '@/src/core/remote/transformers/vtkImageData';
+import { deserializeNdArray } from '@/src/core/remote/transformers/ndarray';
+import { deserializeImageSequence } from '@/src/core/remote/transformers/imageSequence';
 
 export const DefaultSerializeTransformers = [serializeVtkImageData];
-export const DefaultDeserializeTransformers = [deserializeVtkImageData];
+export const DefaultDeserializeTransformers = [
+  deserializeImageSequence,
+  deserializeVtkImageData,
+  deserializeNdArray,
+];
 
 type ObjectTransformer = (obj: any) => any;
 
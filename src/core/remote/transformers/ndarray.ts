@@ -0,0 +1,69 @@
+import type { TypedArray } from '@kitware/vtk.js/types';
+import { TypedArrayConstructorName } from '@/src/types';
+import { TypedArrayConstructorNames } from '@/src/utils';
+
+const NDARRAY_MARKER = '_ndarray';
+
+// numpy's default integer type is 64 bits, whose values are bigints
+type NdArrayDataType =
+  | TypedArrayConstructorName
+  | 'BigInt64Array'
+  | 'BigUint64Array';
+type NdArrayValues = TypedArray | BigInt64Array | BigUint64Array;
+
+const AllowedTypedArrays = new Set<string>([
+  ...TypedArrayConstructorNames,
+  'BigInt64Array',
+  'BigUint64Array',
+]);
+
+function isTypedArrayName(name: string): name is NdArrayDataType {
+  return AllowedTypedArrays.has(name);
+}
+
+/**
+ * An n-dimensional array, as sent by the server for numpy ndarrays.
+ *
+ * Values are in C order, i.e. the last dimension varies the fastest.
+ */
+export interface NdArray {
+  [NDARRAY_MARKER]: true;
+  dataType: NdArrayDataType;
+  shape: number[];
+  values: NdArrayValues;
+}
+
+export function isNdArray(obj: any): obj is NdArray {
+  return obj?.[NDARRAY_MARKER] === true && typeof obj.dataType === 'string';
+}
+
+/**
+ * Creates an ndarray to send to the server, where it is received as a numpy
+ * ndarray.
+ */
+export function makeNdArray(
+  values: NdArrayValues,
+  shape?: number[]
+): NdArray {
+  return {
+    [NDARRAY_MARKER]: true,
+    dataType: values.constructor.name as NdArrayDataType,
+    shape: shape ?? [values.length],
+    values,
+  };
+}
+
+export function deserializeNdArray(obj: any) {
+  if (!isNdArray(obj) || !isTypedArrayName(obj.dataType)) {
+    return obj;
+  }
+
+  const { values } = obj as any;
+  if (ArrayBuffer.isView(values)) {
+    return obj;
+  }
+  return {
+    ...obj,
+    values: new globalThis[obj.dataType as NdArrayDataType](values),
+  };
+}
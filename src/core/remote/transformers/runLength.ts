@@ -0,0 +1,95 @@
+import type { TypedArray } from '@kitware/vtk.js/types';
+
+export const RUN_LENGTH_ENCODING = 'rle';
+
+// arrays with at least this fraction of zeros are sent run-length encoded
+export const SPARSE_THRESHOLD = 0.9;
+
+export type RunLengthArray = TypedArray | BigInt64Array | BigUint64Array;
+
+type RunLengthArrayConstructor<T extends RunLengthArray> = new (
+  length: number
+) => T;
+
+const IntegerArrayNames = new Set([
+  'Uint8Array',
+  'Uint8ClampedArray',
+  'Uint16Array',
+  'Uint32Array',
+  'Int8Array',
+  'Int16Array',
+  'Int32Array',
+  'BigInt64Array',
+  'BigUint64Array',
+]);
+
+function isSparse(values: RunLengthArray, threshold: number) {
+  if (!values.length || !IntegerArrayNames.has(values.constructor.name)) {
+    return false;
+  }
+  let nonzero = 0;
+  const limit = (1 - threshold) * values.length;
+  for (let i = 0; i < values.length; i++) {
+    if (values[i] && ++nonzero > limit) return false;
+  }
+  return true;
+}
+
+/**
+ * Encodes sparse integer values as run values and Uint32 run lengths.
+ *
+ * Returns null when the values are not sparse enough, or when the encoding
+ * would not be smaller.
+ */
+export function encodeRunLength<T extends RunLengthArray>(
+  values: T,
+  threshold = SPARSE_THRESHOLD
+) {
+  if (!isSparse(values, threshold)) return null;
+
+  const runBytes = values.BYTES_PER_ELEMENT + 4;
+  const maxRuns = Math.floor(values.byteLength / runBytes);
+  const runLengths = new Uint32Array(maxRuns);
+  const starts = new Uint32Array(maxRuns);
+  let runs = 0;
+  let start = 0;
+  for (let i = 1; i <= values.length; i++) {
+    if (i === values.length || values[i] !== values[start]) {
+      if (runs === maxRuns) return null;
+      starts[runs] = start;
+      runLengths[runs] = i - start;
+      runs++;
+      start = i;
+    }
+  }
+
+  const Ctor = values.constructor as RunLengthArrayConstructor<T>;
+  const runValues = new Ctor(runs);
+  for (let i = 0; i < runs; i++) {
+    runValues[i] = values[starts[i]] as any;
+  }
+  return { runValues, runLengths: runLengths.slice(0, runs) };
+}
+
+/**
+ * Expands run values and run lengths into an array of the given size.
+ */
+export function decodeRunLength<T extends RunLengthArray>(
+  runValues: T,
+  runLengths: Uint32Array,
+  size: number
+) {
+  const Ctor = runValues.constructor as RunLengthArrayConstructor<T>;
+  const values = new Ctor(size);
+  let offset = 0;
+  for (let i = 0; i < runLengths.length; i++) {
+    const end = offset + runLengths[i];
+    // new typed arrays are zero-filled
+    if (runValues[i]) values.fill(runValues[i] as any, offset, end);
+    offset = end;
+  }
+  if (offset !== size) {
+    throw new Error('Run lengths do not match the array size');
+  }
+  return values;
+}
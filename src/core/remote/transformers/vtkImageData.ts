@@ -2,6 +2,11 @@ import vtk from '@kitware/vtk.js/vtk';
 import { TypedArrayConstructorName } from '@/src/types';
 import { TypedArrayConstructorNames } from '@/src/utils';
 import vtkImageData from '@kitware/vtk.js/Common/DataModel/ImageData';
+import {
+  RUN_LENGTH_ENCODING,
+  decodeRunLength,
+  encodeRunLength,
+} from '@/src/core/remote/transformers/runLength';
 
 const AllowedTypedArrays = new Set(TypedArrayConstructorNames);
 
@@ -27,13 +32,46 @@ function wrapValuesInTypedArray(serializedImageData: any) {
   return serializedImageData;
 }
 
+function encodeSparseValues(serializedImageData: any) {
+  // label maps are mostly zeros, so they are sent run-length encoded
+  serializedImageData.pointData.arrays.forEach(({ data }: any) => {
+    if (data.numberOfComponents !== 1 || !ArrayBuffer.isView(data.values)) {
+      return;
+    }
+    const encoded = encodeRunLength(data.values as any);
+    if (encoded) {
+      data.values = encoded.runValues;
+      data.runLengths = encoded.runLengths;
+      data.encoding = RUN_LENGTH_ENCODING;
+    }
+  });
+  return serializedImageData;
+}
+
+function decodeSparseValues(serializedImageData: any) {
+  serializedImageData.pointData.arrays.forEach(({ data }: any) => {
+    if (data.encoding === undefined) return;
+    if (data.encoding !== RUN_LENGTH_ENCODING) {
+      throw new Error(`Unknown pixel encoding ${data.encoding}`);
+    }
+    data.values = decodeRunLength(
+      data.values,
+      new Uint32Array(data.runLengths),
+      data.size
+    );
+    delete data.runLengths;
+    delete data.encoding;
+  });
+  return serializedImageData;
+}
+
 export function serializeVtkImageData(obj: any): any {
   if (!isImageData(obj)) {
     return obj;
   }
 
   const serialized = obj.toJSON() as any;
-  return wrapValuesInTypedArray(serialized);
+  return encodeSparseValues(wrapValuesInTypedArray(serialized));
 }
 
 export function deserializeVtkImageData(obj: any) {
@@ -42,7 +80,7 @@ export function deserializeVtkImageData(obj: any) {
   }
 
   try {
-    return vtk(wrapValuesInTypedArray(obj));
+    return vtk(decodeSparseValues(wrapValuesInTypedArray(obj)));
   } catch (e) {
     return obj;
   }